@@ -0,0 +1,174 @@
+"""
+Semantic cache for generated answers.
+
+An answer is reusable when it was generated by the same model from the
+same set of retrieved chunks for a query whose embedding is at least
+ANSWER_CACHE_THRESHOLD cosine-similar.  Entries expire after a TTL, the
+least recently used are evicted beyond ANSWER_CACHE_SIZE, and every
+entry built on a chunk is dropped when that chunk is re-indexed.  When
+another process changes the index (see writer_lock), the whole cache is
+dropped, since its deletes and re-upserts are not known here.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from dotenv import load_dotenv
+from writer_lock import bump_index_generation, index_generation
+
+load_dotenv()
+
+# ANSWER_CACHE_SIZE=0 disables the cache
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "256"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600"))
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+
+
+def _unit(vector):
+    vec = np.asarray(vector, dtype=np.float32)
+    return vec / (np.linalg.norm(vec) or 1.0)
+
+
+class AnswerCache:
+    """In-memory LRU of answers, matched by chunk set and query similarity."""
+
+    def __init__(self, max_entries=256, ttl_seconds=3600, threshold=0.95):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.threshold = threshold
+        self.hits = 0
+        self.misses = 0
+        self.invalidated = 0
+        self._lock = threading.Lock()
+        self._next_id = 0
+        self._entries = OrderedDict()  # entry id -> (expires_at, unit query vector, group, answer)
+        self._groups = {}              # (model, frozenset of chunk IDs) -> {entry id}
+        self._by_chunk = {}            # chunk ID -> {entry id}
+
+    def get(self, query_vector, chunk_ids, model):
+        """Return the best cached answer for a near-duplicate query, or None."""
+        query = _unit(query_vector)
+        group = (model, frozenset(chunk_ids))
+        now = time.monotonic()
+        with self._lock:
+            best_id, best_sim = None, self.threshold
+            for entry_id in list(self._groups.get(group, ())):
+                expires_at, vector, _, _ = self._entries[entry_id]
+                if expires_at < now:
+                    self._drop(entry_id)
+                    continue
+                sim = float(np.dot(query, vector))
+                if sim >= best_sim:
+                    best_id, best_sim = entry_id, sim
+            if best_id is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(best_id)
+            self.hits += 1
+            return self._entries[best_id][3]
+
+    def put(self, query_vector, chunk_ids, model, answer):
+        """Remember an answer generated from chunk_ids for this query."""
+        group = (model, frozenset(chunk_ids))
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = (
+                time.monotonic() + self.ttl_seconds, _unit(query_vector), group, answer
+            )
+            self._groups.setdefault(group, set()).add(entry_id)
+            for chunk_id in group[1]:
+                self._by_chunk.setdefault(chunk_id, set()).add(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+
+    def invalidate(self, chunk_ids):
+        """Drop every answer built on any of chunk_ids; returns how many were dropped."""
+        dropped = 0
+        with self._lock:
+            for chunk_id in chunk_ids:
+                for entry_id in list(self._by_chunk.get(chunk_id, ())):
+                    self._drop(entry_id)
+                    dropped += 1
+            self.invalidated += dropped
+        return dropped
+
+    def _drop(self, entry_id):
+        _, _, group, _ = self._entries.pop(entry_id)
+        members = self._groups.get(group)
+        if members is not None:
+            members.discard(entry_id)
+            if not members:
+                del self._groups[group]
+        for chunk_id in group[1]:
+            members = self._by_chunk.get(chunk_id)
+            if members is not None:
+                members.discard(entry_id)
+                if not members:
+                    del self._by_chunk[chunk_id]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._groups.clear()
+            self._by_chunk.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "invalidated": self.invalidated,
+                "entries": len(self._entries),
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+_generation = None  # index generation the cache is consistent with
+_generation_lock = threading.Lock()
+
+
+def _check_generation():
+    """Drop every answer if another process changed the index since the last check."""
+    global _generation
+    generation = index_generation()
+    with _generation_lock:
+        if generation != _generation:
+            if _cache is not None:
+                _cache.clear()
+            _generation = generation
+
+
+def get_answer_cache():
+    """Return the process-wide answer cache, or None if disabled."""
+    global _cache
+    if ANSWER_CACHE_SIZE <= 0:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = AnswerCache(ANSWER_CACHE_SIZE, ANSWER_CACHE_TTL, ANSWER_CACHE_THRESHOLD)
+    _check_generation()
+    return _cache
+
+
+def invalidate_answers(chunk_ids):
+    """Forget cached answers that used any of these vector IDs, here and elsewhere."""
+    global _generation
+    if not chunk_ids:
+        return
+    _check_generation()
+    if _cache is not None:
+        _cache.invalidate(chunk_ids)
+    # Other processes cannot tell which of their answers this affects
+    with _generation_lock:
+        _generation = bump_index_generation()
+
+
+def answer_cache_stats():
+    cache = get_answer_cache()
+    return cache.stats() if cache is not None else None
@@ -1,8 +1,56 @@
 import streamlit as st
-from utils import extract_text_from_uploaded, chunk_text, save_uploaded_pdf
-from embed import store_chunks_in_endee
-from search import semantic_search
-from rag import generate_answer
+from utils import SECTION_LABELS, iter_chunks, save_uploaded_pdf
+from pdf_extract import iter_pages
+from answer_cache import answer_cache_stats
+from embed import generate_embeddings, embedding_cache_stats
+from embed_pool import pool_batch_size
+from metrics import (
+    recent_traces, render_prometheus, server_stats, snapshot as metrics_snapshot,
+    start_metrics_server, trace,
+)
+from indexer import check_file, finish_file, indexed_sources, plan_chunks, upsert_chunks
+from pipeline import EMBED_BATCH_SIZE, IngestPipeline
+from rerank import rerank_stats
+from search import build_filter, semantic_search
+from rag import stream_answer
+from warmup import readiness, start_warmup, wait_until_ready
+from writer_lock import acquire_writer_lock
+
+
+def _extract_upload(uploaded_file):
+    """Save a local copy of the upload and extract its (page_number, text) pages."""
+    # Skip files whose content was already indexed
+    check_file(uploaded_file.name, uploaded_file.getvalue())
+    save_uploaded_pdf(uploaded_file)
+    # Reset file pointer before reading
+    uploaded_file.seek(0)
+    return list(iter_pages(uploaded_file))
+
+
+def _chunk(pages):
+    return list(iter_chunks(pages, chunk_size=400, overlap=0))
+
+
+def _answer_tokens(query, results):
+    """Stream the LLM answer, turning a failure into an inline notice."""
+    try:
+        yield from stream_answer(query, results)
+    except Exception as llm_err:
+        yield f"\n\n_LLM answer unavailable: {llm_err}_"
+
+
+@st.cache_resource(show_spinner=False)
+def _start_services():
+    """
+    Process-level start-up, run once and shared by every session and rerun.
+
+    Serves /metrics and /ready when METRICS_PORT is set, and loads the
+    embedding model, Endee index and LLM client in the background (the
+    model, Endee and Groq clients are process-wide singletons).
+    """
+    start_metrics_server()
+    start_warmup()
+
 
 st.set_page_config(
     page_title="Semantic Search — Endee",
@@ -10,12 +58,20 @@ st.set_page_config(
     layout="wide"
 )
 
+_start_services()
+
 st.title("Semantic Search Engine")
 st.caption("Powered by Endee Vector Database & Sentence Transformers")
 
-# Track which files have been indexed this session to avoid duplicates
-if "indexed_files" not in st.session_state:
-    st.session_state.indexed_files = set()
+startup = readiness()
+if not startup["done"]:
+    loading = [name for name, step in startup["steps"].items() if step["status"] != "ready"]
+    st.sidebar.info(f"Starting up — loading {', '.join(loading)}...")
+else:
+    for name, step in startup["steps"].items():
+        if step["error"] and step["status"] != "ready":
+            retrying = " (retrying)" if step["required"] else ""
+            st.sidebar.warning(f"Start-up step '{name}' failed{retrying}: {step['error']}")
 
 # ── Sidebar: Document Upload ────────────────────────────────────
 st.sidebar.header("Upload Documents")
@@ -25,64 +81,64 @@ uploaded_files = st.sidebar.file_uploader(
     accept_multiple_files=True
 )
 
-if uploaded_files:
-    if st.sidebar.button("Process & Store", type="primary"):
-        total_chunks = 0
-        progress_bar = st.sidebar.progress(0)
-
-        for i, uploaded_file in enumerate(uploaded_files):
-            fname = uploaded_file.name
-
-            # Skip files already indexed in this session
-            if fname in st.session_state.indexed_files:
-                st.sidebar.info(f"{fname} already indexed — skipping")
-                progress_bar.progress((i + 1) / len(uploaded_files))
-                continue
-
-            try:
-                with st.sidebar.status(f"Processing {fname}...", expanded=True) as status:
-                    # Save a local copy
-                    save_uploaded_pdf(uploaded_file)
-
-                    # Reset file pointer before reading
-                    uploaded_file.seek(0)
-
-                    # Extract text
-                    st.write("Extracting text...")
-                    raw_text = extract_text_from_uploaded(uploaded_file)
-
-                    if not raw_text.strip():
-                        st.warning(f"No text found in {fname}")
-                        status.update(label=f"{fname} — no text found", state="error")
-                        continue
-
-                    # Chunk the text
-                    st.write("Splitting into chunks...")
-                    chunks = chunk_text(raw_text, chunk_size=400, overlap=0)
-                    st.write(f"Created {len(chunks)} chunks")
-
-                    if not chunks:
-                        st.warning(f"Could not create chunks from {fname}")
-                        status.update(label=f"{fname} — chunking failed", state="error")
-                        continue
-
-                    # Embed and store in Endee
-                    st.write("Generating embeddings & storing in Endee...")
-                    stored = store_chunks_in_endee(chunks, source_filename=fname)
-                    total_chunks += stored
-
-                    st.session_state.indexed_files.add(fname)
-                    status.update(label=f"{fname} — {stored} chunks stored", state="complete")
-
-            except Exception as exc:
-                st.sidebar.error(f"Error processing {fname}: {exc}")
-
-            progress_bar.progress((i + 1) / len(uploaded_files))
-
-        if total_chunks > 0:
-            st.sidebar.success(f"Done — {total_chunks} chunks indexed")
-        else:
-            st.sidebar.warning("No new chunks were indexed")
+if uploaded_files and st.sidebar.button("Process & Store", type="primary"):
+    try:
+        # Held for this run only; searches go on while it runs
+        writer = acquire_writer_lock("app")
+    except RuntimeError as exc:
+        st.sidebar.error(f"Cannot ingest right now: {exc}")
+    else:
+        with writer:
+            total_chunks = 0
+            progress_bar = st.sidebar.progress(0)
+
+            jobs = [(f.name, f) for f in uploaded_files]
+
+            # Extract, chunk, embed and upsert run as overlapping stages.
+            # Files are diffed against the ingest manifest, so only new
+            # chunks are embedded and removed ones are deleted.
+            pipeline = IngestPipeline(
+                extract_fn=_extract_upload,
+                chunk_fn=_chunk,
+                embed_fn=generate_embeddings,
+                upsert_fn=upsert_chunks,
+                plan_fn=plan_chunks,
+                complete_fn=finish_file,
+                # Large enough to give every embedding worker a shard
+                batch_size=pool_batch_size(EMBED_BATCH_SIZE),
+            )
+
+            done = 0
+            for result in pipeline.run(jobs):
+                fname = result["name"]
+                if result["status"] == "complete":
+                    total_chunks += result["stored"]
+                    st.sidebar.success(f"{fname} — {result['stored']} new chunks stored")
+                elif result["status"] == "skipped":
+                    st.sidebar.info(f"{fname} — {result['message']}")
+                elif result["status"] == "empty":
+                    st.sidebar.warning(f"{fname} — {result['message']}")
+                else:
+                    st.sidebar.error(f"Error processing {fname}: {result['message']}")
+
+                done += 1
+                progress_bar.progress(done / len(uploaded_files))
+
+            if total_chunks > 0:
+                st.sidebar.success(f"Done — {total_chunks} chunks indexed")
+            else:
+                st.sidebar.warning("No new chunks were indexed")
+
+            with st.sidebar.expander("Ingest throughput"):
+                st.table(pipeline.stage_stats())
+
+            cache_stats = embedding_cache_stats()
+            if cache_stats:
+                st.sidebar.caption(
+                    f"Embedding cache: {cache_stats['hits']} hits / "
+                    f"{cache_stats['misses']} misses "
+                    f"({cache_stats['hit_rate'] * 100:.0f}% hit rate)"
+                )
 
 # ── Main Area: Search ───────────────────────────────────────────
 st.markdown("---")
@@ -99,38 +155,94 @@ with col_query:
 with col_k:
     top_k = st.number_input("Results", min_value=1, max_value=20, value=5)
 
+# Optional server-side scoping by document and section
+with st.expander("Filters"):
+    col_src, col_sec = st.columns(2)
+    with col_src:
+        filter_sources = st.multiselect("Documents", indexed_sources())
+    with col_sec:
+        filter_sections = st.multiselect("Sections", SECTION_LABELS)
+
+search_filter = build_filter(source=filter_sources, section=filter_sections)
+
 if query:
-    try:
-        with st.spinner("Searching..."):
-            results = semantic_search(query, top_k=top_k)
-
-        if results:
-            # Generate an LLM answer from the retrieved chunks
-            with st.spinner("Generating answer..."):
-                try:
-                    answer = generate_answer(query, results)
-                except Exception as llm_err:
-                    answer = f"_LLM answer unavailable: {llm_err}_"
-
-            st.markdown("### Answer")
-            st.markdown(answer)
-
-            st.markdown("---")
-            st.markdown(f"**Source chunks ({len(results)}):**")
-
-            for rank, result in enumerate(results, 1):
-                similarity_pct = result["similarity"] * 100
-                with st.expander(
-                    f"#{rank} — {result['source']} (similarity: {similarity_pct:.1f}%)",
-                    expanded=False
-                ):
-                    st.markdown(result["text"])
-                    st.caption(f"Chunk: {result['chunk_id']} | Vector ID: {result['id']}")
-        else:
-            st.info("No results found. Upload and process some documents first.")
-    except Exception as exc:
-        st.error(f"Search failed: {exc}")
-        st.info("Make sure you have uploaded and processed at least one document.")
+    # Time every stage of this query as one trace for the latency panel
+    with trace("query"):
+        try:
+            if not startup["done"]:
+                with st.spinner("Loading the embedding model..."):
+                    wait_until_ready()
+            with st.spinner("Searching..."):
+                results = semantic_search(query, top_k=top_k, filter=search_filter)
+
+            if results:
+                # Stream the LLM answer from the retrieved chunks as it is generated
+                st.markdown("### Answer")
+                st.write_stream(_answer_tokens(query, results))
+                answer_stats = answer_cache_stats()
+                if answer_stats and answer_stats["hits"]:
+                    st.caption(
+                        f"Answer cache: {answer_stats['hits']} hits / "
+                        f"{answer_stats['misses']} misses"
+                    )
+
+                st.markdown("---")
+                st.markdown(f"**Source chunks ({len(results)}):**")
+                rerank_info = rerank_stats()
+                if rerank_info["calls"]:
+                    st.caption(
+                        f"Re-ranking: {rerank_info['avg_ms']:.0f} ms avg over "
+                        f"{rerank_info['calls']} searches, "
+                        f"{rerank_info['truncated']} cut short by the latency budget"
+                    )
+
+                for rank, result in enumerate(results, 1):
+                    similarity_pct = result["similarity"] * 100
+                    with st.expander(
+                        f"#{rank} — {result['source']} (similarity: {similarity_pct:.1f}%)",
+                        expanded=False
+                    ):
+                        st.markdown(result["text"])
+                        location = f"Chunk: {result['chunk_id']}"
+                        if result.get("section"):
+                            location += f" | Section: {result['section']}"
+                        if result.get("page") is not None:
+                            location += f" | Page: {result['page']}"
+                        if result.get("also_in"):
+                            location += f" | Also in: {', '.join(result['also_in'])}"
+                        if "rerank_score" in result:
+                            location += f" | Rerank: {result['rerank_score']:.2f}"
+                        st.caption(f"{location} | Vector ID: {result['id']}")
+            else:
+                st.info("No results found. Upload and process some documents first.")
+        except Exception as exc:
+            st.error(f"Search failed: {exc}")
+            st.info("Make sure you have uploaded and processed at least one document.")
+
+# ── Debug: latency metrics ──────────────────────────────────────
+if st.sidebar.checkbox("Show latency metrics"):
+    st.markdown("---")
+    st.subheader("Latency Metrics")
+    st.table(metrics_snapshot())
+
+    traces = recent_traces()
+    if traces:
+        st.markdown(f"**Last {traces[0]['name']}: {traces[0]['ms']:.0f} ms**")
+        st.table(traces[0]["spans"])
+
+    server = server_stats()
+    if server:
+        endee_calls = sum(r["calls"] for r in metrics_snapshot() if r["stage"].startswith("endee."))
+        st.caption(
+            f"Endee {server.get('version', '')}: {server.get('total_requests', 0)} requests "
+            f"served since start ({endee_calls} from this app process), "
+            f"uptime {server.get('uptime', 0)}s"
+        )
+    else:
+        st.caption("Endee /stats unavailable")
+
+    with st.expander("Prometheus metrics"):
+        st.code(render_prometheus(include_server=False), language="text")
 
 # ── Footer ──────────────────────────────────────────────────────
 st.markdown("---")
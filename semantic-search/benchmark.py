@@ -0,0 +1,289 @@
+"""
+Offline benchmark for the ingest and query paths.
+
+Generates synthetic PDFs, then times each stage of the app on them:
+page extraction (pdf_extract), chunking (utils), embedding and upsert
+(embed), and search (search) with recall@k against brute-force ground
+truth over the same embeddings.  By default the index lives in an
+in-process fake (fake_endee); --server uses the Endee server at
+ENDEE_BASE_URL with a throwaway index instead.
+
+    python benchmark.py --docs 4 --pages 50 --queries 200
+    python benchmark.py --server --json results/bench.json
+
+Caches that would hide the cost of a stage (embedding, query, answer)
+are disabled for the run, and every store it writes (manifest, chunk
+store, near-duplicate index, writer lock, ...) lives in a scratch
+directory, so it never touches the app's state.  A failed search
+aborts the run rather than counting as a miss.  Results are printed and, with --json,
+written together with the current git commit for comparison.
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+_SYLLABLES = ["ka", "lo", "mi", "ne", "ru", "sa", "ti", "vo", "zen", "dar",
+              "pel", "qua", "ist", "or", "um", "ex", "tra", "bel", "con", "ho"]
+_HEADERS = ["SUMMARY", "EXPERIENCE", "PROJECTS", "SKILLS", "EDUCATION",
+            "METHODOLOGY", "RESULTS", "CONCLUSION"]
+_LINES_PER_PAGE = 56
+_LINE_WIDTH = 90
+
+
+def _escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def make_pdf(pages):
+    """Build a minimal Helvetica PDF; pages is a list of lists of text lines."""
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        ("<< /Type /Pages /Kids [%s] /Count %d >>" % (
+            " ".join(f"{4 + 2 * i} 0 R" for i in range(len(pages))), len(pages)
+        )).encode(),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    for i, lines in enumerate(pages):
+        ops = ["BT", "/F1 10 Tf", "13 TL", "50 760 Td"]
+        ops.extend(f"({_escape(line)}) Tj T*" for line in lines)
+        ops.append("ET")
+        stream = "\n".join(ops).encode("latin-1")
+        objects.append((
+            "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            "/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % (5 + 2 * i)
+        ).encode())
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+        len(objects) + 1, xref
+    )
+    return bytes(out)
+
+
+def synthetic_pages(rng, vocabulary, num_pages):
+    """Pages of wrapped pseudo-English with section headers and paragraphs."""
+    weights = 1.0 / np.arange(1, len(vocabulary) + 1)   # Zipf-like word frequencies
+    weights /= weights.sum()
+
+    def sentence():
+        words = rng.choice(vocabulary, size=int(rng.integers(8, 22)), p=weights)
+        return " ".join(words).capitalize() + "."
+
+    pages = []
+    for _ in range(num_pages):
+        lines = []
+        while len(lines) < _LINES_PER_PAGE:
+            if rng.random() < 0.15:
+                lines.extend(["", str(rng.choice(_HEADERS))])
+            paragraph = " ".join(sentence() for _ in range(int(rng.integers(2, 6))))
+            line = ""
+            for word in paragraph.split():
+                if len(line) + len(word) + 1 > _LINE_WIDTH:
+                    lines.append(line)
+                    line = word
+                else:
+                    line = f"{line} {word}".strip()
+            lines.extend([line, ""])
+        pages.append(lines[:_LINES_PER_PAGE])
+    return pages
+
+
+def make_vocabulary(rng, size=3000):
+    words = set()
+    while len(words) < size:
+        n = int(rng.integers(1, 4))
+        words.add("".join(rng.choice(_SYLLABLES, size=n)))
+    return sorted(words)
+
+
+def percentile(values, p):
+    return float(np.percentile(values, p)) if values else 0.0
+
+
+def rate(count, seconds):
+    return round(count / seconds, 2) if seconds > 0 else 0.0
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest/query benchmark")
+    parser.add_argument("--docs", type=int, default=4, help="synthetic PDFs to generate")
+    parser.add_argument("--pages", type=int, default=50, help="pages per PDF")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=500, help="vectors per upsert")
+    parser.add_argument("--server", action="store_true",
+                        help="use the Endee server at ENDEE_BASE_URL instead of the in-process fake")
+    parser.add_argument("--fake-latency-ms", type=float, default=0.0,
+                        help="simulated round-trip time per fake index call")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="endee_bench_")
+    # Isolate the run from the app's caches, stores, writer lock and
+    # index; these are read when the app modules are imported, so they
+    # must be set first.  Only read-only inputs (the exported ONNX model,
+    # a fitted PCA projection) are shared with the app.
+    os.environ.update({
+        "INDEX_NAME": os.getenv("INDEX_NAME", "semantic_search") + "_bench",
+        "EMBED_CACHE": "0",
+        "QUERY_CACHE_SIZE": "0",
+        "ANSWER_CACHE_SIZE": "0",
+        "EMBED_CACHE_DIR": os.path.join(work_dir, "embeddings"),
+        "QUERY_CACHE_DIR": "",
+        "FULL_VECTOR_DIR": os.path.join(work_dir, "full_vectors"),
+        "SPARSE_VOCAB_PATH": os.path.join(work_dir, "sparse_vocab.sqlite3"),
+        "CHUNK_STORE_PATH": os.path.join(work_dir, "chunks.sqlite3"),
+        "MANIFEST_PATH": os.path.join(work_dir, "manifest.sqlite3"),
+        "NEAR_DUP_PATH": os.path.join(work_dir, "near_dup.sqlite3"),
+        "WRITER_LOCK_PATH": os.path.join(work_dir, "writer.lock"),
+        "BULK_JOURNAL_PATH": os.path.join(work_dir, "bulk_journal.jsonl"),
+        "EF_TUNING_PATH": os.path.join(work_dir, "ef_tuning.json"),
+    })
+    import session
+    from embed import chunk_vector_id, embed_queries, generate_embeddings, upsert_chunk_vectors
+    from fake_endee import FakeEndee
+    from pdf_extract import iter_pages
+    from search import semantic_search
+    from utils import iter_chunks
+
+    if not args.server:
+        session.use_client(FakeEndee(latency_ms=args.fake_latency_ms))
+
+    rng = np.random.default_rng(args.seed)
+    vocabulary = make_vocabulary(rng)
+    paths = []
+    for d in range(args.docs):
+        path = os.path.join(work_dir, f"bench_{d}.pdf")
+        with open(path, "wb") as f:
+            f.write(make_pdf(synthetic_pages(rng, vocabulary, args.pages)))
+        paths.append(path)
+
+    try:
+        # Extract
+        start = time.perf_counter()
+        documents = [(os.path.basename(p), list(iter_pages(p))) for p in paths]
+        extract_s = time.perf_counter() - start
+        num_pages = sum(len(pages) for _, pages in documents)
+
+        # Chunk
+        start = time.perf_counter()
+        chunked = [(name, list(iter_chunks(pages))) for name, pages in documents]
+        chunk_s = time.perf_counter() - start
+        num_chunks = sum(len(chunks) for _, chunks in chunked)
+
+        # Embed
+        start = time.perf_counter()
+        embedded = [(name, chunks, generate_embeddings([c["text"] for c in chunks]))
+                    for name, chunks in chunked]
+        embed_s = time.perf_counter() - start
+
+        # Upsert
+        start = time.perf_counter()
+        for name, chunks, vectors in embedded:
+            for i in range(0, len(chunks), args.batch_size):
+                upsert_chunk_vectors(chunks[i:i + args.batch_size],
+                                     vectors[i:i + args.batch_size], name)
+        upsert_s = time.perf_counter() - start
+
+        # Queries: a few words drawn from random chunks
+        ids, corpus = [], []
+        for name, chunks, vectors in embedded:
+            ids.extend(chunk_vector_id(c, name) for c in chunks)
+            corpus.extend(vectors)
+        corpus = np.asarray(corpus, dtype=np.float32)
+        corpus /= np.linalg.norm(corpus, axis=1, keepdims=True)
+
+        all_chunks = [c for _, chunks, _ in embedded for c in chunks]
+        queries = []
+        for j in rng.choice(len(all_chunks), size=args.queries):
+            words = all_chunks[j]["text"].split()
+            size = min(len(words), int(rng.integers(4, 10)))
+            offset = int(rng.integers(0, len(words) - size + 1))
+            queries.append(" ".join(words[offset:offset + size]))
+
+        query_vectors = np.asarray(embed_queries(queries), dtype=np.float32)
+        query_vectors /= np.linalg.norm(query_vectors, axis=1, keepdims=True)
+        truth = np.argsort(-(query_vectors @ corpus.T), axis=1)[:, :args.k]
+
+        latencies = []
+        hits = 0
+        for query, expected in zip(queries, truth):
+            start = time.perf_counter()
+            results = semantic_search(query, top_k=args.k, raise_errors=True)
+            latencies.append((time.perf_counter() - start) * 1000)
+            found = {r["id"] for r in results}
+            hits += len(found & {ids[i] for i in expected})
+        query_s = sum(latencies) / 1000
+    finally:
+        if args.server:
+            session.get_client().delete_index(name=os.environ["INDEX_NAME"])
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "backend": "server" if args.server else "fake",
+        "config": {"docs": args.docs, "pages_per_doc": args.pages, "queries": args.queries,
+                   "k": args.k, "batch_size": args.batch_size, "seed": args.seed},
+        "extract": {"pages": num_pages, "seconds": round(extract_s, 3),
+                    "pages_per_s": rate(num_pages, extract_s)},
+        "chunk": {"chunks": num_chunks, "seconds": round(chunk_s, 3),
+                  "chunks_per_s": rate(num_chunks, chunk_s)},
+        "embed": {"chunks": num_chunks, "seconds": round(embed_s, 3),
+                  "chunks_per_s": rate(num_chunks, embed_s)},
+        "upsert": {"vectors": num_chunks, "seconds": round(upsert_s, 3),
+                   "vectors_per_s": rate(num_chunks, upsert_s)},
+        "query": {"count": len(latencies), "qps": rate(len(latencies), query_s),
+                  "p50_ms": round(percentile(latencies, 50), 2),
+                  "p95_ms": round(percentile(latencies, 95), 2),
+                  "p99_ms": round(percentile(latencies, 99), 2)},
+        f"recall@{args.k}": round(hits / max(1, args.k * len(queries)), 4),
+    }
+
+    print(f"commit={report['commit']} backend={report['backend']} "
+          f"pages={num_pages} chunks={num_chunks}")
+    print(f"extract  {report['extract']['pages_per_s']:>10} pages/s")
+    print(f"chunk    {report['chunk']['chunks_per_s']:>10} chunks/s")
+    print(f"embed    {report['embed']['chunks_per_s']:>10} chunks/s")
+    print(f"upsert   {report['upsert']['vectors_per_s']:>10} vectors/s")
+    q = report["query"]
+    print(f"query    p50={q['p50_ms']}ms p95={q['p95_ms']}ms p99={q['p99_ms']}ms")
+    print(f"recall@{args.k} {report[f'recall@{args.k}']}")
+
+    if args.json:
+        directory = os.path.dirname(args.json)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
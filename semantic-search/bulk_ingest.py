@@ -0,0 +1,309 @@
+"""
+Headless, resumable bulk ingest of a directory of PDFs.
+
+Runs every PDF under a directory through the same pipeline as the app
+(extract -> chunk -> embed -> upsert, with the ingest manifest's
+incremental diffing), without a browser:
+
+    python bulk_ingest.py /srv/corpus --json results/ingest.json
+
+Progress survives crashes at two levels:
+
+* the ingest manifest records every committed upsert batch, so a file
+  interrupted midway only embeds and upserts its remaining chunks;
+* a checkpoint journal (JSON lines, fsynced per record) records every
+  committed batch and every finished file, so a rerun skips finished
+  files without even reading them and reports what it resumed.
+
+Only one process may ingest into an index at a time (see writer_lock):
+while this runs the app keeps serving searches, but its uploads are
+refused until the run has finished.
+
+Upserts are retried with backoff (see embed.UPSERT_RETRIES), and the
+vectors per upsert adapt to the server's response time, up to its
+1000-vector limit.  Sources are named by their path relative to the
+directory.
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from dotenv import load_dotenv
+from embed import MAX_UPSERT_BATCH, generate_embeddings
+from embed_pool import pool_batch_size
+from indexer import check_file, finish_file, plan_chunks, upsert_chunks
+from pdf_extract import iter_pages
+from pipeline import IngestPipeline
+from session import INDEX_NAME
+from utils import iter_chunks
+from writer_lock import acquire_writer_lock
+
+load_dotenv()
+
+BULK_JOURNAL_PATH = os.getenv("BULK_JOURNAL_PATH") or f".cache/bulk_journal_{INDEX_NAME}.jsonl"
+# Upsert batch sizing: start size, and the per-call latency it steers towards
+BULK_INITIAL_BATCH = int(os.getenv("BULK_INITIAL_BATCH", "100"))
+BULK_MIN_BATCH = int(os.getenv("BULK_MIN_BATCH", "16"))
+BULK_TARGET_SECONDS = float(os.getenv("BULK_TARGET_SECONDS", "2.0"))
+
+_DONE_STATUSES = ("complete", "skipped", "empty")
+
+
+class IngestJournal:
+    """
+    Append-only checkpoint journal.
+
+    Each record is one JSON line, flushed and fsynced before the call
+    returns; a line torn by a crash is ignored when the journal is read.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.files = {}      # path -> last file record
+        self.committed = {}  # source -> vectors committed since its last file record
+        torn = False
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    torn = not line.endswith("\n")
+                    try:
+                        self._apply(json.loads(line))
+                    except ValueError:
+                        continue
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+        if torn:
+            # Start a new line after a record cut short by a crash
+            self._file.write("\n")
+
+    def _apply(self, record):
+        if record["event"] == "file":
+            self.files[record["path"]] = record
+            self.committed.pop(record["source"], None)
+        elif record["event"] == "batch":
+            self.committed[record["source"]] = (
+                self.committed.get(record["source"], 0) + record["vectors"]
+            )
+
+    def _append(self, record):
+        record["time"] = round(time.time(), 3)
+        with self._lock:
+            self._apply(record)
+            self._file.write(json.dumps(record) + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def record_batch(self, source, vectors, seconds):
+        self._append({"event": "batch", "source": source, "vectors": vectors,
+                      "seconds": round(seconds, 3)})
+
+    def record_file(self, path, source, status, stored=0, message=""):
+        stat = os.stat(path)
+        self._append({"event": "file", "path": path, "source": source, "status": status,
+                      "stored": stored, "message": message,
+                      "size": stat.st_size, "mtime": stat.st_mtime})
+
+    def is_done(self, path):
+        """Whether path finished in an earlier run and has not changed since."""
+        record = self.files.get(path)
+        if record is None or record["status"] not in _DONE_STATUSES:
+            return False
+        stat = os.stat(path)
+        return record["size"] == stat.st_size and record["mtime"] == stat.st_mtime
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class AdaptiveBatchSize:
+    """
+    Vectors per upsert call.
+
+    Doubles (up to maximum) after a full-size call that took less than
+    half of target_seconds, halves after a slower call or a failure.
+    """
+
+    def __init__(self, initial=BULK_INITIAL_BATCH, minimum=BULK_MIN_BATCH,
+                 maximum=MAX_UPSERT_BATCH, target_seconds=BULK_TARGET_SECONDS):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_seconds = target_seconds
+        self.size = max(minimum, min(initial, maximum))
+        self._lock = threading.Lock()
+
+    def success(self, vectors, seconds):
+        with self._lock:
+            if seconds > self.target_seconds:
+                self.size = max(self.minimum, self.size // 2)
+            elif seconds < self.target_seconds / 2 and vectors >= self.size:
+                self.size = min(self.maximum, self.size * 2)
+
+    def failure(self):
+        """Halve the size; False if it was already at the minimum."""
+        with self._lock:
+            if self.size <= self.minimum:
+                return False
+            self.size = max(self.minimum, self.size // 2)
+            return True
+
+
+class BulkLoader:
+    """Pipeline stage functions for the PDFs under root."""
+
+    def __init__(self, root, journal, batch_size):
+        self.root = os.path.abspath(root)
+        self.journal = journal
+        self.batch_size = batch_size
+
+    def source_name(self, path):
+        return os.path.relpath(path, self.root).replace(os.sep, "/")
+
+    def find_pdfs(self):
+        paths = []
+        for directory, _, files in os.walk(self.root):
+            paths.extend(os.path.join(directory, f) for f in files if f.lower().endswith(".pdf"))
+        return sorted(paths)
+
+    def extract(self, path):
+        with open(path, "rb") as f:
+            check_file(self.source_name(path), f.read())
+        return list(iter_pages(path))
+
+    def upsert(self, chunks, vectors, source):
+        """Upsert in adaptively sized batches, checkpointing each one."""
+        stored = 0
+        i = 0
+        while i < len(chunks):
+            size = self.batch_size.size
+            start = time.perf_counter()
+            try:
+                count = upsert_chunks(chunks[i:i + size], vectors[i:i + size], source)
+            except Exception:
+                # Retries already backed off; a smaller payload may still get through
+                if not self.batch_size.failure():
+                    raise
+                continue
+            seconds = time.perf_counter() - start
+            self.batch_size.success(count, seconds)
+            self.journal.record_batch(source, count, seconds)
+            stored += count
+            i += size
+        return stored
+
+
+def _chunk(pages):
+    return list(iter_chunks(pages, chunk_size=400, overlap=0))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Resumable bulk ingest of a directory of PDFs")
+    parser.add_argument("directory", help="directory searched recursively for PDFs")
+    parser.add_argument("--journal", default=BULK_JOURNAL_PATH, help="checkpoint journal file")
+    parser.add_argument("--restart", action="store_true",
+                        help="start a new journal (the manifest still skips unchanged files)")
+    parser.add_argument("--embed-batch", type=int, default=pool_batch_size(MAX_UPSERT_BATCH),
+                        help="chunks per embedding batch (upserts are split adaptively)")
+    parser.add_argument("--max-failures", type=int, default=10,
+                        help="stop after this many files fail in a row")
+    parser.add_argument("--report-every", type=float, default=10.0, help="seconds between progress lines")
+    parser.add_argument("--json", help="write the final report to this file")
+    args = parser.parse_args()
+
+    try:
+        # Held for the whole session; the app cannot ingest until it is released
+        writer = acquire_writer_lock("bulk_ingest")
+    except RuntimeError as exc:
+        parser.error(str(exc))
+    with writer:
+        if args.restart and os.path.exists(args.journal):
+            os.remove(args.journal)
+        journal = IngestJournal(args.journal)
+        loader = BulkLoader(args.directory, journal, AdaptiveBatchSize())
+
+        paths = loader.find_pdfs()
+        pending = [p for p in paths if not journal.is_done(p)]
+        resumed = {loader.source_name(p): journal.committed[loader.source_name(p)]
+                   for p in pending if loader.source_name(p) in journal.committed}
+        print(f"{len(paths)} PDFs, {len(paths) - len(pending)} finished in earlier runs, "
+              f"{len(pending)} to process")
+        for source, vectors in sorted(resumed.items()):
+            print(f"resuming {source} ({vectors} vectors already committed)")
+
+        pipeline = IngestPipeline(
+            extract_fn=loader.extract,
+            chunk_fn=_chunk,
+            embed_fn=generate_embeddings,
+            upsert_fn=loader.upsert,
+            plan_fn=plan_chunks,
+            complete_fn=finish_file,
+            batch_size=args.embed_batch,
+        )
+        statuses = {}
+        stored = 0
+        failures = 0
+        interrupted = False
+        start = last_report = time.perf_counter()
+        jobs = [(loader.source_name(p), p) for p in pending]
+        paths_by_source = dict(jobs)
+        try:
+            for result in pipeline.run(jobs):
+                journal.record_file(paths_by_source[result["name"]], result["name"],
+                                    result["status"], result["stored"], result["message"])
+                statuses[result["status"]] = statuses.get(result["status"], 0) + 1
+                stored += result["stored"]
+                if result["status"] == "error":
+                    print(f"error   {result['name']}: {result['message']}")
+                    failures += 1
+                    if failures >= args.max_failures:
+                        print(f"stopping after {failures} failed files in a row; rerun to resume")
+                        break
+                else:
+                    failures = 0
+
+                now = time.perf_counter()
+                if now - last_report >= args.report_every:
+                    last_report = now
+                    done = sum(statuses.values())
+                    print(f"{done}/{len(pending)} files  {stored} vectors  "
+                          f"{stored / (now - start):.1f} vectors/s  "
+                          f"upsert batch {loader.batch_size.size}")
+        except KeyboardInterrupt:
+            interrupted = True
+            print("interrupted; rerun to resume from the last committed batch")
+        finally:
+            journal.close()
+
+    elapsed = time.perf_counter() - start
+    report = {
+        "directory": loader.root,
+        "pdfs": len(paths),
+        "already_done": len(paths) - len(pending),
+        "files": statuses,
+        "vectors": stored,
+        "seconds": round(elapsed, 3),
+        "files_per_s": round(sum(statuses.values()) / elapsed, 2) if elapsed else 0.0,
+        "vectors_per_s": round(stored / elapsed, 2) if elapsed else 0.0,
+        "upsert_batch_size": loader.batch_size.size,
+        "interrupted": interrupted,
+        "stages": pipeline.stage_stats(),
+    }
+    print(f"done: {report['files']} {stored} vectors in {elapsed:.1f}s "
+          f"({report['files_per_s']} files/s, {report['vectors_per_s']} vectors/s)")
+    for stage in report["stages"]:
+        print(f"{stage['stage']:<8}{stage['per_second']:>10} {stage['unit']}/s")
+
+    if args.json:
+        directory = os.path.dirname(args.json)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Local chunk store.
+
+Maps vector IDs to the chunk's text, source, chunk id, section and page
+in SQLite, so vectors in Endee only carry minimal metadata.  Searches
+fetch rows for the final hits in one batched lookup; text is stored
+zlib-compressed to keep the file compact.
+"""
+import os
+import sqlite3
+import threading
+import zlib
+from dotenv import load_dotenv
+from session import INDEX_NAME
+
+load_dotenv()
+
+# Keep chunk text locally instead of in vector metadata
+CHUNK_STORE = os.getenv("CHUNK_STORE", "1") == "1"
+CHUNK_STORE_PATH = os.getenv("CHUNK_STORE_PATH") or f".cache/chunks_{INDEX_NAME}.sqlite3"
+
+# Parameters per IN (...) query; SQLite's default limit is 999
+_LOOKUP_BATCH = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS chunks (
+    vector_id TEXT PRIMARY KEY,
+    source TEXT NOT NULL,
+    chunk_id TEXT NOT NULL,
+    section TEXT,
+    page INTEGER,
+    text BLOB NOT NULL
+);
+"""
+
+
+class ChunkStore:
+    """SQLite table of chunk rows keyed by vector ID."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def put_many(self, rows):
+        """Insert or replace rows of dicts with vector_id, source, chunk_id, section, page, text."""
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO chunks (vector_id, source, chunk_id, section, page, text) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (r["vector_id"], r["source"], r["chunk_id"], r.get("section") or "",
+                     r.get("page"), zlib.compress(r["text"].encode("utf-8")))
+                    for r in rows
+                ],
+            )
+            self._conn.commit()
+
+    def get_many(self, vector_ids):
+        """{vector_id: row dict} for the IDs that are stored."""
+        vector_ids = list(dict.fromkeys(vector_ids))
+        found = {}
+        with self._lock:
+            for i in range(0, len(vector_ids), _LOOKUP_BATCH):
+                batch = vector_ids[i:i + _LOOKUP_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                for vid, source, chunk_id, section, page, text in self._conn.execute(
+                    "SELECT vector_id, source, chunk_id, section, page, text FROM chunks "
+                    f"WHERE vector_id IN ({placeholders})",
+                    batch,
+                ):
+                    found[vid] = {
+                        "text": zlib.decompress(text).decode("utf-8"),
+                        "source": source,
+                        "chunk_id": chunk_id,
+                        "section": section,
+                        "page": page,
+                    }
+        return found
+
+    def delete_many(self, vector_ids):
+        with self._lock:
+            self._conn.executemany(
+                "DELETE FROM chunks WHERE vector_id = ?", [(vid,) for vid in vector_ids]
+            )
+            self._conn.commit()
+
+    def delete_source(self, source):
+        """Delete every row of source; returns their vector IDs."""
+        with self._lock:
+            vector_ids = [vid for (vid,) in self._conn.execute(
+                "SELECT vector_id FROM chunks WHERE source = ?", (source,)
+            )]
+            self._conn.execute("DELETE FROM chunks WHERE source = ?", (source,))
+            self._conn.commit()
+        return vector_ids
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_chunk_store():
+    """Return the process-wide chunk store, or None if CHUNK_STORE is off."""
+    global _store
+    if not CHUNK_STORE:
+        return None
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                directory = os.path.dirname(CHUNK_STORE_PATH)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                _store = ChunkStore(CHUNK_STORE_PATH)
+    return _store
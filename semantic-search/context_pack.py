@@ -0,0 +1,138 @@
+"""
+Token-budgeted packing of retrieved chunks into an LLM context.
+
+Chunks that sit next to each other in the same source and section are
+merged into one passage, sentences already given by a more relevant
+passage are dropped, and passages are added in relevance order until
+the token budget is used up.
+"""
+import os
+import re
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Approximate prompt tokens for retrieved context; 0 packs without a limit
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+
+# Rough characters per token for English text with Llama-style tokenizers
+_CHARS_PER_TOKEN = 4
+# Tokens reserved for each passage's "[Chunk i] (source: ...)" header
+_HEADER_TOKENS = 24
+_LABEL_PREFIX = re.compile(r'^\[([^\]\n]+)\]\s*')
+_SENTENCE_BREAK = re.compile(r'(?<=[.!?])\s+|\n+')
+_WHITESPACE = re.compile(r'\s+')
+_CHUNK_NUMBER = re.compile(r'(\d+)$')
+
+
+def estimate_tokens(text):
+    """Cheap token estimate; good enough to size a prompt without a tokenizer."""
+    return (len(text) + _CHARS_PER_TOKEN - 1) // _CHARS_PER_TOKEN
+
+
+def _chunk_number(chunk):
+    match = _CHUNK_NUMBER.search(str(chunk.get("chunk_id", "")))
+    return int(match.group(1)) if match else None
+
+
+def _strip_label(text):
+    """Drop the '[Section] ' prefix utils adds for embedding context."""
+    return _LABEL_PREFIX.sub("", text, count=1)
+
+
+def _section(chunk):
+    """Section of a chunk, falling back to its '[Section]' text prefix."""
+    if chunk.get("section"):
+        return chunk["section"]
+    match = _LABEL_PREFIX.match(chunk.get("text", ""))
+    return match.group(1) if match else ""
+
+
+def _passage_sentences(members):
+    """Non-empty sentences of a passage's chunks, in reading order."""
+    for member in members:
+        for sentence in _SENTENCE_BREAK.split(_strip_label(member.get("text", ""))):
+            sentence = sentence.strip()
+            if sentence:
+                yield sentence
+
+
+def _merge_adjacent(chunks):
+    """
+    Group chunks into passages of consecutive chunk numbers sharing a
+    source and section.  Each passage keeps the best (lowest) retrieval
+    rank of its members; passages come back in relevance order.
+    """
+    ranked = [(rank, chunk, _chunk_number(chunk)) for rank, chunk in enumerate(chunks)]
+    ordered = sorted(
+        (item for item in ranked if item[2] is not None),
+        key=lambda item: (item[1].get("source", ""), item[2]),
+    )
+
+    passages = []
+    previous = None
+    for rank, chunk, number in ordered:
+        key = (chunk.get("source", "unknown"), _section(chunk))
+        if previous is not None and previous[0] == key and number == previous[1] + 1:
+            passage = passages[-1]
+            passage["members"].append(chunk)
+            passage["rank"] = min(passage["rank"], rank)
+        else:
+            passages.append({"rank": rank, "members": [chunk]})
+        previous = (key, number)
+
+    # Chunks without a usable chunk number stay on their own
+    passages.extend(
+        {"rank": rank, "members": [chunk]} for rank, chunk, number in ranked if number is None
+    )
+    passages.sort(key=lambda p: p["rank"])
+    return passages
+
+
+def pack_context(chunks, token_budget=None):
+    """
+    Pack retrieved chunks (in relevance order) into at most token_budget
+    estimated tokens.
+
+    Returns a list of passages, each with 'source', 'section', 'page',
+    'similarity' (best of its chunks), 'chunk_ids' and 'text'.
+    """
+    if token_budget is None:
+        token_budget = CONTEXT_TOKEN_BUDGET
+    remaining = token_budget if token_budget > 0 else float("inf")
+
+    seen_sentences = set()
+    packed = []
+    for passage in _merge_adjacent(chunks):
+        if remaining <= _HEADER_TOKENS:
+            break
+        members = passage["members"]
+
+        budget = remaining - _HEADER_TOKENS
+        sentences = []
+        for sentence in _passage_sentences(members):
+            key = _WHITESPACE.sub(" ", sentence).lower()
+            if key in seen_sentences:
+                continue
+            cost = estimate_tokens(sentence) + 1
+            if cost > budget:
+                break
+            seen_sentences.add(key)
+            sentences.append(sentence)
+            budget -= cost
+        if not sentences:
+            continue
+
+        text = "\n".join(sentences)
+        remaining -= _HEADER_TOKENS + estimate_tokens(text)
+        first = members[0]
+        pages = [m.get("page") for m in members if m.get("page") is not None]
+        packed.append({
+            "source": first.get("source", "unknown"),
+            "section": _section(first),
+            "page": min(pages) if pages else None,
+            "similarity": max(m.get("similarity", 0) for m in members),
+            "chunk_ids": [m.get("chunk_id", "") for m in members],
+            "text": text,
+        })
+    return packed
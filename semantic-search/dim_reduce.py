@@ -0,0 +1,140 @@
+"""
+Dimensionality reduction of embeddings before they reach Endee.
+
+DIM_REDUCTION selects how model embeddings are mapped to the stored
+dimension REDUCED_DIM:
+
+    none      store the model's full output (default)
+    truncate  keep the first REDUCED_DIM components; only meaningful for
+              Matryoshka-trained models, whose leading dimensions carry
+              most of the signal
+    pca       project onto the top REDUCED_DIM principal components of a
+              corpus sample, fitted once and saved to PCA_PATH next to
+              the index (python dim_report.py --fit-pca)
+
+Chunk and query vectors go through the same reducer, and the index is
+created with the reduced dimension.  Changing the reduction needs a new
+index (or INDEX_NAME).  Embedding caches keep full-width vectors, so no
+re-encoding is needed.
+"""
+import os
+import threading
+import numpy as np
+from dotenv import load_dotenv
+from session import INDEX_NAME
+
+load_dotenv()
+
+METHODS = ("none", "truncate", "pca")
+DIM_REDUCTION = os.getenv("DIM_REDUCTION", "none").lower()
+REDUCED_DIM = int(os.getenv("REDUCED_DIM", "256"))
+PCA_PATH = os.getenv("PCA_PATH") or f".cache/pca_{INDEX_NAME}.npz"
+
+_reducer = None
+_reducer_lock = threading.Lock()
+
+
+class Truncate:
+    """Matryoshka truncation to the leading dim components."""
+
+    method = "truncate"
+
+    def __init__(self, dim):
+        self.dim = dim
+
+    def output_dim(self, input_dim):
+        if self.dim > input_dim:
+            raise ValueError(f"REDUCED_DIM={self.dim} exceeds the model dimension {input_dim}")
+        return self.dim
+
+    def __call__(self, vectors):
+        return np.asarray(vectors, dtype=np.float32)[:, :self.dim]
+
+
+class PCAProjection:
+    """Centering plus projection onto principal components (rows of components)."""
+
+    method = "pca"
+
+    def __init__(self, mean, components, explained_variance=None, model_key=""):
+        self.mean = np.asarray(mean, dtype=np.float32)
+        self.components = np.asarray(components, dtype=np.float32)
+        self.explained_variance = explained_variance
+        self.model_key = model_key
+
+    @classmethod
+    def fit(cls, vectors, dim, model_key=""):
+        """Fit on a (n, d) sample of embeddings; needs n >= dim."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if len(vectors) < dim:
+            raise ValueError(f"PCA to {dim} dimensions needs at least {dim} vectors, got {len(vectors)}")
+        if dim > vectors.shape[1]:
+            raise ValueError(f"REDUCED_DIM={dim} exceeds the model dimension {vectors.shape[1]}")
+        mean = vectors.mean(axis=0)
+        _, singular, vt = np.linalg.svd(vectors - mean, full_matrices=False)
+        variance = singular ** 2
+        return cls(mean, vt[:dim], float(variance[:dim].sum() / variance.sum()), model_key)
+
+    def output_dim(self, input_dim):
+        if input_dim != len(self.mean):
+            raise ValueError(
+                f"PCA in {PCA_PATH} was fitted on {len(self.mean)}-dim vectors; "
+                f"the model produces {input_dim}"
+            )
+        return len(self.components)
+
+    def __call__(self, vectors):
+        return (np.asarray(vectors, dtype=np.float32) - self.mean) @ self.components.T
+
+    def save(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = path + ".tmp.npz"
+        np.savez(tmp_path, mean=self.mean, components=self.components,
+                 explained_variance=np.float32(self.explained_variance or 0.0),
+                 model_key=np.array(self.model_key))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data["mean"], data["components"],
+                       float(data["explained_variance"]), str(data["model_key"]))
+
+
+def get_reducer(model_key):
+    """
+    Return the configured reducer, or None for DIM_REDUCTION=none.
+
+    A PCA projection must have been fitted for model_key first.
+    """
+    global _reducer
+    if DIM_REDUCTION not in METHODS:
+        raise ValueError(f"Unknown DIM_REDUCTION {DIM_REDUCTION!r}; expected one of {METHODS}")
+    if DIM_REDUCTION == "none":
+        return None
+    if _reducer is None:
+        with _reducer_lock:
+            if _reducer is None:
+                if DIM_REDUCTION == "truncate":
+                    _reducer = Truncate(REDUCED_DIM)
+                else:
+                    if not os.path.exists(PCA_PATH):
+                        raise RuntimeError(
+                            f"DIM_REDUCTION=pca but no projection at {PCA_PATH}; "
+                            "fit one with: python dim_report.py --fit-pca"
+                        )
+                    projection = PCAProjection.load(PCA_PATH)
+                    if projection.model_key != model_key:
+                        raise RuntimeError(
+                            f"PCA in {PCA_PATH} was fitted for {projection.model_key}, "
+                            f"not {model_key}; refit it with: python dim_report.py --fit-pca"
+                        )
+                    if len(projection.components) != REDUCED_DIM:
+                        raise RuntimeError(
+                            f"PCA in {PCA_PATH} projects to {len(projection.components)} "
+                            f"dimensions, not REDUCED_DIM={REDUCED_DIM}; refit it"
+                        )
+                    _reducer = projection
+    return _reducer
@@ -0,0 +1,128 @@
+"""
+Recall versus stored dimension, and PCA fitting for DIM_REDUCTION=pca.
+
+Embeds a sample of chunks from the PDFs under --pdfs with the configured
+model and, for each candidate dimension, reports bytes per vector and
+recall@k of exact search over truncated and PCA-projected vectors,
+against exact search over the model's full-width vectors.  Queries are
+short spans of the sampled chunks.
+
+    python dim_report.py --pdfs data --dims 64,128,256,384 --json dim_report.json
+    python dim_report.py --pdfs data --fit-pca
+
+--fit-pca fits the projection to REDUCED_DIM on the sample and saves it
+to PCA_PATH, where the app picks it up.  The PCA rows of the report use
+a projection fitted on the same sample, as in production.
+"""
+import argparse
+import json
+import os
+import numpy as np
+from dotenv import load_dotenv
+from dim_reduce import PCA_PATH, REDUCED_DIM, PCAProjection
+from embed import MODEL_KEY, embed_queries, generate_embeddings
+from pdf_extract import iter_pages
+from precision_report import vector_bytes
+from session import ENDEE_PRECISION
+from utils import iter_chunks
+
+load_dotenv()
+
+
+def sample_texts(pdf_dir, limit):
+    """Up to limit chunk texts from the PDFs under pdf_dir."""
+    texts = []
+    for directory, _, files in sorted(os.walk(pdf_dir)):
+        for name in sorted(files):
+            if name.lower().endswith(".pdf"):
+                texts.extend(c["text"] for c in iter_chunks(iter_pages(os.path.join(directory, name))))
+                if len(texts) >= limit:
+                    return texts[:limit]
+    return texts
+
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def _top_k(queries, corpus, k):
+    return np.argsort(-(_normalize(queries) @ _normalize(corpus).T), axis=1)[:, :k]
+
+
+def _recall(found, truth):
+    hits = sum(len(set(f) & set(t)) for f, t in zip(found.tolist(), truth.tolist()))
+    return hits / max(1, truth.size)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall versus stored dimension")
+    parser.add_argument("--pdfs", default="data", help="directory of PDFs to sample chunks from")
+    parser.add_argument("--sample", type=int, default=20000, help="chunks to sample")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--dims", default="64,128,192,256,384,512")
+    parser.add_argument("--fit-pca", action="store_true",
+                        help=f"fit the projection to REDUCED_DIM and save it to {PCA_PATH}")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="write the report to this file")
+    args = parser.parse_args()
+
+    texts = sample_texts(args.pdfs, args.sample)
+    if not texts:
+        parser.error(f"no PDF chunks found under {args.pdfs}")
+    corpus = np.asarray(generate_embeddings(texts), dtype=np.float32)
+    full_dim = corpus.shape[1]
+
+    if args.fit_pca:
+        projection = PCAProjection.fit(corpus, REDUCED_DIM, MODEL_KEY)
+        projection.save(PCA_PATH)
+        print(f"PCA {full_dim} -> {REDUCED_DIM} fitted on {len(corpus)} chunks "
+              f"({projection.explained_variance:.1%} of variance kept), saved to {PCA_PATH}")
+        return
+
+    rng = np.random.default_rng(args.seed)
+    queries = []
+    for i in rng.choice(len(texts), args.queries):
+        words = texts[i].split()
+        size = min(len(words), int(rng.integers(4, 10)))
+        offset = int(rng.integers(0, len(words) - size + 1))
+        queries.append(" ".join(words[offset:offset + size]))
+    query_vectors = np.asarray(embed_queries(queries), dtype=np.float32)
+
+    k = min(args.k, len(corpus))
+    truth = _top_k(query_vectors, corpus, k)
+    dims = sorted(d for d in (int(x) for x in args.dims.split(",")) if d < full_dim)
+    # Components are ordered by variance, so one fit serves every smaller dimension
+    pca_dim = min(max(dims), len(corpus)) if dims else 0
+    pca = PCAProjection.fit(corpus, pca_dim, MODEL_KEY) if pca_dim else None
+    projected_corpus = pca(corpus) if pca else None
+    projected_queries = pca(query_vectors) if pca else None
+
+    rows = [{"dim": full_dim, "bytes_per_vector": vector_bytes(ENDEE_PRECISION, full_dim),
+             "truncate": 1.0, "pca": 1.0}]
+    for dim in dims:
+        row = {"dim": dim, "bytes_per_vector": vector_bytes(ENDEE_PRECISION, dim),
+               "truncate": round(_recall(_top_k(query_vectors[:, :dim], corpus[:, :dim], k), truth), 4),
+               "pca": None}
+        if pca is not None and dim <= pca_dim:
+            found = _top_k(projected_queries[:, :dim], projected_corpus[:, :dim], k)
+            row["pca"] = round(_recall(found, truth), 4)
+        rows.append(row)
+    rows.sort(key=lambda r: r["dim"])
+
+    print(f"model={MODEL_KEY} corpus={len(corpus)} queries={len(queries)} k={k} "
+          f"precision={ENDEE_PRECISION}")
+    print(f"{'dim':>5}{'bytes/vec':>11}{'truncate':>10}{'pca':>8}")
+    for row in rows:
+        pca_recall = f"{row['pca']:.4f}" if row["pca"] is not None else "-"
+        print(f"{row['dim']:>5}{row['bytes_per_vector']:>11}{row['truncate']:>10.4f}{pca_recall:>8}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"model": MODEL_KEY, "corpus": len(corpus), "queries": len(queries),
+                       "k": k, "precision": ENDEE_PRECISION, f"recall@{k}": rows}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,119 +1,338 @@
 import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 from dotenv import load_dotenv
-from sentence_transformers import SentenceTransformer
-from endee import Endee, Precision
+from answer_cache import invalidate_answers
+from chunk_store import get_chunk_store
+from dim_reduce import get_reducer
+from embed_backend import EMBED_BACKEND, backend_model_key, load_model
+from embed_cache import EmbeddingCache, model_cache_dir, text_key
+from embed_pool import encode as pool_encode
+from metrics import count, span
+from query_cache import QueryCache, normalize_query
+from rescore import store_full_vectors
+from session import TRANSIENT_ERRORS, call_with_index
+from sparse import HYBRID_SEARCH, encode_documents
 
 load_dotenv()
 
-ENDEE_TOKEN = os.getenv("ENDEE_TOKEN", "")
-ENDEE_BASE_URL = os.getenv("ENDEE_BASE_URL", "http://localhost:8080/api/v1")
-INDEX_NAME = os.getenv("INDEX_NAME", "semantic_search")
 MODEL_NAME = os.getenv("EMBEDDING_MODEL", "all-mpnet-base-v2")
+# Caches are keyed per model and backend (see embed_backend.py)
+MODEL_KEY = backend_model_key(MODEL_NAME, EMBED_BACKEND)
 
-VECTOR_DIM = 768  # all-mpnet-base-v2 output dimension
+# On-disk cache of chunk embeddings, keyed by (model, hash of chunk text)
+EMBED_CACHE_ENABLED = os.getenv("EMBED_CACHE", "1") == "1"
+EMBED_CACHE_DIR = os.getenv("EMBED_CACHE_DIR", ".cache/embeddings")
+EMBED_CACHE_MAX_ENTRIES = int(os.getenv("EMBED_CACHE_MAX_ENTRIES", "200000"))
+
+# Query embedding cache: in-memory LRU with TTL, optional on-disk tier
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "1024"))
+QUERY_CACHE_TTL = int(os.getenv("QUERY_CACHE_TTL", "3600"))
+QUERY_CACHE_DIR = os.getenv("QUERY_CACHE_DIR", "")
+
+MAX_UPSERT_BATCH = 1000  # server-side limit on vectors per upsert
+# Retries of a failed upsert, with exponential backoff from UPSERT_BACKOFF seconds
+UPSERT_RETRIES = int(os.getenv("UPSERT_RETRIES", "4"))
+UPSERT_BACKOFF = float(os.getenv("UPSERT_BACKOFF", "0.5"))
 
 # Load the embedding model once at module level
 _model = None
+_model_lock = threading.Lock()
+_embedding_cache = None
+_query_cache = None
+_cache_lock = threading.Lock()
 
 
 def get_model():
+    """Return the process-wide embedding model (also loaded ahead of time by warmup.py)."""
     global _model
     if _model is None:
-        _model = SentenceTransformer(MODEL_NAME)
+        with _model_lock:
+            if _model is None:
+                _model = load_model(MODEL_NAME, EMBED_BACKEND)
     return _model
 
 
-def get_endee_client():
-    """Initialize Endee client with optional token authentication."""
-    if ENDEE_TOKEN:
-        client = Endee(token=ENDEE_TOKEN)
-    else:
-        client = Endee()
-    client.set_base_url(ENDEE_BASE_URL)
-    return client
-
-
-def ensure_index_exists(client):
-    """Create the search index if it doesn't already exist."""
-    existing = client.list_indexes()
-
-    # list_indexes may return a dict like {'indexes': [...]} or a plain list
-    index_names = []
-    if isinstance(existing, dict):
-        index_list = existing.get("indexes", [])
-    elif isinstance(existing, list):
-        index_list = existing
-    else:
-        index_list = []
-
-    for idx in index_list:
-        if isinstance(idx, dict):
-            index_names.append(idx.get("name", ""))
-        elif isinstance(idx, str):
-            index_names.append(idx)
-
-    if INDEX_NAME not in index_names:
-        client.create_index(
-            name=INDEX_NAME,
-            dimension=VECTOR_DIM,
-            space_type="cosine",
-            precision=Precision.FLOAT32
-        )
+def index_dimension():
+    """Dimension of the vectors stored in Endee: the model's, after any DIM_REDUCTION."""
+    dim = get_model().get_sentence_embedding_dimension()
+    reducer = get_reducer(MODEL_KEY)
+    return reducer.output_dim(dim) if reducer is not None else dim
+
+
+def reduce_vectors(vectors):
+    """Map model embeddings to the index dimension (unchanged without DIM_REDUCTION)."""
+    reducer = get_reducer(MODEL_KEY)
+    if reducer is None:
+        return vectors
+    return reducer(vectors).tolist()
+
+
+def get_embedding_cache():
+    """Return the chunk embedding cache for the current model, or None if disabled."""
+    global _embedding_cache
+    if not EMBED_CACHE_ENABLED:
+        return None
+    if _embedding_cache is None:
+        with _cache_lock:
+            if _embedding_cache is None:
+                _embedding_cache = EmbeddingCache(
+                    model_cache_dir(EMBED_CACHE_DIR, MODEL_KEY),
+                    dim=get_model().get_sentence_embedding_dimension(),
+                    max_entries=EMBED_CACHE_MAX_ENTRIES,
+                )
+    return _embedding_cache
+
 
-    return client.get_index(name=INDEX_NAME)
+def embedding_cache_stats():
+    """Hit/miss counters of the chunk embedding cache (empty if disabled)."""
+    cache = get_embedding_cache()
+    return cache.stats() if cache is not None else {}
+
+
+def _encode_chunks(texts):
+    """Encode chunk texts on the multi-process pool when enabled, else in-process."""
+    embeddings = pool_encode(MODEL_NAME, texts)
+    if embeddings is None:
+        embeddings = get_model().encode(texts, show_progress_bar=True)
+    return embeddings
 
 
 def generate_embeddings(texts):
-    """Convert a list of text strings into vector embeddings."""
-    model = get_model()
-    embeddings = model.encode(texts, show_progress_bar=True)
-    return embeddings.tolist()
+    """
+    Convert a list of text strings into vector embeddings.
+
+    Chunks seen before (same model, same text) are served from the
+    on-disk cache; only the remaining texts are encoded, spread over
+    the embedding worker pool for large batches (see embed_pool.py).
+    """
+    cache = get_embedding_cache()
+    if cache is None:
+        return _encode_chunks(texts).tolist()
+
+    keys = [text_key(t) for t in texts]
+    vectors = cache.get_many(keys)
+    missing = [i for i, v in enumerate(vectors) if v is None]
+
+    if missing:
+        encoded = _encode_chunks([texts[i] for i in missing])
+        cache.put_many([keys[i] for i in missing], encoded)
+        for i, vec in zip(missing, encoded):
+            vectors[i] = vec
+
+    return np.asarray(vectors, dtype=np.float32).tolist()
+
+
+def chunk_vector_id(chunk, source_filename):
+    """
+    Vector ID for a chunk.
+
+    Chunks with a content hash (set by the ingest manifest) get an ID
+    derived from it, so unchanged chunks keep their ID across re-ingests.
+    """
+    if chunk.get("hash"):
+        return f"{source_filename}_{chunk['hash'][:16]}"
+    return f"{source_filename}_{chunk['id']}"
+
+
+def chunk_filter_fields(chunk, source_filename):
+    """
+    Filterable fields stored with each vector: source, section and
+    chunk_hash are category fields, page is numeric (see docs/filter.md).
+    """
+    fields = {"source": source_filename}
+    if chunk.get("section"):
+        fields["section"] = chunk["section"]
+    if chunk.get("page") is not None:
+        fields["page"] = chunk["page"]
+    if chunk.get("hash"):
+        fields["chunk_hash"] = chunk["hash"]
+    return fields
+
+
+def _upsert_with_retry(batch):
+    """
+    Upsert one batch, retrying transient failures UPSERT_RETRIES times.
+
+    Waits UPSERT_BACKOFF * 2**attempt seconds (with jitter) between
+    attempts; upserts are idempotent by vector ID, so a retry after a
+    partially applied batch is safe.  Other errors (e.g. a rejected
+    payload) are raised at once.
+    """
+    for attempt in range(UPSERT_RETRIES + 1):
+        try:
+            with span("endee.upsert"):
+                return call_with_index(lambda index: index.upsert(batch), retry=False)
+        except TRANSIENT_ERRORS:
+            if attempt == UPSERT_RETRIES:
+                raise
+            count("endee_upsert_retries")
+            time.sleep(UPSERT_BACKOFF * 2 ** attempt * random.uniform(0.5, 1.5))
+
+
+def upsert_chunk_vectors(chunks, vectors, source_filename="unknown"):
+    """
+    Upsert one batch of already-embedded chunks and return how many were stored.
+
+    vectors are model embeddings; they are reduced to the index
+    dimension here.  With the local chunk store enabled, text lives
+    there and the vector only carries its chunk id; otherwise the text
+    goes into metadata.
+    """
+    vectors = reduce_vectors(vectors)
+    chunk_store = get_chunk_store()
+    vectors_to_upsert = []
+    for chunk, vector in zip(chunks, vectors):
+        meta = {"chunk_id": chunk["id"]}
+        if chunk_store is None:
+            meta.update(text=chunk["text"], source=source_filename)
+        vectors_to_upsert.append({
+            "id": chunk_vector_id(chunk, source_filename),
+            "vector": vector,
+            "meta": meta,
+            "filter": chunk_filter_fields(chunk, source_filename),
+        })
+
+    if chunk_store is not None:
+        # Written first so a search never sees a vector without its text
+        chunk_store.put_many([
+            {
+                "vector_id": item["id"],
+                "source": source_filename,
+                "chunk_id": chunk["id"],
+                "section": chunk.get("section"),
+                "page": chunk.get("page"),
+                "text": chunk["text"],
+            }
+            for item, chunk in zip(vectors_to_upsert, chunks)
+        ])
+
+    if HYBRID_SEARCH:
+        # BM25 term weights for the sparse leg of hybrid search
+        sparse = encode_documents(
+            [c["text"] for c in chunks], [item["id"] for item in vectors_to_upsert]
+        )
+        for item, (indices, values) in zip(vectors_to_upsert, sparse):
+            item["sparse_indices"] = indices
+            item["sparse_values"] = values
+
+    # Endee accepts at most 1000 vectors per upsert (pool-sized batches can be larger)
+    for i in range(0, len(vectors_to_upsert), MAX_UPSERT_BATCH):
+        _upsert_with_retry(vectors_to_upsert[i:i + MAX_UPSERT_BATCH])
+    vector_ids = [v["id"] for v in vectors_to_upsert]
+    store_full_vectors(vector_ids, vectors)
+    # Answers generated from the previous version of these chunks are stale
+    invalidate_answers(vector_ids)
+    return len(vectors_to_upsert)
 
 
 def store_chunks_in_endee(chunks, source_filename="unknown"):
     """
     Generate embeddings for text chunks and store them in Endee.
 
-    Each chunk is stored with its text as metadata so we can retrieve
-    the original content during search.
+    Each chunk's text is kept in the local chunk store (or in vector
+    metadata) so we can retrieve the original content during search.
+    Chunks are embedded batch by batch, and each finished batch is
+    upserted on a background thread while the next one is being encoded.
     """
     if not chunks:
         return 0
 
-    client = get_endee_client()
-    index = ensure_index_exists(client)
-
-    texts = [c["text"] for c in chunks]
-    embeddings = generate_embeddings(texts)
-
     # Endee supports max 1000 vectors per upsert, batch accordingly
     batch_size = 500
     total_stored = 0
+    pending = None
 
-    for i in range(0, len(chunks), batch_size):
-        batch_chunks = chunks[i:i + batch_size]
-        batch_vectors = embeddings[i:i + batch_size]
-
-        vectors_to_upsert = []
-        for j, chunk in enumerate(batch_chunks):
-            vectors_to_upsert.append({
-                "id": f"{source_filename}_{chunk['id']}",
-                "vector": batch_vectors[j],
-                "meta": {
-                    "text": chunk["text"],
-                    "source": source_filename,
-                    "chunk_id": chunk["id"]
-                }
-            })
-
-        index.upsert(vectors_to_upsert)
-        total_stored += len(vectors_to_upsert)
+    with ThreadPoolExecutor(max_workers=1) as upserter:
+        for i in range(0, len(chunks), batch_size):
+            batch_chunks = chunks[i:i + batch_size]
+            batch_vectors = generate_embeddings([c["text"] for c in batch_chunks])
+
+            # Keep at most one upsert in flight so memory stays bounded
+            if pending is not None:
+                total_stored += pending.result()
+            pending = upserter.submit(
+                upsert_chunk_vectors, batch_chunks, batch_vectors, source_filename
+            )
+
+        total_stored += pending.result()
 
     return total_stored
 
 
+def get_query_cache():
+    """Return the process-wide query embedding cache (None if QUERY_CACHE_SIZE is 0)."""
+    global _query_cache
+    if QUERY_CACHE_SIZE <= 0:
+        return None
+    if _query_cache is None:
+        with _cache_lock:
+            if _query_cache is None:
+                dim = get_model().get_sentence_embedding_dimension() if QUERY_CACHE_DIR else None
+                _query_cache = QueryCache(
+                    MODEL_KEY,
+                    max_entries=QUERY_CACHE_SIZE,
+                    ttl_seconds=QUERY_CACHE_TTL,
+                    disk_dir=QUERY_CACHE_DIR or None,
+                    dim=dim,
+                )
+    return _query_cache
+
+
+def query_cache_stats():
+    """Hit/miss counters of the query embedding cache (empty if disabled)."""
+    cache = get_query_cache()
+    return cache.stats() if cache is not None else {}
+
+
 def embed_single_query(query_text):
-    """Generate embedding for a single search query."""
+    """
+    Generate embedding for a single search query.
+
+    The normalized query is the cache key, so repeated and trivially
+    different queries (case, spacing, trailing punctuation) skip the
+    model; the model itself always sees the query as typed.
+    """
+    normalized = normalize_query(query_text)
+    cache = get_query_cache()
+    if cache is not None:
+        cached = cache.get(normalized)
+        if cached is not None:
+            return cached
+
     model = get_model()
-    embedding = model.encode([query_text])
-    return embedding[0].tolist()
+    embedding = model.encode([query_text])[0].tolist()
+
+    if cache is not None:
+        cache.put(normalized, embedding)
+    return embedding
+
+
+def embed_queries(query_texts):
+    """
+    Generate embeddings for many search queries at once.
+
+    Cached queries are served from the query cache; the rest are encoded
+    in a single vectorized model.encode call.
+    """
+    normalized = [normalize_query(q) for q in query_texts]
+    cache = get_query_cache()
+    vectors = [cache.get(n) if cache is not None else None for n in normalized]
+
+    missing = [i for i, v in enumerate(vectors) if v is None]
+    if missing:
+        # Encode each distinct query once, as first typed, even if it appears several times
+        first = {}
+        for i in missing:
+            first.setdefault(normalized[i], query_texts[i])
+        encoded = dict(zip(first, get_model().encode(list(first.values())).tolist()))
+        for i in missing:
+            vectors[i] = encoded[normalized[i]]
+        if cache is not None:
+            for text, vector in encoded.items():
+                cache.put(text, vector)
+
+    return vectors
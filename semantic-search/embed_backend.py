@@ -0,0 +1,186 @@
+"""
+Embedding inference backends.
+
+EMBED_BACKEND selects how the SentenceTransformer runs on CPU:
+
+    torch      PyTorch (default)
+    onnx       ONNX Runtime, exported once from the locally cached model
+    onnx-int8  ONNX Runtime with dynamic int8 quantization of that export
+
+Exports are written under ONNX_EXPORT_DIR and reused.  The ONNX backends
+need sentence-transformers>=3.2 with its onnx extra
+(pip install "sentence-transformers[onnx]").  Check a backend against
+PyTorch before switching:
+
+    python embed_backend.py --backend onnx-int8 --json backend_report.json
+"""
+import argparse
+import glob
+import json
+import os
+import time
+import numpy as np
+from dotenv import load_dotenv
+from embed_cache import model_cache_dir
+
+load_dotenv()
+
+BACKENDS = ("torch", "onnx", "onnx-int8")
+EMBED_BACKEND = os.getenv("EMBED_BACKEND", "torch").lower()
+ONNX_EXPORT_DIR = os.getenv("ONNX_EXPORT_DIR", ".cache/onnx")
+# Target instruction set for int8 quantization: arm64, avx2, avx512 or avx512_vnni
+ONNX_QUANT_CONFIG = os.getenv("ONNX_QUANT_CONFIG", "avx2")
+
+
+def backend_model_key(model_name, backend=EMBED_BACKEND):
+    """
+    Name used to key caches of vectors produced by a model + backend.
+
+    PyTorch keeps the plain model name so existing caches stay valid.
+    """
+    return model_name if backend == "torch" else f"{model_name}@{backend}"
+
+
+def _onnx_export_dir(model_name):
+    """Export the model to ONNX once and return the directory holding it."""
+    export_dir = model_cache_dir(ONNX_EXPORT_DIR, model_name)
+    exported = (os.path.join(export_dir, "onnx", "model.onnx"), os.path.join(export_dir, "model.onnx"))
+    if not any(os.path.exists(path) for path in exported):
+        from sentence_transformers import SentenceTransformer
+        # Exports from the locally cached PyTorch weights
+        model = SentenceTransformer(model_name, backend="onnx", device="cpu")
+        model.save(export_dir)
+    return export_dir
+
+
+def _quantized_file(export_dir):
+    """Dynamic int8 quantization of the ONNX export (created on first use)."""
+    file_name = f"onnx/model_qint8_{ONNX_QUANT_CONFIG}.onnx"
+    if not os.path.exists(os.path.join(export_dir, file_name)):
+        try:
+            from sentence_transformers import SentenceTransformer, export_dynamic_quantized_onnx_model
+        except ImportError as exc:
+            raise RuntimeError(
+                "EMBED_BACKEND=onnx-int8 needs sentence-transformers>=3.2 "
+                "installed with the onnx extra"
+            ) from exc
+        model = SentenceTransformer(export_dir, backend="onnx", device="cpu")
+        export_dynamic_quantized_onnx_model(model, ONNX_QUANT_CONFIG, export_dir)
+    return file_name
+
+
+def load_model(model_name, backend=EMBED_BACKEND):
+    """
+    Load model_name for the given backend.
+
+    sentence_transformers (and torch) are imported here rather than at
+    module level, so importing the app stays fast.
+    """
+    from sentence_transformers import SentenceTransformer
+    if backend == "torch":
+        return SentenceTransformer(model_name)
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown EMBED_BACKEND {backend!r}; expected one of {BACKENDS}")
+
+    export_dir = _onnx_export_dir(model_name)
+    if backend == "onnx":
+        return SentenceTransformer(export_dir, backend="onnx", device="cpu")
+    return SentenceTransformer(
+        export_dir, backend="onnx", device="cpu",
+        model_kwargs={"file_name": _quantized_file(export_dir)},
+    )
+
+
+# ── verification ────────────────────────────────────────────────
+
+def _sample_texts(pdf_dir, limit, seed):
+    """Chunk texts from PDFs in pdf_dir, or synthetic text if there are none."""
+    # Imported here: the app and embedding workers only need load_model()
+    from benchmark import make_vocabulary, synthetic_pages
+    from pdf_extract import iter_pages
+    from utils import iter_chunks
+    texts = []
+    for path in sorted(glob.glob(os.path.join(pdf_dir, "*.pdf"))):
+        texts.extend(c["text"] for c in iter_chunks(iter_pages(path)))
+        if len(texts) >= limit:
+            break
+    if not texts:
+        rng = np.random.default_rng(seed)
+        pages = synthetic_pages(rng, make_vocabulary(rng), max(1, limit // 8))
+        texts = [c["text"] for c in iter_chunks("\n".join(lines) for lines in pages)]
+    return texts[:limit]
+
+
+def _encode(model, texts):
+    start = time.perf_counter()
+    vectors = model.encode(texts, batch_size=64, convert_to_numpy=True, normalize_embeddings=True)
+    return vectors, time.perf_counter() - start
+
+
+def compare(model_name, backend, texts, num_queries=100, k=10, seed=0):
+    """
+    Cosine agreement and retrieval recall@k of backend against PyTorch.
+
+    Queries are short spans of the sample texts; recall compares each
+    backend's top-k neighbours (query and corpus both encoded by the
+    backend) with PyTorch's.
+    """
+    rng = np.random.default_rng(seed)
+    queries = []
+    for i in rng.choice(len(texts), min(num_queries, len(texts)), replace=False):
+        words = texts[i].split()
+        size = min(len(words), int(rng.integers(4, 10)))
+        offset = int(rng.integers(0, len(words) - size + 1))
+        queries.append(" ".join(words[offset:offset + size]))
+
+    reference = load_model(model_name, "torch")
+    candidate = load_model(model_name, backend)
+    ref_corpus, ref_seconds = _encode(reference, texts)
+    cand_corpus, cand_seconds = _encode(candidate, texts)
+    ref_queries, _ = _encode(reference, queries)
+    cand_queries, _ = _encode(candidate, queries)
+
+    agreement = np.sum(ref_corpus * cand_corpus, axis=1)
+    k = min(k, len(texts))
+    truth = np.argsort(-(ref_queries @ ref_corpus.T), axis=1)[:, :k]
+    found = np.argsort(-(cand_queries @ cand_corpus.T), axis=1)[:, :k]
+    hits = sum(len(set(t) & set(f)) for t, f in zip(truth.tolist(), found.tolist()))
+
+    return {
+        "model": model_name,
+        "backend": backend,
+        "texts": len(texts),
+        "queries": len(queries),
+        "cosine_mean": round(float(agreement.mean()), 6),
+        "cosine_min": round(float(agreement.min()), 6),
+        f"recall@{k}": round(hits / max(1, k * len(queries)), 4),
+        "torch_texts_per_s": round(len(texts) / ref_seconds, 2),
+        "backend_texts_per_s": round(len(texts) / cand_seconds, 2),
+        "speedup": round(ref_seconds / cand_seconds, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare an embedding backend with PyTorch")
+    parser.add_argument("--backend", default="onnx-int8", choices=BACKENDS)
+    parser.add_argument("--model", default=os.getenv("EMBEDDING_MODEL", "all-mpnet-base-v2"))
+    parser.add_argument("--pdfs", default="data", help="directory of PDFs to sample chunks from")
+    parser.add_argument("--texts", type=int, default=1000)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="write the report to this file")
+    args = parser.parse_args()
+
+    texts = _sample_texts(args.pdfs, args.texts, args.seed)
+    report = compare(args.model, args.backend, texts, args.queries, args.k, args.seed)
+    for key, value in report.items():
+        print(f"{key:<22}{value}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
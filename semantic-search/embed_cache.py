@@ -0,0 +1,350 @@
+"""
+Content-addressed on-disk cache for embedding vectors.
+
+Vectors live in a memory-mapped float32 array (``vectors.f32``) and an
+index maps each key to its row.  The index is a snapshot
+(``index.json``) plus an append-only log of puts and deletes since then
+(``index.log``), so writes cost O(batch) rather than rewriting the
+whole index; the log is folded into the snapshot once it outgrows it.
+One cache directory is used per model, so keys only need to identify
+the text.
+
+Several processes can share a cache directory (the app and a bulk
+ingest, or two app servers).  Writes take an exclusive flock(2) on the
+directory's lock file and reads a shared one, and each operation first
+catches up with what other processes appended to the log, grew the
+vectors file by, or compacted in the meantime.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+from contextlib import contextmanager
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+_INDEX_FILE = "index.json"
+_LOG_FILE = "index.log"
+_VECTORS_FILE = "vectors.f32"
+_LOCK_FILE = "lock"
+_INITIAL_CAPACITY = 1024
+# The log is folded into the snapshot once it has this many records and
+# more records than the snapshot has entries
+_MIN_COMPACT_RECORDS = 10_000
+
+
+def text_key(text):
+    """Stable content hash used as the cache key for a piece of text."""
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def model_cache_dir(root, model_name):
+    """Directory holding the cache for one embedding model."""
+    safe = re.sub(r"[^\w.-]+", "_", model_name)
+    return os.path.join(root, safe)
+
+
+class EmbeddingCache:
+    """
+    Fixed-width vector store keyed by string, bounded by max_entries.
+
+    When full, the least recently used rows are evicted and their slots
+    reused, so the vectors file never grows past max_entries rows.
+    Set max_entries to 0 for an unbounded store.  Recency from lookups
+    is kept in memory and only persisted when the log is compacted.
+    """
+
+    def __init__(self, directory, dim, max_entries=200_000):
+        self.directory = directory
+        self.dim = dim
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = {}   # key -> [slot, last_used]
+        self._free = []      # None until recomputed after another process's changes
+        self._tick = 0
+        self._capacity = 0
+        self._vectors = None
+        self._log = None
+        self._log_records = 0
+        self._log_offset = 0      # bytes of index.log applied so far
+        self._torn = False        # index.log ends in a record cut short by a crash
+        self._snapshot_id = None  # identity of the index.json that was loaded
+
+        os.makedirs(directory, exist_ok=True)
+        self._lock_file = open(os.path.join(directory, _LOCK_FILE), "a")
+        with self._locked(exclusive=True, sync=False):
+            self._load()
+
+    # ── persistence ─────────────────────────────────────────────
+
+    def _index_path(self):
+        return os.path.join(self.directory, _INDEX_FILE)
+
+    def _vectors_path(self):
+        return os.path.join(self.directory, _VECTORS_FILE)
+
+    def _log_path(self):
+        return os.path.join(self.directory, _LOG_FILE)
+
+    def _snapshot_stat(self):
+        try:
+            st = os.stat(self._index_path())
+        except FileNotFoundError:
+            return None
+        return st.st_ino, st.st_mtime_ns, st.st_size
+
+    @contextmanager
+    def _locked(self, exclusive, sync=True):
+        """Hold the thread lock and the directory's flock, caught up with other processes."""
+        with self._lock:
+            if fcntl is not None:
+                fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                if sync:
+                    self._sync()
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_UN)
+
+    def _sync(self):
+        """Apply what other processes wrote since this one last looked."""
+        if self._snapshot_stat() != self._snapshot_id:
+            # Compacted (or started over) elsewhere: the log was truncated too
+            self._log.close()
+            self._entries, self._log_records, self._log_offset = {}, 0, 0
+            self._load()
+            return
+        log_size = os.path.getsize(self._log_path())
+        if log_size != self._log_offset:
+            self._replay_log()
+            self._free = None
+        capacity = os.path.getsize(self._vectors_path()) // (self.dim * 4)
+        if capacity != self._capacity:
+            self._map(capacity)
+            self._free = None
+
+    def _map(self, capacity):
+        self._vectors = None
+        self._capacity = capacity
+        self._vectors = np.memmap(
+            self._vectors_path(), dtype=np.float32, mode="r+",
+            shape=(self._capacity, self.dim),
+        )
+
+    def _load(self):
+        data = None
+        if os.path.exists(self._index_path()) and os.path.exists(self._vectors_path()):
+            with open(self._index_path(), "r", encoding="utf-8") as f:
+                data = json.load(f)
+        if data is None or data.get("dim") != self.dim or not data.get("capacity"):
+            # Unknown or mismatched layout: start over
+            self._entries, self._free, self._tick = {}, [], 0
+            self._vectors, self._capacity = None, 0
+            if os.path.exists(self._vectors_path()):
+                os.remove(self._vectors_path())
+            initial = _INITIAL_CAPACITY
+            if self.max_entries:
+                initial = min(initial, self.max_entries)
+            self._grow(initial)
+            self._compact()
+            return
+
+        self._snapshot_id = self._snapshot_stat()
+        self._entries = data.get("entries", {})
+        self._tick = data.get("tick", 0)
+        self._log = open(self._log_path(), "a", encoding="utf-8")
+        self._replay_log()
+        # The vectors file may have grown since the snapshot
+        self._map(os.path.getsize(self._vectors_path()) // (self.dim * 4))
+        self._entries = {k: e for k, e in self._entries.items() if e[0] < self._capacity}
+        self._free = None
+
+    def _replay_log(self):
+        """Apply the part of index.log this process has not seen yet."""
+        with open(self._log_path(), "rb") as f:
+            f.seek(self._log_offset)
+            tail = f.read()
+        self._log_offset += len(tail)
+        lines = tail.split(b"\n")
+        # The last piece is empty unless a crash cut the final record short
+        self._torn = bool(lines[-1]) or (self._torn and not tail)
+        for line in lines[:-1]:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record[0] == "p":
+                self._entries[record[1]] = [record[2], record[3]]
+                self._tick = max(self._tick, record[3])
+            else:
+                self._entries.pop(record[1], None)
+            self._log_records += 1
+
+    def _append_log(self, records):
+        if not records:
+            return
+        # Start a new line after a record cut short by a crash
+        prefix = "\n" if self._torn else ""
+        lines = "".join(json.dumps(r, separators=(",", ":")) + "\n" for r in records)
+        self._log.write(prefix + lines)
+        self._log.flush()
+        self._torn = False
+        self._log_offset = os.fstat(self._log.fileno()).st_size
+        self._log_records += len(records)
+
+    def _free_slots(self):
+        if self._free is None:
+            used = {slot for slot, _ in self._entries.values()}
+            self._free = sorted(set(range(self._capacity)) - used, reverse=True)
+        return self._free
+
+    def _compact(self):
+        """Write a snapshot of the index and start an empty log."""
+        self._vectors.flush()
+        data = {
+            "dim": self.dim,
+            "capacity": self._capacity,
+            "tick": self._tick,
+            "entries": self._entries,
+        }
+        tmp_path = self._index_path() + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, separators=(",", ":"))
+        os.replace(tmp_path, self._index_path())
+        self._snapshot_id = self._snapshot_stat()
+        if self._log is not None:
+            self._log.close()
+        self._log = open(self._log_path(), "w", encoding="utf-8")
+        self._log_records = 0
+        self._log_offset = 0
+        self._torn = False
+
+    def _grow(self, new_capacity):
+        if self._vectors is not None:
+            self._vectors.flush()
+            self._vectors = None
+        with open(self._vectors_path(), "ab") as f:
+            f.truncate(new_capacity * self.dim * 4)
+        self._free_slots().extend(range(new_capacity - 1, self._capacity - 1, -1))
+        self._map(new_capacity)
+
+    def flush(self):
+        """Make every change so far durable: vectors first, then the index log."""
+        with self._lock:
+            self._vectors.flush()
+            self._log.flush()
+            os.fsync(self._log.fileno())
+
+    # ── lookups ─────────────────────────────────────────────────
+
+    def get_many(self, keys):
+        """Return a list with a vector (np.ndarray) or None for each key."""
+        out = []
+        with self._locked(exclusive=False):
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is None:
+                    self.misses += 1
+                    out.append(None)
+                    continue
+                self._tick += 1
+                entry[1] = self._tick
+                self.hits += 1
+                out.append(np.array(self._vectors[entry[0]]))
+        return out
+
+    def put_many(self, keys, vectors):
+        """Store vectors under keys, evicting old rows if the cache is full."""
+        with self._locked(exclusive=True):
+            evicted = []
+            records = []
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is None:
+                    slot = self._take_slot(evicted)
+                    entry = self._entries[key] = [slot, 0]
+                self._tick += 1
+                entry[1] = self._tick
+                records.append(["p", key, entry[0], entry[1]])
+            # Evictions are logged before their rows are overwritten, so a
+            # crash never leaves an old key pointing at a new vector
+            self._append_log([["d", key] for key in evicted])
+            for record, vec in zip(records, vectors):
+                self._vectors[record[2]] = vec
+            self._vectors.flush()
+            self._append_log(records)
+            if self._log_records > max(_MIN_COMPACT_RECORDS, len(self._entries)):
+                self._compact()
+
+    def delete_many(self, keys):
+        """Forget keys and release their rows."""
+        with self._locked(exclusive=True):
+            records = []
+            for key in keys:
+                entry = self._entries.pop(key, None)
+                if entry is not None:
+                    self._free_slots().append(entry[0])
+                    records.append(["d", key])
+            self._append_log(records)
+
+    def keys(self):
+        """Snapshot of every stored key."""
+        with self._locked(exclusive=False):
+            return list(self._entries)
+
+    def iter_batches(self, batch_size=65536):
+        """Yield (keys, vectors) over all stored rows, without touching LRU order."""
+        with self._locked(exclusive=False):
+            items = sorted((slot, key) for key, (slot, _) in self._entries.items())
+        for i in range(0, len(items), batch_size):
+            batch = items[i:i + batch_size]
+            with self._locked(exclusive=False):
+                vectors = np.array(self._vectors[[slot for slot, _ in batch]])
+            yield [key for _, key in batch], vectors
+
+    def _take_slot(self, evicted):
+        if not self._free_slots():
+            if self.max_entries and self._capacity >= self.max_entries:
+                evicted.extend(self._evict(max(1, self.max_entries // 10)))
+            else:
+                new_capacity = self._capacity * 2
+                if self.max_entries:
+                    new_capacity = min(new_capacity, self.max_entries)
+                self._grow(new_capacity)
+        return self._free.pop()
+
+    def _evict(self, count):
+        oldest = sorted(self._entries.items(), key=lambda kv: kv[1][1])[:count]
+        for key, (slot, _) in oldest:
+            del self._entries[key]
+            self._free_slots().append(slot)
+        return [key for key, _ in oldest]
+
+    # ── stats ───────────────────────────────────────────────────
+
+    def __len__(self):
+        with self._locked(exclusive=False):
+            return len(self._entries)
+
+    def __contains__(self, key):
+        with self._locked(exclusive=False):
+            return key in self._entries
+
+    def stats(self):
+        """Hit/miss counters for this process plus current size."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "entries": len(self._entries),
+            "capacity": self._capacity,
+        }
@@ -0,0 +1,147 @@
+"""
+Multi-process embedding pool for large ingests.
+
+EMBED_WORKERS processes each hold a warm replica of the embedding model
+(loaded once, when the pool starts) and split the host's cores between
+them.  encode() sorts texts by length so every shard holds texts of
+similar length (less padding), fans the shards out across the workers,
+and returns the vectors in input order.  The pool lives for the whole
+process, so later uploads reuse the loaded replicas.
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
+from dotenv import load_dotenv
+from embed_backend import EMBED_BACKEND, load_model
+
+load_dotenv()
+
+# Worker processes with a model replica each; 0 encodes in-process
+EMBED_WORKERS = int(os.getenv("EMBED_WORKERS", "0"))
+# Texts per task sent to a worker
+EMBED_SHARD_SIZE = int(os.getenv("EMBED_SHARD_SIZE", "64"))
+# Smaller batches are encoded in-process, where IPC would cost more than it saves
+EMBED_POOL_MIN_TEXTS = int(os.getenv("EMBED_POOL_MIN_TEXTS", "128"))
+# Seconds to wait for every worker to load its replica when the pool starts
+EMBED_POOL_START_TIMEOUT = float(os.getenv("EMBED_POOL_START_TIMEOUT", "600"))
+
+_pool = None
+_pool_lock = threading.Lock()
+_worker_model = None
+
+
+# ── worker side ─────────────────────────────────────────────────
+
+def _init_worker(model_name, backend, threads):
+    global _worker_model
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    _worker_model = load_model(model_name, backend)
+
+
+def _ping(barrier):
+    # Holds this worker until every worker has a task, so each one answers
+    barrier.wait()
+    return os.getpid()
+
+
+def _encode_shard(texts):
+    return np.asarray(_worker_model.encode(texts, convert_to_numpy=True), dtype=np.float32)
+
+
+# ── parent side ─────────────────────────────────────────────────
+
+def get_pool(model_name):
+    """
+    Return the shared pool, starting and warming it on first use.
+
+    Returns None when EMBED_WORKERS is 0.
+    """
+    global _pool
+    if EMBED_WORKERS <= 0:
+        return None
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                threads = max(1, (os.cpu_count() or 1) // EMBED_WORKERS)
+                # spawn: forking a process that already loaded torch is unsafe
+                pool = ProcessPoolExecutor(
+                    max_workers=EMBED_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(model_name, EMBED_BACKEND, threads),
+                )
+                _start_workers(pool)
+                _pool = pool
+    return _pool
+
+
+def _start_workers(pool):
+    """
+    Load the model replica in every worker before the pool is used.
+
+    One idle worker could answer a series of plain pings on its own, so
+    each ping waits on a barrier sized to the pool: it only passes once
+    all EMBED_WORKERS processes have run their initializer, i.e. loaded
+    the model.  Raises BrokenProcessPool, after shutting the pool down, if
+    a worker dies or they are not all up within EMBED_POOL_START_TIMEOUT.
+    """
+    with multiprocessing.get_context("spawn").Manager() as manager:
+        barrier = manager.Barrier(EMBED_WORKERS, timeout=EMBED_POOL_START_TIMEOUT)
+        futures = [pool.submit(_ping, barrier) for _ in range(EMBED_WORKERS)]
+        try:
+            for future in futures:
+                future.result()
+        except Exception as exc:
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise BrokenProcessPool(f"embedding workers failed to start: {exc}") from exc
+
+
+def pool_batch_size(default):
+    """Embed batch size that gives every worker at least one shard."""
+    if EMBED_WORKERS <= 0:
+        return default
+    return max(default, EMBED_WORKERS * EMBED_SHARD_SIZE)
+
+
+def shutdown_pool():
+    """Stop the workers (they are restarted on the next large encode)."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def encode(model_name, texts):
+    """
+    Encode texts on the pool and return a float32 array in input order.
+
+    Returns None if the pool is disabled, the batch is below
+    EMBED_POOL_MIN_TEXTS, or a worker died (the pool is then reset), so
+    the caller can fall back to encoding in-process.
+    """
+    if EMBED_WORKERS <= 0 or len(texts) < EMBED_POOL_MIN_TEXTS:
+        return None
+
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+    shards = [order[i:i + EMBED_SHARD_SIZE] for i in range(0, len(order), EMBED_SHARD_SIZE)]
+    try:
+        pool = get_pool(model_name)
+        futures = [pool.submit(_encode_shard, [texts[i] for i in shard]) for shard in shards]
+        out = None
+        for shard, future in zip(shards, futures):
+            vectors = future.result()
+            if out is None:
+                out = np.empty((len(texts), vectors.shape[1]), dtype=np.float32)
+            out[shard] = vectors
+    except BrokenProcessPool:
+        shutdown_pool()
+        return None
+    return out
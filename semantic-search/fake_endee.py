@@ -0,0 +1,171 @@
+"""
+In-process stand-in for the Endee client.
+
+Implements the subset of the SDK the app uses (create/list/get/delete
+indexes; upsert, query, delete_with_filter and update_filters on an
+index) with exact brute-force search in numpy, so benchmarks and local
+experiments can run without a server.  Install it with
+session.use_client(FakeEndee()).
+"""
+import threading
+import time
+import numpy as np
+
+
+def _matches(fields, conditions):
+    """Evaluate an Endee filter array ($eq, $in, $range) against filter fields."""
+    for condition in conditions or []:
+        for field, op in condition.items():
+            value = fields.get(field)
+            if "$eq" in op and value != op["$eq"]:
+                return False
+            if "$in" in op and value not in op["$in"]:
+                return False
+            if "$range" in op:
+                low, high = op["$range"]
+                if value is None or not low <= value <= high:
+                    return False
+    return True
+
+
+class FakeIndex:
+    """One index: dense vectors (unit-normalized) plus optional sparse vectors."""
+
+    def __init__(self, name, dimension, space_type="cosine", latency_ms=0.0):
+        self.name = name
+        self.dimension = dimension
+        self.space_type = space_type
+        self.latency_ms = latency_ms
+        self._lock = threading.Lock()
+        self._rows = {}           # id -> row number
+        self._ids = []
+        self._vectors = np.zeros((0, dimension), dtype=np.float32)
+        self._items = []          # row -> {"meta", "filter", "sparse"}
+
+    def _delay(self):
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+
+    def upsert(self, vectors):
+        self._delay()
+        if len(vectors) > 1000:
+            raise ValueError("at most 1000 vectors per upsert")
+        with self._lock:
+            new_rows = []
+            for item in vectors:
+                vec = np.asarray(item.get("vector", np.zeros(self.dimension)), dtype=np.float32)
+                if vec.shape != (self.dimension,):
+                    raise ValueError(f"expected dimension {self.dimension}, got {vec.shape}")
+                vec = vec / (np.linalg.norm(vec) or 1.0)
+                record = {
+                    "meta": item.get("meta", {}),
+                    "filter": item.get("filter", {}),
+                    "sparse": dict(zip(item.get("sparse_indices", []), item.get("sparse_values", []))),
+                }
+                row = self._rows.get(item["id"])
+                if row is None:
+                    self._rows[item["id"]] = len(self._ids)
+                    new_rows.append(vec)
+                    self._ids.append(item["id"])
+                    self._items.append(record)
+                elif row >= len(self._vectors):
+                    # Repeated within this batch
+                    new_rows[row - len(self._vectors)] = vec
+                    self._items[row] = record
+                else:
+                    self._vectors[row] = vec
+                    self._items[row] = record
+            if new_rows:
+                self._vectors = np.vstack([self._vectors, np.asarray(new_rows)])
+        return f"{len(vectors)} vectors upserted"
+
+    def query(self, vector=None, sparse_indices=None, sparse_values=None, top_k=10,
+              ef=None, filter=None, include_vectors=False):
+        self._delay()
+        if not 1 <= top_k <= 4096:
+            raise ValueError("top_k must be between 1 and 4096")
+        with self._lock:
+            rows = [r for r in range(len(self._ids)) if _matches(self._items[r]["filter"], filter)]
+            if not rows:
+                return []
+            if vector is not None:
+                query = np.asarray(vector, dtype=np.float32)
+                query = query / (np.linalg.norm(query) or 1.0)
+                scores = self._vectors[rows] @ query
+            else:
+                weights = dict(zip(sparse_indices or [], sparse_values or []))
+                scores = np.array([
+                    sum(w * self._items[r]["sparse"].get(i, 0.0) for i, w in weights.items())
+                    for r in rows
+                ], dtype=np.float32)
+            order = np.argsort(-scores)[:top_k]
+            results = []
+            for j in order:
+                row = rows[j]
+                if vector is None and scores[j] <= 0:
+                    break
+                hit = {
+                    "id": self._ids[row],
+                    "similarity": float(scores[j]),
+                    "meta": self._items[row]["meta"],
+                    "filter": self._items[row]["filter"],
+                }
+                if include_vectors:
+                    hit["vector"] = self._vectors[row].tolist()
+                results.append(hit)
+            return results
+
+    def delete_with_filter(self, filter):
+        self._delay()
+        with self._lock:
+            keep = [r for r in range(len(self._ids)) if not _matches(self._items[r]["filter"], filter)]
+            removed = len(self._ids) - len(keep)
+            self._ids = [self._ids[r] for r in keep]
+            self._items = [self._items[r] for r in keep]
+            self._vectors = self._vectors[keep]
+            self._rows = {vid: row for row, vid in enumerate(self._ids)}
+        return f"{removed} vectors deleted"
+
+    def update_filters(self, updates):
+        """Replace the filter fields of existing vectors; updates are {"id", "filter"} dicts."""
+        self._delay()
+        updated = 0
+        with self._lock:
+            for item in updates:
+                row = self._rows.get(item["id"])
+                if row is not None:
+                    self._items[row]["filter"] = item["filter"]
+                    updated += 1
+        return f"{updated} filters updated"
+
+    def __len__(self):
+        return len(self._ids)
+
+
+class FakeEndee:
+    """Client holding FakeIndex objects by name."""
+
+    def __init__(self, latency_ms=0.0):
+        self.latency_ms = latency_ms
+        self._indexes = {}
+
+    def set_base_url(self, url):
+        self.base_url = url
+
+    def list_indexes(self):
+        return {"indexes": [{"name": name} for name in self._indexes]}
+
+    def create_index(self, name, dimension, space_type="cosine", precision=None, **options):
+        if name in self._indexes:
+            raise ValueError(f"Index {name} already exists")
+        self._indexes[name] = FakeIndex(name, dimension, space_type, self.latency_ms)
+        return f"Index {name} created"
+
+    def get_index(self, name):
+        if name not in self._indexes:
+            raise KeyError(f"Index {name} not found")
+        return self._indexes[name]
+
+    def delete_index(self, name):
+        self._indexes.pop(name, None)
+        return f"Index {name} deleted"
@@ -0,0 +1,255 @@
+"""
+Incremental, hash-based (re-)indexing.
+
+Plugs into IngestPipeline: unchanged files are skipped by content hash,
+changed files are diffed chunk by chunk against the manifest, only new
+chunks are embedded and upserted, and chunks that disappeared are
+deleted in bulk through the server's /vectors/delete endpoint.  New
+chunks that are near-duplicates of indexed ones can be linked to the
+existing vector instead of embedded (see near_dup.py).
+
+Unchanged chunks keep their vector, but their position (chunk number,
+section, page) is rewritten in the chunk store and the vector's filter
+fields when it moved, so adjacency and page filters stay right.  The
+first manifest ingest of a source deletes whatever vectors it already
+had: those predate the manifest and use position-based IDs.
+"""
+import os
+import threading
+from dotenv import load_dotenv
+from answer_cache import invalidate_answers
+from chunk_store import get_chunk_store
+from embed import chunk_filter_fields, chunk_vector_id, upsert_chunk_vectors
+from manifest import IngestManifest, content_hash
+from metrics import span
+from near_dup import filter_chunks, get_near_dup_index
+from pipeline import SkipFile
+from rescore import delete_full_vectors
+from session import call_with_index
+from sparse import HYBRID_SEARCH, remove_documents
+from writer_lock import require_writer
+
+load_dotenv()
+
+MANIFEST_PATH = os.getenv("MANIFEST_PATH", ".cache/ingest_manifest.sqlite3")
+
+# Values per $in condition when deleting by chunk hash
+DELETE_BATCH_SIZE = 500
+
+_manifest = None
+_lock = threading.Lock()
+_pending = {}  # source -> content hash to record once the file completes
+_pending_links = {}  # source -> near-duplicate links to record once the file completes
+_pending_signatures = {}  # source -> {vector ID: MinHash signature} to add once upserted
+
+
+def get_manifest():
+    """Return the process-wide ingest manifest."""
+    global _manifest
+    if _manifest is None:
+        with _lock:
+            if _manifest is None:
+                directory = os.path.dirname(MANIFEST_PATH)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                _manifest = IngestManifest(MANIFEST_PATH)
+    return _manifest
+
+
+def indexed_sources():
+    """Sources whose latest content has been fully indexed."""
+    return get_manifest().sources()
+
+
+def check_file(source, data):
+    """
+    Skip a file whose bytes match what was last indexed for source.
+
+    Otherwise remember its hash so finish_file() can record it.
+    """
+    digest = content_hash(data)
+    if get_manifest().file_hash(source) == digest:
+        raise SkipFile("unchanged since last ingest")
+    with _lock:
+        _pending[source] = digest
+
+
+def plan_chunks(source, chunks):
+    """
+    Diff chunks against the manifest, delete removed ones, and return
+    only the chunks that still need embedding.
+
+    Near-duplicates of indexed chunks are held back as links when
+    NEAR_DUP=link; finish_file() records them.
+    """
+    require_writer()
+    manifest = get_manifest()
+    if manifest.file_hash(source) is None and not manifest.chunk_vectors(source):
+        delete_unrecorded_vectors(source)
+    new_chunks, removed = manifest.diff(source, chunks)
+    if removed:
+        # Chunks of this file linked to a deleted vector need a vector again
+        orphaned = delete_chunks(source, removed)
+        if orphaned:
+            new_chunks.extend(c for c in chunks if c["hash"] in orphaned)
+
+    stored = manifest.chunk_vectors(source)
+    new_hashes = {c["hash"] for c in new_chunks}
+    unchanged = [c for c in chunks if c["hash"] not in new_hashes
+                 and stored.get(c["hash"]) == chunk_vector_id(c, source)]
+    reupsert = refresh_positions(source, unchanged)
+
+    new_chunks, links, signatures = filter_chunks(
+        new_chunks, [chunk_vector_id(c, source) for c in new_chunks]
+    )
+    # Already indexed: re-upserted in place, never linked to a near-duplicate
+    new_chunks.extend(reupsert)
+    with _lock:
+        # Replaces leftovers of an earlier attempt at this file that failed
+        _pending_signatures[source] = signatures
+        if links:
+            _pending_links[source] = links
+
+    if not new_chunks:
+        finish_file(source)
+        message = f"no new chunks ({len(removed)} removed"
+        if links:
+            message += f", {len(links)} linked to near-duplicates"
+        raise SkipFile(message + ")")
+    return new_chunks
+
+
+def upsert_chunks(chunks, vectors, source):
+    """
+    Upsert a batch and record its chunks in the manifest.
+
+    Their near-duplicate signatures are added only now, so other files
+    can link to them.
+    """
+    stored = upsert_chunk_vectors(chunks, vectors, source)
+    vector_ids = [chunk_vector_id(c, source) for c in chunks]
+    get_manifest().record_chunks(source, [(c["hash"], v) for c, v in zip(chunks, vector_ids)])
+    with _lock:
+        pending = _pending_signatures.get(source, {})
+        signatures = [(v, pending.pop(v)) for v in vector_ids if v in pending]
+    if signatures:
+        get_near_dup_index().add(signatures)
+    return stored
+
+
+def finish_file(source):
+    """Record the file's content hash and links once all of its chunks are stored."""
+    with _lock:
+        digest = _pending.pop(source, None)
+        links = _pending_links.pop(source, None)
+        _pending_signatures.pop(source, None)
+    if links:
+        get_near_dup_index().link(source, links)
+        get_manifest().record_chunks(source, links)
+    if digest is not None:
+        get_manifest().set_file_hash(source, digest)
+
+
+def delete_unrecorded_vectors(source):
+    """
+    Delete every vector stored for source, ahead of its first ingest
+    under the manifest.
+
+    Vectors from before the manifest have position-based IDs
+    (<source>_chunk_N) that no re-ingest would ever overwrite or delete.
+    """
+    condition = [{"source": {"$eq": source}}]
+    with span("endee.delete"):
+        call_with_index(lambda index: index.delete_with_filter(condition))
+    chunk_store = get_chunk_store()
+    if chunk_store is None:
+        return
+    vector_ids = chunk_store.delete_source(source)
+    if vector_ids:
+        delete_full_vectors(vector_ids)
+        if HYBRID_SEARCH:
+            remove_documents(vector_ids)
+        invalidate_answers(vector_ids)
+
+
+def refresh_positions(source, unchanged):
+    """
+    Rewrite chunk number, section and page of unchanged chunks that
+    moved within the file.
+
+    The chunk store row and the vector's filter fields are updated in
+    place.  Without a chunk store the old position is unknown and the
+    chunk number lives in vector metadata, so the chunks are returned
+    to be upserted again (their embeddings come from the cache).
+    """
+    chunk_store = get_chunk_store()
+    if chunk_store is None:
+        return unchanged
+    by_id = {chunk_vector_id(c, source): c for c in unchanged}
+    rows = chunk_store.get_many(list(by_id))
+    moved = {
+        vid: chunk for vid, chunk in by_id.items()
+        if vid in rows and (rows[vid]["chunk_id"], rows[vid]["section"], rows[vid]["page"])
+        != (str(chunk["id"]), chunk.get("section") or "", chunk.get("page"))
+    }
+    if not moved:
+        return []
+    chunk_store.put_many([
+        {"vector_id": vid, "source": source, "chunk_id": chunk["id"],
+         "section": chunk.get("section"), "page": chunk.get("page"), "text": chunk["text"]}
+        for vid, chunk in moved.items()
+    ])
+    updates = [{"id": vid, "filter": chunk_filter_fields(chunk, source)}
+               for vid, chunk in moved.items()]
+    for i in range(0, len(updates), DELETE_BATCH_SIZE):
+        batch = updates[i:i + DELETE_BATCH_SIZE]
+        with span("endee.update_filters"):
+            call_with_index(lambda index: index.update_filters(batch))
+    return []
+
+
+def delete_chunks(source, removed):
+    """
+    Delete chunks of source by hash, DELETE_BATCH_SIZE at a time.
+
+    removed maps chunk hash -> vector ID.  Chunks that were only links
+    to a near-duplicate lose the link, not the vector.  Chunks of other
+    files linked to a deleted vector are dropped from the manifest and
+    their file is marked for re-ingest; the hashes of such chunks of
+    source itself are returned.
+    """
+    near_dup_index = get_near_dup_index()
+    hashes = list(removed)
+    if near_dup_index is not None:
+        linked = near_dup_index.unlink(source, hashes)
+        if linked:
+            get_manifest().remove_chunks(source, linked)
+            hashes = [h for h in hashes if h not in linked]
+
+    orphaned = set()
+    for i in range(0, len(hashes), DELETE_BATCH_SIZE):
+        batch = hashes[i:i + DELETE_BATCH_SIZE]
+        condition = [
+            {"source": {"$eq": source}},
+            {"chunk_hash": {"$in": batch}},
+        ]
+        with span("endee.delete"):
+            call_with_index(lambda index: index.delete_with_filter(condition))
+        vector_ids = [removed[h] for h in batch]
+        delete_full_vectors(vector_ids)
+        if HYBRID_SEARCH:
+            remove_documents(vector_ids)
+        chunk_store = get_chunk_store()
+        if chunk_store is not None:
+            chunk_store.delete_many(vector_ids)
+        invalidate_answers(vector_ids)
+        get_manifest().remove_chunks(source, batch)
+
+        if near_dup_index is not None:
+            for linked_source, chunk_hash in near_dup_index.remove(vector_ids):
+                get_manifest().remove_chunks(linked_source, [chunk_hash])
+                if linked_source == source:
+                    orphaned.add(chunk_hash)
+                else:
+                    get_manifest().clear_file_hash(linked_source)
+    return orphaned
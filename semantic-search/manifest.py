@@ -0,0 +1,123 @@
+"""
+Persistent ingest manifest.
+
+Records, per source document, the hash of the file content last indexed
+and the hash of every chunk stored for it (with its vector ID).  Re-ingest
+compares against it so only new chunks are embedded and only removed
+chunks are deleted.
+"""
+import hashlib
+import sqlite3
+import threading
+import time
+from embed_cache import text_key
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    source TEXT PRIMARY KEY,
+    content_hash TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS chunks (
+    source TEXT NOT NULL,
+    chunk_hash TEXT NOT NULL,
+    vector_id TEXT NOT NULL,
+    PRIMARY KEY (source, chunk_hash)
+);
+"""
+
+
+def content_hash(data):
+    """sha256 of a file's bytes."""
+    return hashlib.sha256(data).hexdigest()
+
+
+class IngestManifest:
+    """SQLite-backed record of what is currently indexed for each source."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # ── files ───────────────────────────────────────────────────
+
+    def file_hash(self, source):
+        """Content hash last fully indexed for source, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content_hash FROM files WHERE source = ?", (source,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def set_file_hash(self, source, digest):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO files (source, content_hash, updated_at) VALUES (?, ?, ?)",
+                (source, digest, time.time()),
+            )
+            self._conn.commit()
+
+    def clear_file_hash(self, source):
+        """Forget source's content hash so its next ingest is diffed again."""
+        with self._lock:
+            self._conn.execute("DELETE FROM files WHERE source = ?", (source,))
+            self._conn.commit()
+
+    def sources(self):
+        """All sources with a completed ingest."""
+        with self._lock:
+            rows = self._conn.execute("SELECT source FROM files ORDER BY source").fetchall()
+        return [r[0] for r in rows]
+
+    # ── chunks ──────────────────────────────────────────────────
+
+    def chunk_vectors(self, source):
+        """{chunk_hash: vector_id} for everything stored under source."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT chunk_hash, vector_id FROM chunks WHERE source = ?", (source,)
+            ).fetchall()
+        return dict(rows)
+
+    def diff(self, source, chunks):
+        """
+        Compare freshly chunked text with what is stored for source.
+
+        Sets chunk['hash'] on every chunk and returns (new_chunks, removed)
+        where removed maps chunk hashes that disappeared to their vector IDs.
+        """
+        stored = self.chunk_vectors(source)
+        current = set()
+        new_chunks = []
+        for chunk in chunks:
+            # Same content key the embedding cache uses
+            chunk["hash"] = text_key(chunk["text"])
+            current.add(chunk["hash"])
+            if chunk["hash"] not in stored:
+                new_chunks.append(chunk)
+        removed = {h: vid for h, vid in stored.items() if h not in current}
+        return new_chunks, removed
+
+    def record_chunks(self, source, entries):
+        """Add (chunk_hash, vector_id) pairs for source."""
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO chunks (source, chunk_hash, vector_id) VALUES (?, ?, ?)",
+                [(source, h, vid) for h, vid in entries],
+            )
+            self._conn.commit()
+
+    def remove_chunks(self, source, hashes):
+        with self._lock:
+            self._conn.executemany(
+                "DELETE FROM chunks WHERE source = ? AND chunk_hash = ?",
+                [(source, h) for h in hashes],
+            )
+            self._conn.commit()
@@ -0,0 +1,268 @@
+"""
+Lightweight per-stage latency metrics and tracing.
+
+span(stage) times a block into a per-stage histogram and error counter;
+inside a trace(name) the same spans are also kept as a per-request
+timeline so one slow query can be broken down stage by stage.
+render_prometheus() exposes everything in the Prometheus text format,
+either through start_metrics_server() or the app's debug panel, along
+with the Endee server's own /stats for correlation.
+"""
+import bisect
+import json
+import os
+import threading
+import time
+import urllib.request
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+from dotenv import load_dotenv
+from session import ENDEE_BASE_URL, ENDEE_TOKEN
+
+load_dotenv()
+
+# Port for the /metrics endpoint; 0 leaves it off
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+# Recent samples per stage used for p50/p95/p99
+METRICS_WINDOW = int(os.getenv("METRICS_WINDOW", "2048"))
+
+_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+_PREFIX = "semantic_search"
+
+
+class Histogram:
+    """Cumulative bucket counts for export plus a window of recent samples for quantiles."""
+
+    def __init__(self, buckets=_BUCKETS, window=METRICS_WINDOW):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)   # last slot is +Inf
+        self.total = 0.0
+        self.count = 0
+        self.errors = 0
+        self.recent = deque(maxlen=window)
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+        self.recent.append(seconds)
+
+    def quantiles(self, *ps):
+        if not self.recent:
+            return [0.0] * len(ps)
+        return [float(v) for v in np.percentile(list(self.recent), ps)]
+
+
+_lock = threading.Lock()
+_histograms = {}     # stage -> Histogram
+_counters = {}       # (name, sorted label items) -> value
+_local = threading.local()
+_recent_traces = deque(maxlen=20)
+
+
+def observe(stage, seconds, error=False):
+    """Record one timed call of a stage."""
+    with _lock:
+        hist = _histograms.get(stage)
+        if hist is None:
+            hist = _histograms[stage] = Histogram()
+        hist.observe(seconds)
+        if error:
+            hist.errors += 1
+    spans = getattr(_local, "spans", None)
+    if spans is not None:
+        spans.append({
+            "stage": stage,
+            "start_ms": round((time.perf_counter() - seconds - _local.started) * 1000, 2),
+            "ms": round(seconds * 1000, 2),
+            "error": error,
+        })
+
+
+def count(name, value=1, **labels):
+    """Increment a counter, e.g. count("answer_cache", result="hit")."""
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+@contextmanager
+def span(stage):
+    """Time the enclosed block as one call of stage; exceptions count as errors."""
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        observe(stage, time.perf_counter() - start, error=True)
+        raise
+    observe(stage, time.perf_counter() - start)
+
+
+@contextmanager
+def trace(name):
+    """
+    Collect the spans recorded on this thread into one request timeline.
+
+    Nested traces are folded into the outermost one.
+    """
+    if getattr(_local, "spans", None) is not None:
+        yield
+        return
+    _local.spans = []
+    _local.started = time.perf_counter()
+    try:
+        yield
+    finally:
+        total = time.perf_counter() - _local.started
+        _recent_traces.append({
+            "name": name,
+            "at": time.time(),
+            "ms": round(total * 1000, 2),
+            "spans": sorted(_local.spans, key=lambda s: s["start_ms"]),
+        })
+        _local.spans = None
+
+
+def recent_traces():
+    """Most recent traces, newest first."""
+    return list(reversed(_recent_traces))
+
+
+def snapshot():
+    """Per-stage calls, errors and latency quantiles in milliseconds."""
+    rows = []
+    with _lock:
+        for stage, hist in sorted(_histograms.items()):
+            p50, p95, p99 = hist.quantiles(50, 95, 99)
+            rows.append({
+                "stage": stage,
+                "calls": hist.count,
+                "errors": hist.errors,
+                "mean_ms": round(hist.total / hist.count * 1000, 2) if hist.count else 0.0,
+                "p50_ms": round(p50 * 1000, 2),
+                "p95_ms": round(p95 * 1000, 2),
+                "p99_ms": round(p99 * 1000, 2),
+            })
+    return rows
+
+
+def counters():
+    """{(name, labels): value} copy of all counters."""
+    with _lock:
+        return dict(_counters)
+
+
+def server_stats(timeout=2.0):
+    """The Endee server's /stats (version, uptime, total_requests), or None if unreachable."""
+    request = urllib.request.Request(ENDEE_BASE_URL.rstrip("/") + "/stats")
+    if ENDEE_TOKEN:
+        request.add_header("Authorization", ENDEE_TOKEN)
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return json.loads(response.read().decode("utf-8"))
+    except (OSError, ValueError):
+        return None
+
+
+def _labels(items):
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}"
+
+
+def render_prometheus(include_server=True):
+    """All metrics in the Prometheus text exposition format."""
+    lines = [
+        f"# HELP {_PREFIX}_stage_seconds Latency of each pipeline stage.",
+        f"# TYPE {_PREFIX}_stage_seconds histogram",
+    ]
+    with _lock:
+        for stage, hist in sorted(_histograms.items()):
+            cumulative = 0
+            for bound, n in zip(hist.buckets, hist.counts):
+                cumulative += n
+                lines.append(f'{_PREFIX}_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+            lines.append(f'{_PREFIX}_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {hist.count}')
+            lines.append(f'{_PREFIX}_stage_seconds_sum{{stage="{stage}"}} {hist.total:.6f}')
+            lines.append(f'{_PREFIX}_stage_seconds_count{{stage="{stage}"}} {hist.count}')
+        lines.append(f"# TYPE {_PREFIX}_stage_errors_total counter")
+        for stage, hist in sorted(_histograms.items()):
+            lines.append(f'{_PREFIX}_stage_errors_total{{stage="{stage}"}} {hist.errors}')
+
+        # Client-side view of Endee round trips, to line up with the server's total_requests
+        endee_calls = sum(h.count for stage, h in _histograms.items() if stage.startswith("endee."))
+        lines.append(f"# TYPE {_PREFIX}_endee_calls_total counter")
+        lines.append(f"{_PREFIX}_endee_calls_total {endee_calls}")
+
+        names = sorted({name for name, _ in _counters})
+        for name in names:
+            lines.append(f"# TYPE {_PREFIX}_{name}_total counter")
+            for (n, items), value in sorted(_counters.items()):
+                if n == name:
+                    lines.append(f"{_PREFIX}_{name}_total{_labels(items)} {value}")
+
+    if include_server:
+        stats = server_stats()
+        lines.append("# TYPE endee_server_up gauge")
+        lines.append(f"endee_server_up {1 if stats else 0}")
+        if stats:
+            for key in ("uptime", "total_requests"):
+                if isinstance(stats.get(key), (int, float)):
+                    lines.append(f"# TYPE endee_server_{key} gauge")
+                    lines.append(f"endee_server_{key} {stats[key]}")
+    return "\n".join(lines) + "\n"
+
+
+_readiness_check = None
+
+
+def set_readiness_check(check):
+    """Serve /ready from check(), a dict whose "ready" key picks 200 or 503."""
+    global _readiness_check
+    _readiness_check = check
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        if path == "/metrics":
+            status, content_type = 200, "text/plain; version=0.0.4"
+            body = render_prometheus().encode("utf-8")
+        elif path == "/ready" and _readiness_check is not None:
+            state = _readiness_check()
+            status, content_type = (200 if state["ready"] else 503), "application/json"
+            body = json.dumps(state).encode("utf-8")
+        else:
+            self.send_error(404)
+            return
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_server = None
+
+
+def start_metrics_server(port=None):
+    """
+    Serve /metrics (and /ready, see set_readiness_check) on a background
+    thread, once per process.
+
+    Returns the server, or None when no port is configured.
+    """
+    global _server
+    port = METRICS_PORT if port is None else port
+    if not port:
+        return None
+    with _lock:
+        if _server is None:
+            _server = ThreadingHTTPServer(("0.0.0.0", port), _MetricsHandler)
+            threading.Thread(target=_server.serve_forever, daemon=True).start()
+    return _server
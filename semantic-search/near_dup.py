@@ -0,0 +1,334 @@
+"""
+Corpus-wide near-duplicate detection.
+
+Every embedded chunk gets a MinHash signature over its word shingles,
+stored in SQLite together with LSH band buckets.  Before new chunks are
+embedded, each one is looked up in the buckets; candidates whose
+estimated Jaccard similarity reaches NEAR_DUP_THRESHOLD are
+near-duplicates.  NEAR_DUP selects what happens to them:
+
+    off   no detection (default)
+    flag  count them (metric near_dup) but embed them as usual
+    link  do not embed them; the chunk is linked to the existing vector,
+          and search results list the linked sources under "also_in"
+
+Linked chunks have no vector of their own, so a source filter only
+matches them through the source of the vector they are linked to.
+"""
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import numpy as np
+from dotenv import load_dotenv
+from metrics import count
+from session import INDEX_NAME
+
+load_dotenv()
+
+NEAR_DUP = os.getenv("NEAR_DUP", "off").lower()
+# Estimated Jaccard similarity of word shingles at which chunks are near-duplicates
+NEAR_DUP_THRESHOLD = float(os.getenv("NEAR_DUP_THRESHOLD", "0.85"))
+NEAR_DUP_PERMUTATIONS = int(os.getenv("NEAR_DUP_PERMUTATIONS", "128"))
+NEAR_DUP_SHINGLE = int(os.getenv("NEAR_DUP_SHINGLE", "3"))
+NEAR_DUP_PATH = os.getenv("NEAR_DUP_PATH") or f".cache/near_dup_{INDEX_NAME}.sqlite3"
+
+MODES = ("off", "flag", "link")
+
+_PRIME = (1 << 31) - 1  # hash range; a * x stays below 2**63
+_TOKEN = re.compile(r"\w+")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS params (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS signatures (
+    vector_id TEXT PRIMARY KEY,
+    signature BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS buckets (
+    band INTEGER NOT NULL,
+    bucket INTEGER NOT NULL,
+    vector_id TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS buckets_key ON buckets (band, bucket);
+CREATE INDEX IF NOT EXISTS buckets_vector ON buckets (vector_id);
+CREATE TABLE IF NOT EXISTS links (
+    source TEXT NOT NULL,
+    chunk_hash TEXT NOT NULL,
+    vector_id TEXT NOT NULL,
+    PRIMARY KEY (source, chunk_hash)
+);
+CREATE INDEX IF NOT EXISTS links_vector ON links (vector_id);
+"""
+
+
+def shingles(text, size=NEAR_DUP_SHINGLE):
+    """Set of word n-grams of the lowercased text (the whole text if shorter)."""
+    words = _TOKEN.findall(text.lower())
+    if len(words) <= size:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def lsh_bands(num_perm, threshold, recall=0.95):
+    """
+    (bands, rows) with bands * rows <= num_perm for LSH banding.
+
+    Picks the most selective banding (most rows per band) under which a
+    pair with Jaccard similarity at threshold still shares a bucket with
+    probability >= recall, i.e. 1 - (1 - threshold**rows)**bands.
+    """
+    for rows in range(num_perm, 0, -1):
+        bands = num_perm // rows
+        if 1 - (1 - threshold ** rows) ** bands >= recall:
+            return bands, rows
+    return num_perm, 1
+
+
+class MinHasher:
+    """MinHash signatures from num_perm universal hash functions."""
+
+    def __init__(self, num_perm=NEAR_DUP_PERMUTATIONS, seed=1):
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self._a = rng.integers(1, _PRIME, size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, _PRIME, size=num_perm, dtype=np.uint64)
+
+    def signature(self, text):
+        values = np.fromiter(
+            (int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "little")
+             % _PRIME for s in shingles(text)),
+            dtype=np.uint64,
+        )
+        hashed = (np.outer(self._a, values) + self._b[:, None]) % _PRIME
+        return hashed.min(axis=1).astype(np.uint32)
+
+
+def similarity(a, b):
+    """Estimated Jaccard similarity of two signatures."""
+    return float(np.mean(a == b))
+
+
+class NearDupIndex:
+    """SQLite store of chunk signatures, their LSH buckets and links to them."""
+
+    def __init__(self, path, num_perm=NEAR_DUP_PERMUTATIONS, threshold=NEAR_DUP_THRESHOLD):
+        self.path = path
+        self.threshold = threshold
+        self.hasher = MinHasher(num_perm)
+        self.bands, self.rows = lsh_bands(num_perm, threshold)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        self._check_params(num_perm)
+        self._conn.commit()
+
+    def _check_params(self, num_perm):
+        """Refuse signatures of another size; rebuild the buckets if the banding changed."""
+        stored = dict(self._conn.execute("SELECT name, value FROM params"))
+        if stored and stored["num_perm"] != num_perm:
+            raise ValueError(
+                f"{self.path} holds {stored['num_perm']}-permutation signatures; "
+                f"NEAR_DUP_PERMUTATIONS is {num_perm}. Delete the file to rebuild it."
+            )
+        if stored.get("bands") != self.bands or stored.get("rows") != self.rows:
+            self._conn.execute("DELETE FROM buckets")
+            for vector_id, blob in self._conn.execute(
+                "SELECT vector_id, signature FROM signatures"
+            ).fetchall():
+                self._insert_buckets(vector_id, np.frombuffer(blob, dtype=np.uint32))
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO params (name, value) VALUES (?, ?)",
+            [("num_perm", num_perm), ("bands", self.bands), ("rows", self.rows)],
+        )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _band_keys(self, signature):
+        keys = []
+        for band in range(self.bands):
+            chunk = signature[band * self.rows:(band + 1) * self.rows].tobytes()
+            digest = hashlib.blake2b(chunk, digest_size=8).digest()
+            keys.append((band, int.from_bytes(digest, "little", signed=True)))
+        return keys
+
+    def _insert_buckets(self, vector_id, signature):
+        self._conn.executemany(
+            "INSERT INTO buckets (band, bucket, vector_id) VALUES (?, ?, ?)",
+            [(band, bucket, vector_id) for band, bucket in self._band_keys(signature)],
+        )
+
+    # ── signatures ──────────────────────────────────────────────
+
+    def find(self, signature, exclude=None):
+        """(vector_id, similarity) of the closest stored near-duplicate, or None."""
+        keys = self._band_keys(signature)
+        placeholders = ",".join("(?, ?)" for _ in keys)
+        params = [v for key in keys for v in key]
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT signature, vector_id FROM signatures WHERE vector_id IN ("
+                f"SELECT vector_id FROM buckets WHERE (band, bucket) IN (VALUES {placeholders}))",
+                params,
+            ).fetchall()
+        best = None
+        for blob, vector_id in rows:
+            if vector_id == exclude:
+                continue
+            score = similarity(signature, np.frombuffer(blob, dtype=np.uint32))
+            if score >= self.threshold and (best is None or score > best[1]):
+                best = (vector_id, score)
+        return best
+
+    def add(self, entries):
+        """Store (vector_id, signature) pairs."""
+        with self._lock:
+            for vector_id, signature in entries:
+                self._conn.execute("DELETE FROM buckets WHERE vector_id = ?", (vector_id,))
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO signatures (vector_id, signature) VALUES (?, ?)",
+                    (vector_id, signature.astype(np.uint32).tobytes()),
+                )
+                self._insert_buckets(vector_id, signature)
+            self._conn.commit()
+
+    def remove(self, vector_ids):
+        """
+        Drop the signatures of deleted vectors.
+
+        Links to those vectors are dropped too and returned as
+        (source, chunk_hash) pairs: those chunks have to be embedded again.
+        """
+        vector_ids = list(vector_ids)
+        with self._lock:
+            orphans = []
+            for vector_id in vector_ids:
+                orphans.extend(self._conn.execute(
+                    "SELECT source, chunk_hash FROM links WHERE vector_id = ?", (vector_id,)
+                ).fetchall())
+            for table in ("signatures", "buckets", "links"):
+                self._conn.executemany(
+                    f"DELETE FROM {table} WHERE vector_id = ?", [(v,) for v in vector_ids]
+                )
+            self._conn.commit()
+        return orphans
+
+    # ── links ───────────────────────────────────────────────────
+
+    def link(self, source, entries):
+        """Record (chunk_hash, vector_id) links for chunks of source."""
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO links (source, chunk_hash, vector_id) VALUES (?, ?, ?)",
+                [(source, h, vid) for h, vid in entries],
+            )
+            self._conn.commit()
+
+    def unlink(self, source, hashes):
+        """Drop links of source by chunk hash; returns the hashes that were links."""
+        with self._lock:
+            linked = set()
+            for chunk_hash in hashes:
+                row = self._conn.execute(
+                    "SELECT 1 FROM links WHERE source = ? AND chunk_hash = ?", (source, chunk_hash)
+                ).fetchone()
+                if row:
+                    linked.add(chunk_hash)
+            self._conn.executemany(
+                "DELETE FROM links WHERE source = ? AND chunk_hash = ?",
+                [(source, h) for h in linked],
+            )
+            self._conn.commit()
+        return linked
+
+    def linked_sources(self, vector_ids):
+        """{vector_id: sorted sources linked to it} for the given vectors."""
+        vector_ids = list(dict.fromkeys(vector_ids))
+        if not vector_ids:
+            return {}
+        placeholders = ",".join("?" * len(vector_ids))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT vector_id, source FROM links WHERE vector_id IN ({placeholders})",
+                vector_ids,
+            ).fetchall()
+        found = {}
+        for vector_id, source in rows:
+            found.setdefault(vector_id, set()).add(source)
+        return {vid: sorted(sources) for vid, sources in found.items()}
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_near_dup_index():
+    """
+    Return the process-wide near-duplicate index.
+
+    None when NEAR_DUP is off and no index was built before; an existing
+    index stays open so its links are kept up to date on deletes.
+    """
+    global _index
+    if NEAR_DUP not in MODES:
+        raise ValueError(f"Unknown NEAR_DUP {NEAR_DUP!r}; expected one of {MODES}")
+    if NEAR_DUP == "off" and not os.path.exists(NEAR_DUP_PATH):
+        return None
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                directory = os.path.dirname(NEAR_DUP_PATH)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                _index = NearDupIndex(NEAR_DUP_PATH)
+    return _index
+
+
+def filter_chunks(chunks, vector_ids):
+    """
+    Split chunks (already diffed, with 'hash') into those to embed and links.
+
+    vector_ids are the IDs the chunks would be stored under.  Returns
+    (to_embed, links, signatures) where links are (chunk_hash, vector_id)
+    pairs pointing at existing or earlier-in-this-batch chunks (always
+    empty with NEAR_DUP=flag), and signatures maps the vector ID of each
+    chunk to embed to its signature.  Nothing is added to the index
+    here: the caller adds signatures once their vectors are upserted, so
+    links never point at a vector that failed to arrive.
+    """
+    index = get_near_dup_index()
+    if index is None or NEAR_DUP == "off" or not chunks:
+        return list(chunks), [], {}
+
+    # Local to this call, so chunks of the same file match each other
+    batch_ids, batch_sigs = [], []
+    to_embed, links, signatures = [], [], {}
+    flagged = 0
+    for chunk, vector_id in zip(chunks, vector_ids):
+        signature = index.hasher.signature(chunk["text"])
+        match = index.find(signature, exclude=vector_id)
+        if batch_sigs:
+            scores = np.mean(np.asarray(batch_sigs) == signature, axis=1)
+            best = int(np.argmax(scores))
+            if scores[best] >= index.threshold and (match is None or scores[best] > match[1]):
+                match = (batch_ids[best], float(scores[best]))
+
+        if match is not None:
+            flagged += 1
+            if NEAR_DUP == "link":
+                links.append((chunk["hash"], match[0]))
+                continue
+        to_embed.append(chunk)
+        signatures[vector_id] = signature
+        batch_ids.append(vector_id)
+        batch_sigs.append(signature)
+
+    if flagged:
+        count("near_dup", action=NEAR_DUP, value=flagged)
+    return to_embed, links, signatures
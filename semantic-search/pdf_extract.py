@@ -0,0 +1,186 @@
+"""
+Page-level PDF text extraction.
+
+iter_pages() yields (page_number, text) as soon as each page is ready,
+so chunking can start before the whole document has been parsed.  Large
+documents are split into page ranges and fanned out to a process pool;
+each page gets its own timeout so one malformed page cannot stall a
+worker.
+
+Page timeouts use SIGALRM, which only works on the main thread of a
+Unix process.  They always apply in pool workers; serial extraction on
+another thread (e.g. a small upload in the app's ingest pipeline) runs
+without one.  If a worker stops responding altogether, its page range
+is skipped and the pool is terminated, which kills the stuck process;
+the remaining ranges, including those of other documents that were
+using the pool, are extracted on a new one.
+"""
+import multiprocessing
+import os
+import signal
+import tempfile
+import threading
+import time
+from metrics import count
+
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(os.cpu_count() or 1)))
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "64"))
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "16"))
+PDF_PAGE_TIMEOUT = float(os.getenv("PDF_PAGE_TIMEOUT", "30"))
+
+# How often a wait for a range checks whether its pool was replaced
+_POLL_SECONDS = 0.5
+# Slack on top of a range's page timeouts before its worker counts as stuck
+_STUCK_GRACE_SECONDS = 5.0
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+class _PageTimeout(Exception):
+    pass
+
+
+def _on_alarm(signum, frame):
+    raise _PageTimeout()
+
+
+def _can_use_alarm():
+    # SIGALRM is Unix-only and can only be installed from the main thread
+    return (hasattr(signal, "SIGALRM")
+            and threading.current_thread() is threading.main_thread())
+
+
+def _extract_page(page, timeout):
+    """Extract one page; returns None if it times out or fails to parse."""
+    if not timeout or not _can_use_alarm():
+        try:
+            return page.extract_text()
+        except Exception:
+            return None
+
+    previous = signal.signal(signal.SIGALRM, _on_alarm)
+    signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        return page.extract_text()
+    except Exception:
+        # _PageTimeout or a malformed page: skip it
+        return None
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def _extract_range(path, start, stop, timeout):
+    """Worker task: extract pages [start, stop) of the PDF at path."""
+    from PyPDF2 import PdfReader
+    reader = PdfReader(path)
+    return [(n + 1, _extract_page(reader.pages[n], timeout)) for n in range(start, stop)]
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # spawn: the app and ingest pipeline fork from a threaded process
+                _pool = multiprocessing.get_context("spawn").Pool(PDF_WORKERS)
+    return _pool
+
+
+def _terminate_pool(pool):
+    """Kill pool's workers, stuck ones included, unless it was already replaced."""
+    global _pool
+    with _pool_lock:
+        if _pool is not pool:
+            return
+        _pool = None
+    pool.terminate()
+
+
+def _iter_serial(reader, timeout):
+    for n, page in enumerate(reader.pages):
+        yield n + 1, _extract_page(page, timeout)
+
+
+def _submit(ranges, path, timeout):
+    """Queue ranges on the shared pool; returns the pool and an AsyncResult per range."""
+    pool = _get_pool()
+    return pool, [pool.apply_async(_extract_range, (path, start, stop, timeout))
+                  for start, stop in ranges]
+
+
+def _iter_parallel(path, num_pages, timeout, pages_per_task):
+    ranges = [(start, min(start + pages_per_task, num_pages))
+              for start in range(0, num_pages, pages_per_task)]
+    pool, results = _submit(ranges, path, timeout)
+    # Collect in submission order so pages come out in document order
+    i = 0
+    while i < len(ranges):
+        # Per-page timeouts are enforced inside the worker; this is a
+        # backstop in case the worker itself gets stuck.
+        deadline = None
+        if timeout:
+            deadline = time.monotonic() + timeout * pages_per_task + _STUCK_GRACE_SECONDS
+        result = results[i]
+        while (not result.ready() and pool is _pool
+               and (deadline is None or time.monotonic() < deadline)):
+            result.wait(_POLL_SECONDS)
+        if result.ready():
+            yield from result.get()
+            i += 1
+            continue
+        if pool is _pool:
+            # Skip the stuck range like a timed-out page; terminating the
+            # pool is the only way to stop the process working on it
+            count("pdf_ranges_timed_out")
+            _terminate_pool(pool)
+            i += 1
+        if i < len(ranges):
+            # Carry on with the rest on a fresh pool (also when another
+            # document's stuck range is what replaced it)
+            pool, results[i:] = _submit(ranges[i:], path, timeout)
+
+
+def iter_pages(source, workers=None, page_timeout=None):
+    """
+    Yield (page_number, text) for every non-empty page of a PDF, in order.
+
+    source may be a path or a binary file-like object (e.g. a Streamlit
+    UploadedFile).  Page numbers are 1-based.  Documents with at least
+    PDF_PARALLEL_MIN_PAGES pages are extracted on the shared process pool
+    (sized by PDF_WORKERS) unless workers is 1, split into at least
+    `workers` page ranges.
+    """
+    if workers is None:
+        workers = PDF_WORKERS
+    if page_timeout is None:
+        page_timeout = PDF_PAGE_TIMEOUT
+
+    # Imported on first use to keep app start-up light
+    from PyPDF2 import PdfReader
+    reader = PdfReader(source)
+    num_pages = len(reader.pages)
+
+    if workers <= 1 or num_pages < PDF_PARALLEL_MIN_PAGES:
+        pages = _iter_serial(reader, page_timeout)
+        tmp_path = None
+    else:
+        if isinstance(source, (str, os.PathLike)):
+            path, tmp_path = os.fspath(source), None
+        else:
+            # Workers need a path: spill the upload to a temp file once
+            source.seek(0)
+            with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp:
+                tmp.write(source.read())
+            path = tmp_path = tmp.name
+        pages_per_task = max(1, min(PDF_PAGES_PER_TASK, -(-num_pages // workers)))
+        pages = _iter_parallel(path, num_pages, page_timeout, pages_per_task)
+
+    try:
+        for page_number, text in pages:
+            if text and text.strip():
+                yield page_number, text.strip()
+    finally:
+        if tmp_path:
+            os.unlink(tmp_path)
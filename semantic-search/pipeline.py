@@ -0,0 +1,285 @@
+"""
+Staged ingest pipeline.
+
+extract -> chunk -> embed -> upsert, each stage on its own thread and
+connected by bounded queues.  File N+1 is extracted while file N is
+being embedded, and finished batches are upserted while the next batch
+is encoded.  Every stage keeps its own throughput counters and reports
+its per-batch latency to metrics.
+"""
+import os
+import queue
+import threading
+import time
+from metrics import count, observe
+
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "4"))
+
+_DONE = object()
+
+
+class SkipFile(Exception):
+    """Raised by a stage function to drop a file without treating it as an error."""
+
+
+class StageStats:
+    """Counters for one pipeline stage: items handled, units produced, busy time."""
+
+    def __init__(self, name, unit):
+        self.name = name
+        self.unit = unit
+        self.items = 0
+        self.units = 0
+        self.busy_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, units, seconds):
+        with self._lock:
+            self.items += 1
+            self.units += units
+            self.busy_seconds += seconds
+        observe(f"ingest.{self.name}", seconds)
+
+    def snapshot(self):
+        with self._lock:
+            rate = self.units / self.busy_seconds if self.busy_seconds else 0.0
+            return {
+                "stage": self.name,
+                "items": self.items,
+                "units": self.units,
+                "unit": self.unit,
+                "busy_seconds": round(self.busy_seconds, 3),
+                "per_second": round(rate, 2),
+            }
+
+
+class IngestPipeline:
+    """
+    Run files through extract_fn, chunk_fn, embed_fn and upsert_fn concurrently.
+
+    extract_fn(source) -> str, or a list of pages for utils.iter_chunks
+    chunk_fn(document) -> list[dict]
+    embed_fn(texts) -> list[vector]
+    upsert_fn(chunks, vectors, source_name) -> int (vectors stored)
+
+    Optional hooks:
+    plan_fn(source_name, chunks) -> list[dict], the chunks that still
+        need embedding (e.g. after diffing against a manifest)
+    complete_fn(source_name), called after a file's last batch is stored
+
+    Any function may raise SkipFile to drop a file with a "skipped" result.
+
+    run() yields one result dict per file, in completion order, on the
+    caller's thread so UI code can report progress safely.  If a stage
+    thread dies outside its per-file error handling, the run is stopped
+    and run() raises instead of waiting for results that never come.
+    """
+
+    def __init__(self, extract_fn, chunk_fn, embed_fn, upsert_fn,
+                 plan_fn=None, complete_fn=None,
+                 batch_size=EMBED_BATCH_SIZE, queue_size=PIPELINE_QUEUE_SIZE):
+        self.extract_fn = extract_fn
+        self.chunk_fn = chunk_fn
+        self.embed_fn = embed_fn
+        self.upsert_fn = upsert_fn
+        self.plan_fn = plan_fn
+        self.complete_fn = complete_fn
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.stats = {
+            "extract": StageStats("extract", "files"),
+            "chunk": StageStats("chunk", "chunks"),
+            "embed": StageStats("embed", "chunks"),
+            "upsert": StageStats("upsert", "vectors"),
+        }
+        self._stop = threading.Event()
+        self._failure = None
+
+    # ── queue helpers that give up once the run is cancelled ────
+
+    def _put(self, q, item):
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def _get(self, q):
+        while not self._stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    # ── stages ──────────────────────────────────────────────────
+
+    def _guard(self, stage, *args):
+        """Run a stage, recording a crash and stopping the run instead of dying silently."""
+        try:
+            stage(*args)
+        except Exception as exc:
+            self._failure = exc
+            self._stop.set()
+
+    def _extract_stage(self, jobs, out_q, results):
+        for name, source in jobs:
+            if self._stop.is_set():
+                break
+            start = time.perf_counter()
+            try:
+                text = self.extract_fn(source)
+            except SkipFile as skip:
+                results.put(_result(name, "skipped", str(skip)))
+                continue
+            except Exception as exc:
+                results.put(_result(name, "error", f"Extraction failed: {exc}"))
+                continue
+            self.stats["extract"].record(1, time.perf_counter() - start)
+
+            if not text or (isinstance(text, str) and not text.strip()):
+                results.put(_result(name, "empty", "No text found"))
+                continue
+            self._put(out_q, (name, text))
+        self._put(out_q, _DONE)
+
+    def _chunk_stage(self, in_q, out_q, results):
+        while True:
+            item = self._get(in_q)
+            if item is _DONE:
+                break
+            name, text = item
+            start = time.perf_counter()
+            try:
+                chunks = self.chunk_fn(text)
+            except Exception as exc:
+                results.put(_result(name, "error", f"Chunking failed: {exc}"))
+                continue
+            self.stats["chunk"].record(len(chunks), time.perf_counter() - start)
+
+            if not chunks:
+                results.put(_result(name, "empty", "Could not create chunks"))
+                continue
+
+            if self.plan_fn is not None:
+                try:
+                    chunks = self.plan_fn(name, chunks)
+                except SkipFile as skip:
+                    results.put(_result(name, "skipped", str(skip)))
+                    continue
+                except Exception as exc:
+                    results.put(_result(name, "error", f"Planning failed: {exc}"))
+                    continue
+                if not chunks:
+                    results.put(_result(name, "skipped", "Nothing new to index"))
+                    continue
+            self._put(out_q, (name, chunks))
+        self._put(out_q, _DONE)
+
+    def _embed_stage(self, in_q, out_q):
+        while True:
+            item = self._get(in_q)
+            if item is _DONE:
+                break
+            name, chunks = item
+            for i in range(0, len(chunks), self.batch_size):
+                batch = chunks[i:i + self.batch_size]
+                is_last = i + self.batch_size >= len(chunks)
+                start = time.perf_counter()
+                try:
+                    vectors = self.embed_fn([c["text"] for c in batch])
+                except Exception as exc:
+                    self._put(out_q, (name, None, exc, True))
+                    break
+                self.stats["embed"].record(len(batch), time.perf_counter() - start)
+                self._put(out_q, (name, batch, vectors, is_last))
+        self._put(out_q, _DONE)
+
+    def _upsert_stage(self, in_q, results):
+        stored = {}
+        failed = set()
+        while True:
+            item = self._get(in_q)
+            if item is _DONE:
+                break
+            name, batch, vectors, is_last = item
+            if name not in failed:
+                if batch is None:
+                    failed.add(name)
+                    results.put(_result(name, "error", f"Embedding failed: {vectors}"))
+                else:
+                    start = time.perf_counter()
+                    try:
+                        upserted = self.upsert_fn(batch, vectors, name)
+                    except Exception as exc:
+                        failed.add(name)
+                        results.put(_result(name, "error", f"Upsert failed: {exc}"))
+                    else:
+                        self.stats["upsert"].record(upserted, time.perf_counter() - start)
+                        stored[name] = stored.get(name, 0) + upserted
+            if is_last and name not in failed:
+                if self.complete_fn is not None:
+                    try:
+                        self.complete_fn(name)
+                    except Exception as exc:
+                        results.put(_result(name, "error", f"Finalizing failed: {exc}"))
+                        stored.pop(name, None)
+                        continue
+                results.put(_result(name, "complete", stored=stored.pop(name, 0)))
+
+    # ── driver ──────────────────────────────────────────────────
+
+    def run(self, jobs):
+        """Process (name, source) jobs and yield a result dict per file."""
+        jobs = list(jobs)
+        if not jobs:
+            return
+
+        self._stop.clear()
+        self._failure = None
+        text_q = queue.Queue(maxsize=self.queue_size)
+        chunk_q = queue.Queue(maxsize=self.queue_size)
+        upsert_q = queue.Queue(maxsize=self.queue_size)
+        results = queue.Queue()
+
+        stages = [
+            (self._extract_stage, jobs, text_q, results),
+            (self._chunk_stage, text_q, chunk_q, results),
+            (self._embed_stage, chunk_q, upsert_q),
+            (self._upsert_stage, upsert_q, results),
+        ]
+        threads = [threading.Thread(target=self._guard, args=stage) for stage in stages]
+        for t in threads:
+            t.daemon = True
+            t.start()
+
+        try:
+            for _ in range(len(jobs)):
+                result = self._next_result(results, threads)
+                count("ingest_files", status=result["status"])
+                yield result
+        finally:
+            self._stop.set()
+            for t in threads:
+                t.join()
+
+    def _next_result(self, results, threads):
+        while True:
+            try:
+                return results.get(timeout=0.1)
+            except queue.Empty:
+                pass
+            if self._failure is not None:
+                raise RuntimeError(f"Ingest pipeline stage failed: {self._failure}") from self._failure
+            if not any(t.is_alive() for t in threads) and results.empty():
+                raise RuntimeError("Ingest pipeline stopped before every file had a result")
+
+    def stage_stats(self):
+        """Throughput snapshot for every stage, in pipeline order."""
+        return [s.snapshot() for s in self.stats.values()]
+
+
+def _result(name, status, message="", stored=0):
+    return {"name": name, "status": status, "message": message, "stored": stored}
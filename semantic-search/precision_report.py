@@ -0,0 +1,154 @@
+"""
+Memory and recall report for Endee index precisions.
+
+Loads a sample of vectors into a throwaway index per precision on the
+configured Endee server, runs held-out queries, and reports bytes per
+vector together with recall@k, both as returned by the server and after
+exact float32 re-scoring of an over-fetched candidate list.
+
+    python precision_report.py --sample 20000 --queries 200 --k 10
+    python precision_report.py --vectors corpus.npy --json report.json
+
+Vectors come from --vectors (.npy), else from the local full-precision
+store, else synthetic unit vectors.
+"""
+import argparse
+import json
+import os
+import numpy as np
+from embed_cache import EmbeddingCache
+from rescore import FULL_VECTOR_DIR
+from session import INDEX_NAME, get_endee_client, resolve_precision
+
+PRECISIONS = ["float32", "float16", "int16", "int8", "binary"]
+
+
+def vector_bytes(precision, dim):
+    """Bytes the server stores per vector for a precision (see src/quant/)."""
+    if precision == "float32":
+        return dim * 4
+    if precision == "float16":
+        return dim * 2
+    if precision == "int16":
+        return dim * 2 + 4   # plus one float scale
+    if precision == "int8":
+        return dim + 4       # plus one float scale
+    if precision == "binary":
+        return (dim + 63) // 64 * 8
+    raise ValueError(precision)
+
+
+def graph_bytes(m=16):
+    """Approximate HNSW level-0 link storage per vector (2*M neighbour ids)."""
+    return 2 * m * 4
+
+
+def load_vectors(path, sample, dim, seed):
+    rng = np.random.default_rng(seed)
+    if path:
+        vectors = np.load(path).astype(np.float32)
+    else:
+        store_dir = os.path.join(FULL_VECTOR_DIR, INDEX_NAME)
+        index_path = os.path.join(store_dir, "index.json")
+        store = None
+        if os.path.exists(index_path):
+            with open(index_path, "r", encoding="utf-8") as f:
+                store = EmbeddingCache(store_dir, json.load(f)["dim"], max_entries=0)
+        if store is not None and len(store):
+            vectors = np.concatenate([batch for _, batch in store.iter_batches()])
+        else:
+            vectors = rng.standard_normal((sample, dim)).astype(np.float32)
+
+    if len(vectors) > sample:
+        vectors = vectors[rng.choice(len(vectors), sample, replace=False)]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def exact_neighbors(corpus, queries, k):
+    scores = queries @ corpus.T
+    return np.argsort(-scores, axis=1)[:, :k]
+
+
+def recall(found, truth):
+    hits = sum(len(set(f) & set(t)) for f, t in zip(found, truth))
+    return hits / max(1, sum(len(t) for t in truth))
+
+
+def measure(client, precision, corpus, queries, truth, k, overfetch, ef):
+    name = f"{INDEX_NAME}_precision_{precision}"
+    client.create_index(
+        name=name, dimension=corpus.shape[1], space_type="cosine",
+        precision=resolve_precision(precision),
+    )
+    try:
+        index = client.get_index(name=name)
+        for start in range(0, len(corpus), 1000):
+            index.upsert([
+                {"id": str(i), "vector": corpus[i].tolist()}
+                for i in range(start, min(start + 1000, len(corpus)))
+            ])
+
+        plain, rescored = [], []
+        fetch_k = k * overfetch
+        for q in queries:
+            hits = index.query(vector=q.tolist(), top_k=fetch_k, ef=max(ef, fetch_k))
+            ids = [int(h["id"]) for h in hits]
+            plain.append(ids[:k])
+            if ids:
+                exact = corpus[ids] @ q
+                rescored.append([ids[j] for j in np.argsort(-exact)[:k]])
+            else:
+                rescored.append([])
+    finally:
+        client.delete_index(name=name)
+
+    return recall(plain, truth), recall(rescored, truth)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Endee precision memory/recall report")
+    parser.add_argument("--vectors", help=".npy file with corpus vectors")
+    parser.add_argument("--sample", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=768, help="dimension for synthetic vectors")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--overfetch", type=int, default=4)
+    parser.add_argument("--ef", type=int, default=128)
+    parser.add_argument("--precisions", default=",".join(PRECISIONS))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="write the report to this file")
+    args = parser.parse_args()
+
+    vectors = load_vectors(args.vectors, args.sample + args.queries, args.dim, args.seed)
+    queries, corpus = vectors[:args.queries], vectors[args.queries:]
+    truth = exact_neighbors(corpus, queries, args.k).tolist()
+    dim = corpus.shape[1]
+
+    client = get_endee_client()
+    rows = []
+    for precision in args.precisions.split(","):
+        r_plain, r_rescored = measure(
+            client, precision, corpus, queries, truth, args.k, args.overfetch, args.ef
+        )
+        rows.append({
+            "precision": precision,
+            "bytes_per_vector": vector_bytes(precision, dim),
+            "bytes_per_vector_with_graph": vector_bytes(precision, dim) + graph_bytes(),
+            f"recall@{args.k}": round(r_plain, 4),
+            f"recall@{args.k}_rescored_x{args.overfetch}": round(r_rescored, 4),
+        })
+
+    print(f"corpus={len(corpus)} queries={len(queries)} dim={dim} k={args.k}")
+    print(f"{'precision':<10}{'bytes/vec':>11}{'recall':>10}{'rescored':>10}")
+    for row in rows:
+        values = list(row.values())
+        print(f"{values[0]:<10}{values[1]:>11}{values[3]:>10.4f}{values[4]:>10.4f}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"corpus": len(corpus), "dim": dim, "k": args.k, "rows": rows}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Two-tier cache for query embeddings.
+
+Tier one is an in-process LRU with a TTL.  Tier two is an optional
+EmbeddingCache on disk, so repeated queries stay fast across Streamlit
+restarts.  Query embeddings are deterministic for a given model, so the
+disk tier is bounded by size only.
+"""
+import re
+import threading
+import time
+from collections import OrderedDict
+from embed_cache import EmbeddingCache, model_cache_dir, text_key
+
+_WHITESPACE = re.compile(r"\s+")
+_TRAILING_PUNCT = re.compile(r"[\s?!.]+$")
+
+
+def normalize_query(text):
+    """Collapse whitespace, lowercase and drop trailing ?!. so near-identical queries share a key."""
+    text = _WHITESPACE.sub(" ", text).strip().lower()
+    return _TRAILING_PUNCT.sub("", text) or text
+
+
+class QueryCache:
+    """In-memory LRU with TTL, optionally backed by an on-disk tier."""
+
+    def __init__(self, model_name, max_entries=1024, ttl_seconds=3600,
+                 disk_dir=None, dim=None, disk_max_entries=50_000):
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._items = OrderedDict()  # key -> (expires_at, vector)
+        self._disk = None
+        if disk_dir and dim:
+            self._disk = EmbeddingCache(
+                model_cache_dir(disk_dir, model_name), dim,
+                max_entries=disk_max_entries,
+            )
+
+    def _key(self, normalized):
+        return text_key(normalized)
+
+    def get(self, normalized):
+        """Return the cached vector (list of floats) for a normalized query, or None."""
+        key = self._key(normalized)
+        now = time.monotonic()
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None:
+                expires_at, vector = item
+                if expires_at >= now:
+                    self._items.move_to_end(key)
+                    self.hits += 1
+                    return vector
+                del self._items[key]
+
+        if self._disk is not None:
+            vec = self._disk.get_many([key])[0]
+            if vec is not None:
+                vector = vec.tolist()
+                self._remember(key, vector)
+                with self._lock:
+                    self.disk_hits += 1
+                return vector
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, normalized, vector):
+        """Store the vector for a normalized query in both tiers."""
+        key = self._key(normalized)
+        self._remember(key, vector)
+        if self._disk is not None:
+            self._disk.put_many([key], [vector])
+
+    def _remember(self, key, vector):
+        with self._lock:
+            self._items[key] = (time.monotonic() + self.ttl_seconds, vector)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        """Empty the in-memory tier."""
+        with self._lock:
+            self._items.clear()
+
+    def stats(self):
+        """Hit/miss counters; disk_hits are memory misses served from disk."""
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+                "entries": len(self._items),
+            }
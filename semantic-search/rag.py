@@ -4,42 +4,83 @@ RAG (Retrieval-Augmented Generation) module.
 Takes retrieved document chunks from Endee and uses Groq's LLM to
 synthesize a coherent, accurate answer grounded in those chunks.
 """
+import asyncio
 import os
+import threading
+import time
 from dotenv import load_dotenv
-from groq import Groq
+from answer_cache import get_answer_cache
+from context_pack import pack_context
+from embed import embed_single_query
+from metrics import count, observe, span
 
 load_dotenv()
 
 GROQ_API_KEY = os.getenv("GROQ_API_KEY", "")
 GROQ_MODEL = os.getenv("GROQ_MODEL", "llama-3.1-8b-instant")
+# Point at stub_llm.py (or any OpenAI-compatible server) for local testing
+GROQ_BASE_URL = os.getenv("GROQ_BASE_URL", "")
 
 _client = None
+_async_client = None
+_client_lock = threading.Lock()
 
 
-def _get_groq_client():
-    """Lazy-init the Groq client so the model loads only when needed."""
+def _client_kwargs():
+    if not GROQ_API_KEY:
+        raise RuntimeError(
+            "GROQ_API_KEY is not set. Add it to your .env file."
+        )
+    kwargs = {"api_key": GROQ_API_KEY}
+    if GROQ_BASE_URL:
+        kwargs["base_url"] = GROQ_BASE_URL
+    return kwargs
+
+
+def get_groq_client():
+    """
+    Return the process-wide Groq client, created on first use.
+
+    groq is imported here so importing the app does not pay for it.
+    """
     global _client
     if _client is None:
-        if not GROQ_API_KEY:
-            raise RuntimeError(
-                "GROQ_API_KEY is not set. Add it to your .env file."
-            )
-        _client = Groq(api_key=GROQ_API_KEY)
+        with _client_lock:
+            if _client is None:
+                from groq import Groq
+                _client = Groq(**_client_kwargs())
     return _client
 
 
-def _build_context_block(chunks):
+def _get_async_groq_client():
+    """Lazy-init the asyncio Groq client used by astream_answer()."""
+    global _async_client
+    if _async_client is None:
+        with _client_lock:
+            if _async_client is None:
+                from groq import AsyncGroq
+                _async_client = AsyncGroq(**_client_kwargs())
+    return _async_client
+
+
+def _build_context_block(chunks, token_budget=None):
     """
     Format retrieved chunks into a numbered context block that the
     LLM can reference when composing its answer.
+
+    Chunks are packed to fit token_budget (default CONTEXT_TOKEN_BUDGET):
+    adjacent chunks of one section are merged, repeated sentences are
+    dropped and the most relevant passages are kept first.
     """
     parts = []
-    for i, chunk in enumerate(chunks, 1):
-        source = chunk.get("source", "unknown")
-        text = chunk.get("text", "")
-        similarity = chunk.get("similarity", 0)
+    for i, passage in enumerate(pack_context(chunks, token_budget), 1):
+        label = f"source: {passage['source']}"
+        if passage["section"]:
+            label += f", section: {passage['section']}"
+        if passage["page"] is not None:
+            label += f", page: {passage['page']}"
         parts.append(
-            f"[Chunk {i}] (source: {source}, relevance: {similarity:.2f})\n{text}"
+            f"[Chunk {i}] ({label}, relevance: {passage['similarity']:.2f})\n{passage['text']}"
         )
     return "\n\n".join(parts)
 
@@ -54,6 +95,43 @@ Rules:
 - Do NOT repeat the chunks verbatim — synthesize and summarize."""
 
 
+NO_CHUNKS_MESSAGE = "No relevant document chunks were found. Please upload and process a document first."
+
+
+def _build_messages(query, retrieved_chunks):
+    context = _build_context_block(retrieved_chunks)
+
+    user_message = (
+        f"Question: {query}\n\n"
+        f"Retrieved document chunks:\n{context}"
+    )
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": user_message},
+    ]
+
+
+def _answer_cache_key(query, retrieved_chunks):
+    """
+    Return (cache, query_vector, chunk_ids) for the answer cache, or
+    (None, None, None) when it is disabled or a chunk has no vector ID.
+    """
+    cache = get_answer_cache()
+    chunk_ids = [c.get("id", "") for c in retrieved_chunks]
+    if cache is None or not all(chunk_ids):
+        return None, None, None
+    return cache, embed_single_query(query), chunk_ids
+
+
+def _cached_answer(cache, query_vector, chunk_ids, model):
+    """Look up the answer cache and count the outcome."""
+    if cache is None:
+        return None
+    answer = cache.get(query_vector, chunk_ids, model)
+    count("answer_cache", result="hit" if answer is not None else "miss")
+    return answer
+
+
 def generate_answer(query, retrieved_chunks, model=None):
     """
     Use Groq LLM to generate a grounded answer from retrieved chunks.
@@ -71,27 +149,120 @@ def generate_answer(query, retrieved_chunks, model=None):
     Returns
     -------
     str
-        The LLM-generated answer.
+        The LLM-generated answer, reused from the answer cache when a
+        near-identical query was answered from the same chunks.
     """
     if not retrieved_chunks:
-        return "No relevant document chunks were found. Please upload and process a document first."
+        return NO_CHUNKS_MESSAGE
 
-    client = _get_groq_client()
-    context = _build_context_block(retrieved_chunks)
+    model = model or GROQ_MODEL
+    cache, query_vector, chunk_ids = _answer_cache_key(query, retrieved_chunks)
+    cached = _cached_answer(cache, query_vector, chunk_ids, model)
+    if cached is not None:
+        return cached
 
-    user_message = (
-        f"Question: {query}\n\n"
-        f"Retrieved document chunks:\n{context}"
+    client = get_groq_client()
+
+    with span("llm.answer"):
+        response = client.chat.completions.create(
+            model=model,
+            messages=_build_messages(query, retrieved_chunks),
+            temperature=0.3,
+            max_tokens=1024,
+        )
+
+    answer = response.choices[0].message.content
+    if cache is not None and answer:
+        cache.put(query_vector, chunk_ids, model, answer)
+    return answer
+
+
+def stream_answer(query, retrieved_chunks, model=None):
+    """
+    Streaming variant of generate_answer().
+
+    Yields pieces of the answer as the LLM produces them, so the UI can
+    render the first tokens long before generation has finished.  A
+    cached answer is yielded in one piece; a streamed answer is cached
+    only once it has been received in full.
+    """
+    if not retrieved_chunks:
+        yield NO_CHUNKS_MESSAGE
+        return
+
+    model = model or GROQ_MODEL
+    cache, query_vector, chunk_ids = _answer_cache_key(query, retrieved_chunks)
+    cached = _cached_answer(cache, query_vector, chunk_ids, model)
+    if cached is not None:
+        yield cached
+        return
+
+    client = get_groq_client()
+
+    start = time.perf_counter()
+    stream = client.chat.completions.create(
+        model=model,
+        messages=_build_messages(query, retrieved_chunks),
+        temperature=0.3,
+        max_tokens=1024,
+        stream=True,
     )
 
-    response = client.chat.completions.create(
-        model=model or GROQ_MODEL,
-        messages=[
-            {"role": "system", "content": SYSTEM_PROMPT},
-            {"role": "user", "content": user_message},
-        ],
+    parts = []
+    for chunk in stream:
+        delta = chunk.choices[0].delta.content if chunk.choices else None
+        if delta:
+            if not parts:
+                observe("llm.first_token", time.perf_counter() - start)
+            parts.append(delta)
+            yield delta
+    observe("llm.answer", time.perf_counter() - start)
+
+    if cache is not None and parts:
+        cache.put(query_vector, chunk_ids, model, "".join(parts))
+
+
+async def astream_answer(query, retrieved_chunks, model=None):
+    """
+    Asyncio variant of stream_answer().
+
+    Lets a caller keep streaming one answer while it awaits retrieval
+    for the next query on the same event loop.
+    """
+    if not retrieved_chunks:
+        yield NO_CHUNKS_MESSAGE
+        return
+
+    model = model or GROQ_MODEL
+    # Query encoding may hit the model, so keep it off the event loop
+    cache, query_vector, chunk_ids = await asyncio.to_thread(
+        _answer_cache_key, query, retrieved_chunks
+    )
+    cached = _cached_answer(cache, query_vector, chunk_ids, model)
+    if cached is not None:
+        yield cached
+        return
+
+    client = _get_async_groq_client()
+
+    start = time.perf_counter()
+    stream = await client.chat.completions.create(
+        model=model,
+        messages=_build_messages(query, retrieved_chunks),
         temperature=0.3,
         max_tokens=1024,
+        stream=True,
     )
 
-    return response.choices[0].message.content
+    parts = []
+    async for chunk in stream:
+        delta = chunk.choices[0].delta.content if chunk.choices else None
+        if delta:
+            if not parts:
+                observe("llm.first_token", time.perf_counter() - start)
+            parts.append(delta)
+            yield delta
+    observe("llm.answer", time.perf_counter() - start)
+
+    if cache is not None and parts:
+        cache.put(query_vector, chunk_ids, model, "".join(parts))
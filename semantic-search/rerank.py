@@ -0,0 +1,97 @@
+"""
+Cross-encoder re-ranking of retrieved chunks.
+
+The vector search over-fetches candidates; a local cross-encoder then
+scores (query, chunk) pairs in batches on CPU and the best top_k are
+kept.  A latency budget stops scoring early: candidates not scored in
+time keep their vector-search order behind the scored ones.
+"""
+import os
+import threading
+import time
+from dotenv import load_dotenv
+
+load_dotenv()
+
+RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+# Candidates fetched for re-ranking; 0 disables the re-ranking stage
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "0"))
+RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", "16"))
+RERANK_BUDGET_MS = float(os.getenv("RERANK_BUDGET_MS", "200"))
+
+_model = None
+_model_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_stats = {"calls": 0, "candidates": 0, "scored": 0, "truncated": 0, "total_ms": 0.0}
+
+
+def get_cross_encoder():
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                from sentence_transformers import CrossEncoder
+                _model = CrossEncoder(RERANK_MODEL, device="cpu")
+    return _model
+
+
+def rerank(query, candidates, top_k, budget_ms=None, batch_size=None):
+    """
+    Re-order candidates by cross-encoder relevance and keep top_k.
+
+    Returns (results, timing).  Each scored result gains 'rerank_score';
+    timing reports how many candidates were scored, in how many batches,
+    the elapsed milliseconds and whether the budget cut scoring short.
+    """
+    if budget_ms is None:
+        budget_ms = RERANK_BUDGET_MS
+    if batch_size is None:
+        batch_size = RERANK_BATCH_SIZE
+
+    start = time.perf_counter()
+    scored = []
+    batches = 0
+    truncated = False
+
+    if candidates:
+        model = get_cross_encoder()
+        for i in range(0, len(candidates), batch_size):
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            # Stop if the next batch would probably overrun the budget
+            if batches and elapsed_ms + elapsed_ms / batches > budget_ms:
+                truncated = True
+                break
+
+            batch = candidates[i:i + batch_size]
+            scores = model.predict(
+                [(query, c.get("text", "")) for c in batch],
+                batch_size=len(batch), show_progress_bar=False,
+            )
+            scored.extend(dict(c, rerank_score=round(float(s), 4)) for c, s in zip(batch, scores))
+            batches += 1
+
+    scored.sort(key=lambda c: c["rerank_score"], reverse=True)
+    results = (scored + candidates[len(scored):])[:top_k]
+
+    timing = {
+        "candidates": len(candidates),
+        "scored": len(scored),
+        "batches": batches,
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 2),
+        "truncated": truncated,
+    }
+    with _stats_lock:
+        _stats["calls"] += 1
+        _stats["candidates"] += timing["candidates"]
+        _stats["scored"] += timing["scored"]
+        _stats["truncated"] += int(truncated)
+        _stats["total_ms"] += timing["elapsed_ms"]
+    return results, timing
+
+
+def rerank_stats():
+    """Cumulative re-ranking counters for this process."""
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["avg_ms"] = round(stats["total_ms"] / stats["calls"], 2) if stats["calls"] else 0.0
+    return stats
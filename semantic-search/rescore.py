@@ -0,0 +1,89 @@
+"""
+Exact float32 re-scoring for quantized indexes.
+
+When the Endee index stores vectors at reduced precision (int8, binary,
+...), the full-precision embeddings are kept locally in an EmbeddingCache
+keyed by vector ID.  Searches over-fetch candidates from the server and
+re-score them here with exact cosine similarity before cutting to top_k.
+"""
+import os
+import threading
+import numpy as np
+from dotenv import load_dotenv
+from embed_cache import EmbeddingCache
+from session import ENDEE_PRECISION, INDEX_NAME
+
+load_dotenv()
+
+# Keep full-precision vectors locally (defaults to on for quantized indexes)
+FULL_VECTOR_STORE = (
+    os.getenv("FULL_VECTOR_STORE") or ("0" if ENDEE_PRECISION == "float32" else "1")
+) == "1"
+FULL_VECTOR_DIR = os.getenv("FULL_VECTOR_DIR", ".cache/full_vectors")
+# Candidates fetched per requested result; 1 disables exact re-scoring
+EXACT_RESCORE_OVERFETCH = int(os.getenv("EXACT_RESCORE_OVERFETCH", "1"))
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_full_vector_store(dim=None):
+    """
+    Return the local full-precision vector store, or None if disabled.
+
+    dim is only needed the first time, before anything has been stored.
+    """
+    global _store
+    if not FULL_VECTOR_STORE:
+        return None
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                if dim is None:
+                    return None
+                _store = EmbeddingCache(
+                    os.path.join(FULL_VECTOR_DIR, INDEX_NAME), dim, max_entries=0
+                )
+    return _store
+
+
+def store_full_vectors(vector_ids, vectors):
+    """Keep float32 copies of freshly upserted vectors for exact re-scoring."""
+    if not vector_ids:
+        return
+    store = get_full_vector_store(dim=len(vectors[0]))
+    if store is not None:
+        store.put_many(vector_ids, np.asarray(vectors, dtype=np.float32))
+
+
+def delete_full_vectors(vector_ids):
+    """Forget local copies of vectors that were deleted from the index."""
+    store = get_full_vector_store()
+    if store is not None:
+        store.delete_many(vector_ids)
+        store.flush()
+
+
+def rescore(query_vector, hits, top_k):
+    """
+    Re-rank raw Endee hits by exact cosine similarity and keep top_k.
+
+    Hits without a local full-precision vector keep the server's score.
+    """
+    store = get_full_vector_store(dim=len(query_vector))
+    if store is None or not hits:
+        return hits[:top_k]
+
+    local = store.get_many([h.get("id", "") for h in hits])
+    query = np.asarray(query_vector, dtype=np.float32)
+    query /= np.linalg.norm(query) or 1.0
+
+    rescored = []
+    for hit, vec in zip(hits, local):
+        if vec is not None:
+            norm = np.linalg.norm(vec) or 1.0
+            hit = dict(hit, similarity=float(np.dot(query, vec) / norm))
+        rescored.append(hit)
+
+    rescored.sort(key=lambda h: h.get("similarity", 0.0), reverse=True)
+    return rescored[:top_k]
@@ -1,53 +1,289 @@
+import asyncio
+import json
 import os
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-from embed import embed_single_query, get_endee_client, ensure_index_exists
+from chunk_store import get_chunk_store
+from embed import embed_queries, embed_single_query, reduce_vectors
+from metrics import span
+from near_dup import get_near_dup_index
+from rerank import RERANK_CANDIDATES, rerank
+from rescore import EXACT_RESCORE_OVERFETCH, rescore
+from session import call_with_index
+from sparse import HYBRID_SEARCH, encode_query, reciprocal_rank_fusion
+from tuning import ef_for
 
 load_dotenv()
 
 TOP_K = int(os.getenv("TOP_K", "5"))
+SEARCH_WORKERS = int(os.getenv("SEARCH_WORKERS", "8"))
+MAX_TOP_K = 4096  # server-side limit on k
+# Candidates per leg (dense and sparse) per requested result in hybrid mode
+HYBRID_OVERFETCH = int(os.getenv("HYBRID_OVERFETCH", "2"))
 
+# Runs the sparse leg of hybrid searches alongside the dense one
+_leg_pool = ThreadPoolExecutor(max_workers=SEARCH_WORKERS, thread_name_prefix="sparse-leg")
 
-def semantic_search(query_text, top_k=None):
+
+def build_filter(source=None, section=None, pages=None):
+    """
+    Build an Endee filter expression scoping a search.
+
+    source and section may be a single value or a list of values; pages
+    is an inclusive (first, last) page range.  Returns None when no
+    condition is given.  Conditions are ANDed by the server, which
+    brute-forces small matching sets instead of walking the HNSW graph.
+    """
+    conditions = []
+    for field, value in (("source", source), ("section", section)):
+        if value is None or value == [] or value == "":
+            continue
+        if isinstance(value, (list, tuple, set)):
+            conditions.append({field: {"$in": list(value)}})
+        else:
+            conditions.append({field: {"$eq": value}})
+    if pages is not None:
+        first, last = pages
+        conditions.append({"page": {"$range": [int(first), int(last)]}})
+    return conditions or None
+
+
+def semantic_search(query_text, top_k=None, filter=None, rerank_candidates=None,
+                    raise_errors=False):
     """
     Perform semantic similarity search against stored document vectors.
 
     Encodes the query into an embedding, then queries the Endee index
     to find the closest matching document chunks by cosine similarity.
+    An optional filter (see build_filter) is applied server-side.
+    With rerank_candidates > 0 (default RERANK_CANDIDATES), that many
+    candidates are fetched and re-ranked by the cross-encoder.
 
     Returns a list of results, each containing the matched text,
-    similarity score, and source document info.
+    similarity score, and source document info.  A failed search
+    returns [], or raises with raise_errors=True.
     """
     if top_k is None:
         top_k = TOP_K
 
-    query_vector = embed_single_query(query_text)
-
-    client = get_endee_client()
-    index = ensure_index_exists(client)
+    with span("query.embed"):
+        query_vector = embed_single_query(query_text)
 
     try:
-        raw_results = index.query(
-            vector=query_vector,
-            top_k=top_k,
-            ef=128,
-            include_vectors=False
-        )
+        with span("query.retrieve"):
+            return _retrieve(query_text, query_vector, top_k, filter, rerank_candidates)
     except Exception:
+        if raise_errors:
+            raise
         # Index might be empty or not ready yet
         return []
 
+
+async def semantic_search_async(query_text, top_k=None, filter=None, rerank_candidates=None):
+    """
+    Asyncio wrapper around semantic_search().
+
+    Encoding and the Endee round trip run on a worker thread, so the
+    event loop stays free to stream an earlier answer meanwhile.
+    """
+    return await asyncio.to_thread(
+        semantic_search, query_text, top_k, filter, rerank_candidates
+    )
+
+
+def semantic_search_batch(queries, top_k=None, max_workers=None, return_exceptions=False,
+                          filter=None, rerank_candidates=None):
+    """
+    Run many semantic searches at once.
+
+    All queries are encoded in one vectorized call, then the Endee
+    searches are sent concurrently on a bounded thread pool.  Results
+    come back in input order.  A query that fails does not affect the
+    others: its slot holds [] (or the exception, if return_exceptions
+    is True).
+    """
+    if top_k is None:
+        top_k = TOP_K
+    if max_workers is None:
+        max_workers = SEARCH_WORKERS
+
+    queries = list(queries)
+    if not queries:
+        return []
+
+    with span("query.embed_batch"):
+        query_vectors = embed_queries(queries)
+
+    def run_one(query_text, query_vector):
+        try:
+            with span("query.retrieve"):
+                return _retrieve(query_text, query_vector, top_k, filter, rerank_candidates)
+        except Exception as exc:
+            return exc if return_exceptions else []
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(queries))) as pool:
+        return list(pool.map(run_one, queries, query_vectors))
+
+
+def _retrieve(query_text, query_vector, top_k, filter=None, rerank_candidates=None):
+    """
+    Search and format results, re-ranking an over-fetched candidate set
+    with the cross-encoder when rerank_candidates > 0.  Chunk text is
+    looked up in the local chunk store only for the hits returned (or
+    re-ranked).
+    """
+    if rerank_candidates is None:
+        rerank_candidates = RERANK_CANDIDATES
+    if rerank_candidates <= 0:
+        return _hydrate(_format_results(_search(query_text, query_vector, top_k, filter)))
+
+    fetch_k = min(max(rerank_candidates, top_k), MAX_TOP_K)
+    # The cross-encoder needs the text of every candidate
+    candidates = _hydrate(_format_results(_search(query_text, query_vector, fetch_k, filter)))
+    with span("query.rerank"):
+        results, _ = rerank(query_text, candidates, top_k)
+    return results
+
+
+def _search(query_text, query_vector, top_k, filter=None):
+    """
+    Dense search, or hybrid dense + BM25 search when HYBRID_SEARCH is on.
+
+    In hybrid mode the sparse query runs on a worker thread while the
+    dense query runs here, and the two ranked lists are merged with
+    reciprocal rank fusion.
+    """
+    if not HYBRID_SEARCH:
+        return _query_index(query_vector, top_k, filter)
+
+    leg_k = min(top_k * HYBRID_OVERFETCH, MAX_TOP_K)
+    sparse_future = _leg_pool.submit(_query_sparse, query_text, leg_k, filter)
+    dense_hits = _query_index(query_vector, leg_k, filter) or []
+    try:
+        sparse_hits = sparse_future.result()
+    except Exception:
+        # Fall back to dense-only results if the sparse leg fails
+        sparse_hits = []
+
+    return reciprocal_rank_fusion([dense_hits, sparse_hits])[:top_k]
+
+
+def _query_sparse(query_text, top_k, filter=None):
+    """BM25 leg: query the sparse index with the query's IDF weights."""
+    indices, values = encode_query(query_text)
+    if not indices:
+        return []
+    with span("endee.sparse_query"):
+        raw_results = call_with_index(lambda index: index.query(
+            sparse_indices=indices,
+            sparse_values=values,
+            top_k=top_k,
+            filter=filter,
+            include_vectors=False
+        )) or []
+
+    # Sparse scores are BM25 values, not cosine similarities
+    hits = []
+    for item in raw_results:
+        hit = dict(item)
+        hit["bm25"] = hit.pop("similarity", 0.0)
+        hits.append(hit)
+    return hits
+
+
+def _query_index(query_vector, top_k, filter=None):
+    """
+    Query Endee for top_k hits.
+
+    With EXACT_RESCORE_OVERFETCH > 1, more candidates are fetched from
+    the (possibly quantized) index and re-scored against the local
+    full-precision vectors before cutting back to top_k.  ef comes from
+    the recall-targeted tuning in tuning.py.
+    """
+    # Into the index's (possibly reduced) space; re-scoring happens there too
+    query_vector = reduce_vectors([query_vector])[0]
+    fetch_k = top_k
+    if EXACT_RESCORE_OVERFETCH > 1:
+        fetch_k = min(top_k * EXACT_RESCORE_OVERFETCH, MAX_TOP_K)
+
+    with span("endee.query"):
+        raw_results = call_with_index(lambda index: index.query(
+            vector=query_vector,
+            top_k=fetch_k,
+            ef=ef_for(fetch_k),
+            filter=filter,
+            include_vectors=False
+        ))
+
+    if fetch_k > top_k:
+        with span("query.rescore"):
+            return rescore(query_vector, raw_results or [], top_k)
+    return raw_results
+
+
+def _filter_fields(item):
+    """Filter fields of a hit; the server may return them as a JSON string."""
+    fields = item.get("filter") or {}
+    if isinstance(fields, str):
+        try:
+            fields = json.loads(fields)
+        except ValueError:
+            fields = {}
+    return fields
+
+
+def _format_results(raw_results):
+    """Convert raw Endee hits into the result dicts used by the app."""
     if not raw_results:
         return []
 
     results = []
     for item in raw_results:
         meta = item.get("meta", {})
+        fields = _filter_fields(item)
         results.append({
             "text": meta.get("text", ""),
-            "source": meta.get("source", "unknown"),
+            "source": meta.get("source") or fields.get("source", "unknown"),
             "chunk_id": meta.get("chunk_id", ""),
+            "section": fields.get("section", ""),
+            "page": fields.get("page"),
             "similarity": round(item.get("similarity", 0.0), 4),
             "id": item.get("id", "")
         })
+        if "score" in item:
+            # Fused rank score from hybrid search
+            results[-1]["score"] = round(item["score"], 6)
+
+    return results
+
+
+def _hydrate(results):
+    """
+    Fill in text and chunk details from the local chunk store in one
+    lookup, and list the sources of near-duplicates linked to each hit.
+    """
+    if not results:
+        return results
+    chunk_store = get_chunk_store()
+    if chunk_store is not None:
+        with span("query.hydrate"):
+            rows = chunk_store.get_many([r["id"] for r in results])
+        for result in results:
+            row = rows.get(result["id"])
+            if row is None:
+                # Vectors upserted before the chunk store keep their text in metadata
+                continue
+            result["text"] = row["text"]
+            result["source"] = row["source"]
+            result["chunk_id"] = row["chunk_id"]
+            result["section"] = row["section"] or result["section"]
+            if row["page"] is not None:
+                result["page"] = row["page"]
 
+    near_dup_index = get_near_dup_index()
+    if near_dup_index is not None:
+        linked = near_dup_index.linked_sources([r["id"] for r in results])
+        for result in results:
+            if result["id"] in linked:
+                result["also_in"] = linked[result["id"]]
     return results
@@ -0,0 +1,192 @@
+"""
+Process-wide Endee session.
+
+Keeps one Endee client (and therefore one pool of keep-alive HTTP
+connections) plus a validated index handle for the lifetime of the
+process, so searches and upserts go straight to the index endpoints
+instead of re-listing indexes on every call.
+"""
+import os
+import threading
+import httpx
+from dotenv import load_dotenv
+from endee import Endee, NotFoundException, Precision, ServerException
+from sparse import HYBRID_SEARCH, SPARSE_DIM
+
+load_dotenv()
+
+ENDEE_TOKEN = os.getenv("ENDEE_TOKEN", "")
+ENDEE_BASE_URL = os.getenv("ENDEE_BASE_URL", "http://localhost:8080/api/v1")
+INDEX_NAME = os.getenv("INDEX_NAME", "semantic_search")
+# Storage precision for new indexes: float32, float16, int16, int8 or binary
+ENDEE_PRECISION = os.getenv("ENDEE_PRECISION", "float32").lower()
+
+# Failures after which the cached index handle may be stale: a dropped or
+# refused connection (requests raises OSError subclasses) or a deleted index
+STALE_HANDLE_ERRORS = (OSError, httpx.TransportError, NotFoundException)
+# Failures worth retrying with backoff: the above plus 5xx responses
+TRANSIENT_ERRORS = STALE_HANDLE_ERRORS + (ServerException,)
+
+_lock = threading.Lock()
+_client = None
+_index = None
+_installed_client = None  # set by use_client(); survives reset()
+
+
+def get_endee_client():
+    """Initialize Endee client with optional token authentication."""
+    if ENDEE_TOKEN:
+        client = Endee(token=ENDEE_TOKEN)
+    else:
+        client = Endee()
+    client.set_base_url(ENDEE_BASE_URL)
+    return client
+
+
+def resolve_precision(name):
+    """
+    Map a precision name to the SDK's Precision enum.
+
+    The server accepts int8/int16 under their SDK names int8d/int16d as
+    well, so both spellings are tried.
+    """
+    name = name.lower()
+    for value in (name, name + "d", name.rstrip("d")):
+        try:
+            return Precision(value)
+        except ValueError:
+            continue
+    raise ValueError(f"Unsupported precision: {name}")
+
+
+def ensure_index_exists(client, create=True):
+    """
+    Create the search index if it doesn't already exist.
+
+    Its dimension is the embedding model's after any DIM_REDUCTION; an
+    existing index of another dimension is rejected.  With create=False
+    a missing index is not created and None is returned.
+    """
+    existing = client.list_indexes()
+
+    # list_indexes may return a dict like {'indexes': [...]} or a plain list
+    index_names = []
+    if isinstance(existing, dict):
+        index_list = existing.get("indexes", [])
+    elif isinstance(existing, list):
+        index_list = existing
+    else:
+        index_list = []
+
+    for idx in index_list:
+        if isinstance(idx, dict):
+            index_names.append(idx.get("name", ""))
+        elif isinstance(idx, str):
+            index_names.append(idx)
+
+    # Imported here: embed depends on this module
+    from embed import index_dimension
+    dimension = index_dimension()
+
+    if INDEX_NAME not in index_names:
+        if not create:
+            return None
+        options = {}
+        if HYBRID_SEARCH:
+            # Sparse leg for hybrid dense + BM25 retrieval
+            options["sparse_dim"] = SPARSE_DIM
+        client.create_index(
+            name=INDEX_NAME,
+            dimension=dimension,
+            space_type="cosine",
+            precision=resolve_precision(ENDEE_PRECISION),
+            **options
+        )
+
+    index = client.get_index(name=INDEX_NAME)
+    existing_dim = getattr(index, "dimension", None)
+    if existing_dim is not None and existing_dim != dimension:
+        raise ValueError(
+            f"Index {INDEX_NAME!r} stores {existing_dim}-dim vectors but the embedding "
+            f"model and DIM_REDUCTION produce {dimension}; use another INDEX_NAME"
+        )
+    return index
+
+
+def get_client():
+    """Return the shared Endee client, creating it on first use."""
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                _client = get_endee_client()
+    return _client
+
+
+def get_index():
+    """
+    Return the cached index handle.
+
+    The index is validated (and created if missing) only the first time,
+    or after invalidate_index() has been called because a request failed.
+    """
+    global _index
+    if _index is None:
+        client = get_client()
+        with _lock:
+            if _index is None:
+                _index = ensure_index_exists(client)
+    return _index
+
+
+def find_index():
+    """Like get_index(), but returns None instead of creating a missing index."""
+    global _index
+    if _index is None:
+        client = get_client()
+        with _lock:
+            if _index is None:
+                _index = ensure_index_exists(client, create=False)
+    return _index
+
+
+def invalidate_index():
+    """Drop the cached index handle so the next call re-validates it."""
+    global _index
+    with _lock:
+        _index = None
+
+
+def use_client(client):
+    """Install a client (e.g. fake_endee.FakeEndee) in place of the configured server."""
+    global _client, _index, _installed_client
+    with _lock:
+        _installed_client = _client = client
+        _index = None
+
+
+def reset():
+    """Drop both the cached client and index handle."""
+    global _client, _index
+    with _lock:
+        _client = _installed_client
+        _index = None
+
+
+def call_with_index(fn, retry=True):
+    """
+    Run fn(index) against the cached handle.
+
+    If the connection fails or the index is not found, the handle is
+    assumed stale (index deleted, server restarted): it is invalidated
+    so the next call re-validates it and, with retry, the call is
+    retried once.  Other errors, and a second failure, are raised to the
+    caller.  Callers with their own retry loop pass retry=False.
+    """
+    try:
+        return fn(get_index())
+    except STALE_HANDLE_ERRORS:
+        invalidate_index()
+        if not retry:
+            raise
+        return fn(get_index())
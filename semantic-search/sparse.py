@@ -0,0 +1,299 @@
+"""
+BM25-style sparse vectors for Endee's sparse index.
+
+Each chunk is stored with its BM25 term-frequency weights against a
+local vocabulary; queries carry the IDF of their terms.  The server's
+sparse dot product (Block-Max WAND, src/sparse/) then equals the BM25
+score, and IDF stays current as the corpus grows because it only lives
+on the query side.
+
+The vocabulary lives in SQLite next to the other local stores.  Every
+document's length and terms are kept under its vector ID, so deleting
+or re-upserting a chunk takes its old counts back out of the corpus
+statistics, and each batch only writes the rows it changed.
+"""
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+import zlib
+from collections import Counter
+from dotenv import load_dotenv
+
+load_dotenv()
+
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "0") == "1"
+SPARSE_DIM = int(os.getenv("SPARSE_DIM", str(2 ** 20)))
+SPARSE_VOCAB_PATH = os.getenv("SPARSE_VOCAB_PATH") or ".cache/sparse_vocab.sqlite3"
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Parameters per IN (...) query; SQLite's default limit is 999
+_LOOKUP_BATCH = 500
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9][a-z0-9+#]*(?:[._-][a-z0-9+#]+)*")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the "
+    "this to was were will with".split()
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS terms (
+    id INTEGER PRIMARY KEY,
+    term TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS doc_freq (
+    term_id INTEGER PRIMARY KEY,
+    count INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS docs (
+    vector_id TEXT PRIMARY KEY,
+    length INTEGER NOT NULL,
+    term_ids TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS totals (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    num_docs INTEGER NOT NULL,
+    total_length INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO totals (id, num_docs, total_length) VALUES (0, 0, 0);
+"""
+
+
+def tokenize(text):
+    """Lowercase word tokens, keeping things like c++, node.js and IDs intact."""
+    return [t for t in _TOKEN_PATTERN.findall(text.lower()) if t not in _STOPWORDS]
+
+
+class Vocabulary:
+    """
+    Persistent term -> id map with document-frequency statistics.
+
+    New terms get the next free id until SPARSE_DIM is reached; after
+    that they are hashed into the existing id range.  Term ids never
+    change once assigned, so they are cached in memory; the statistics
+    are read from the database on every query and so include what
+    another process has ingested since.
+    """
+
+    def __init__(self, path, dim=SPARSE_DIM):
+        self.path = path
+        self.dim = dim
+        self._lock = threading.Lock()
+        self._term_ids = {}
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def import_legacy(self, json_path):
+        """
+        Take over the term ids and totals of a vocabulary saved as JSON.
+
+        Sparse vectors already in the index refer to those ids.  The JSON
+        format had no per-document stats, so the imported documents are
+        never subtracted again; re-ingest to get exact counts.
+        """
+        with open(json_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        with self._lock, self._conn:
+            if self._conn.execute("SELECT 1 FROM terms LIMIT 1").fetchone():
+                return
+            self._conn.executemany(
+                "INSERT INTO terms (id, term) VALUES (?, ?)",
+                [(term_id, term) for term, term_id in data.get("term_ids", {}).items()],
+            )
+            self._conn.executemany(
+                "INSERT INTO doc_freq (term_id, count) VALUES (?, ?)",
+                [(int(term_id), count) for term_id, count in data.get("doc_freq", {}).items()],
+            )
+            self._conn.execute(
+                "UPDATE totals SET num_docs = ?, total_length = ?",
+                (data.get("num_docs", 0), data.get("total_length", 0)),
+            )
+
+    def _term_id(self, term, create):
+        term_id = self._term_ids.get(term)
+        if term_id is not None:
+            return term_id
+        row = self._conn.execute("SELECT id FROM terms WHERE term = ?", (term,)).fetchone()
+        if row is not None:
+            term_id = self._term_ids[term] = row[0]
+            return term_id
+        next_id = self._conn.execute("SELECT COALESCE(MAX(id) + 1, 0) FROM terms").fetchone()[0]
+        if next_id < self.dim:
+            if not create:
+                return None
+            self._conn.execute("INSERT INTO terms (id, term) VALUES (?, ?)", (next_id, term))
+            self._term_ids[term] = next_id
+            return next_id
+        return zlib.crc32(term.encode("utf-8")) % self.dim
+
+    def _forget(self, vector_ids, totals):
+        """Take stored documents out of doc_freq and totals; returns the updated totals."""
+        num_docs, total_length = totals
+        for i in range(0, len(vector_ids), _LOOKUP_BATCH):
+            batch = vector_ids[i:i + _LOOKUP_BATCH]
+            placeholders = ",".join("?" * len(batch))
+            rows = self._conn.execute(
+                f"SELECT length, term_ids FROM docs WHERE vector_id IN ({placeholders})", batch
+            ).fetchall()
+            if not rows:
+                continue
+            self._conn.execute(f"DELETE FROM docs WHERE vector_id IN ({placeholders})", batch)
+            decrements = Counter()
+            for length, term_ids in rows:
+                num_docs -= 1
+                total_length -= length
+                decrements.update(json.loads(term_ids))
+            self._conn.executemany(
+                "UPDATE doc_freq SET count = count - ? WHERE term_id = ?",
+                [(n, term_id) for term_id, n in decrements.items()],
+            )
+        self._conn.execute("DELETE FROM doc_freq WHERE count <= 0")
+        return max(num_docs, 0), max(total_length, 0)
+
+    def _totals(self):
+        return self._conn.execute("SELECT num_docs, total_length FROM totals").fetchone()
+
+    def encode_documents(self, texts, vector_ids):
+        """
+        Return (indices, values) BM25 TF weights per text and record the
+        documents' stats under their vector IDs, replacing what an earlier
+        upsert of the same ID recorded.
+        """
+        vector_ids = list(vector_ids)
+        encoded = []
+        with self._lock, self._conn:
+            totals = self._forget(vector_ids, self._totals())
+            num_docs, total_length = totals
+            doc_rows, increments = [], Counter()
+            for text, vector_id in zip(texts, vector_ids):
+                tokens = tokenize(text)
+                counts = Counter(self._term_id(t, create=True) for t in tokens)
+                num_docs += 1
+                total_length += len(tokens)
+                increments.update(counts.keys())
+                doc_rows.append((vector_id, len(tokens), json.dumps(sorted(counts))))
+
+                avg_length = total_length / num_docs
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * len(tokens) / max(avg_length, 1e-9))
+                indices = sorted(counts)
+                values = [counts[i] * (BM25_K1 + 1) / (counts[i] + norm) for i in indices]
+                encoded.append((indices, values))
+
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO docs (vector_id, length, term_ids) VALUES (?, ?, ?)",
+                doc_rows,
+            )
+            self._conn.executemany(
+                "INSERT INTO doc_freq (term_id, count) VALUES (?, ?) "
+                "ON CONFLICT(term_id) DO UPDATE SET count = count + excluded.count",
+                list(increments.items()),
+            )
+            self._conn.execute(
+                "UPDATE totals SET num_docs = ?, total_length = ?", (num_docs, total_length)
+            )
+        return encoded
+
+    def remove_documents(self, vector_ids):
+        """Take deleted chunks out of the corpus statistics."""
+        with self._lock, self._conn:
+            num_docs, total_length = self._forget(list(vector_ids), self._totals())
+            self._conn.execute(
+                "UPDATE totals SET num_docs = ?, total_length = ?", (num_docs, total_length)
+            )
+
+    def encode_query(self, text):
+        """Return (indices, values) with the IDF of each known query term."""
+        with self._lock:
+            ids = {self._term_id(t, create=False) for t in tokenize(text)}
+            ids.discard(None)
+            n = max(self._totals()[0], 1)
+            doc_freq = {}
+            ids = sorted(ids)
+            for i in range(0, len(ids), _LOOKUP_BATCH):
+                batch = ids[i:i + _LOOKUP_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                doc_freq.update(self._conn.execute(
+                    f"SELECT term_id, count FROM doc_freq WHERE term_id IN ({placeholders})",
+                    batch,
+                ))
+        weights = [math.log(1 + (n - doc_freq.get(i, 0) + 0.5) / (doc_freq.get(i, 0) + 0.5))
+                   for i in ids]
+        return ids, weights
+
+    def stats(self):
+        """Corpus totals: documents, total token count, distinct terms."""
+        with self._lock:
+            num_docs, total_length = self._totals()
+            terms = self._conn.execute("SELECT COUNT(*) FROM terms").fetchone()[0]
+        return {"num_docs": num_docs, "total_length": total_length, "terms": terms}
+
+
+_vocab = None
+_vocab_lock = threading.Lock()
+
+
+def get_vocabulary():
+    """
+    Return the process-wide vocabulary, opening it on first use.
+
+    A JSON vocabulary from before the SQLite store (same path with a
+    .json suffix) is imported into an empty database.
+    """
+    global _vocab
+    if _vocab is None:
+        with _vocab_lock:
+            if _vocab is None:
+                stem = os.path.splitext(SPARSE_VOCAB_PATH)[0]
+                path = SPARSE_VOCAB_PATH
+                if path == stem + ".json":
+                    path = stem + ".sqlite3"
+                directory = os.path.dirname(path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                vocab = Vocabulary(path)
+                if os.path.exists(stem + ".json"):
+                    vocab.import_legacy(stem + ".json")
+                _vocab = vocab
+    return _vocab
+
+
+def encode_documents(texts, vector_ids):
+    """Sparse vectors for a batch of chunk texts, recorded under their vector IDs."""
+    return get_vocabulary().encode_documents(texts, vector_ids)
+
+
+def remove_documents(vector_ids):
+    """Forget the statistics of deleted chunks."""
+    get_vocabulary().remove_documents(vector_ids)
+
+
+def encode_query(text):
+    """Sparse vector for a search query."""
+    return get_vocabulary().encode_query(text)
+
+
+def reciprocal_rank_fusion(result_lists, k=60):
+    """
+    Merge ranked hit lists with RRF: score = sum(1 / (k + rank)).
+
+    Hits are matched by 'id'; the first occurrence keeps its fields and
+    gains a 'score' with the fused value.
+    """
+    fused = {}
+    for results in result_lists:
+        for rank, hit in enumerate(results, 1):
+            hit_id = hit.get("id", "")
+            if hit_id not in fused:
+                fused[hit_id] = dict(hit, score=0.0)
+            fused[hit_id]["score"] += 1.0 / (k + rank)
+    return sorted(fused.values(), key=lambda h: h["score"], reverse=True)
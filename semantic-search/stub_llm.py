@@ -0,0 +1,124 @@
+"""
+Stub LLM server for local testing.
+
+Speaks enough of the OpenAI-compatible chat completions API used by the
+Groq SDK (``POST /openai/v1/chat/completions``, streaming and not) to
+exercise rag.py without network access or an API key:
+
+    python stub_llm.py --port 8765 --delay 0.02
+    GROQ_BASE_URL=http://localhost:8765 GROQ_API_KEY=stub streamlit run app.py
+
+The answer is a fixed template that names the question and how many
+chunks were sent, emitted one word at a time.
+"""
+import argparse
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+COMPLETIONS_PATH = "/openai/v1/chat/completions"
+
+
+def _stub_answer(messages):
+    user = next((m["content"] for m in reversed(messages) if m.get("role") == "user"), "")
+    question = user.split("\n", 1)[0].replace("Question: ", "", 1)
+    n_chunks = user.count("[Chunk ")
+    return f"Stub answer to '{question}' based on {n_chunks} retrieved chunks."
+
+
+class _Handler(BaseHTTPRequestHandler):
+    delay = 0.0
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        if self.path.rstrip("/") != COMPLETIONS_PATH:
+            self.send_error(404)
+            return
+
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        answer = _stub_answer(body.get("messages", []))
+        model = body.get("model", "stub")
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+
+        if not body.get("stream"):
+            payload = {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": answer},
+                    "finish_reason": "stop",
+                }],
+                "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+            }
+            data = json.dumps(payload).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+
+        words = answer.split(" ")
+        for i, word in enumerate(words):
+            piece = word if i == 0 else " " + word
+            self._send_event(completion_id, created, model, {"content": piece}, None)
+            time.sleep(self.delay)
+        self._send_event(completion_id, created, model, {}, "stop")
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+    def _send_event(self, completion_id, created, model, delta, finish_reason):
+        chunk = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        }
+        self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+        self.wfile.flush()
+
+
+def start_stub_server(port=0, delay=0.0):
+    """
+    Start the stub server on a background thread.
+
+    Returns (server, base_url); call server.shutdown() when done.  Use
+    port=0 to pick a free port.
+    """
+    handler = type("StubHandler", (_Handler,), {"delay": delay})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub OpenAI-compatible LLM server")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--delay", type=float, default=0.02,
+                        help="seconds between streamed words")
+    args = parser.parse_args()
+
+    handler = type("StubHandler", (_Handler,), {"delay": args.delay})
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), handler)
+    print(f"Stub LLM listening on http://127.0.0.1:{args.port}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
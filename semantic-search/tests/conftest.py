@@ -0,0 +1,100 @@
+"""
+Shared fixtures: an in-process Endee (fake_endee) and per-test local state.
+
+The app modules read their configuration when imported, so the
+environment is pointed at a scratch directory before any test imports
+them.  No embedding model is loaded: tests pass their own vectors.
+"""
+import os
+import sys
+import tempfile
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+_WORK_DIR = tempfile.mkdtemp(prefix="semantic_search_tests_")
+os.environ.update({
+    "INDEX_NAME": "semantic_search_test",
+    "EMBED_CACHE": "0",
+    "QUERY_CACHE_SIZE": "0",
+    "ANSWER_CACHE_SIZE": "0",
+    "FULL_VECTOR_STORE": "0",
+    "HYBRID_SEARCH": "0",
+    "DIM_REDUCTION": "none",
+    "NEAR_DUP": "link",
+    "WARMUP": "0",
+    "EF_AUTO_TUNE": "0",
+    "MANIFEST_PATH": os.path.join(_WORK_DIR, "manifest.sqlite3"),
+    "CHUNK_STORE_PATH": os.path.join(_WORK_DIR, "chunks.sqlite3"),
+    "NEAR_DUP_PATH": os.path.join(_WORK_DIR, "near_dup.sqlite3"),
+    "FULL_VECTOR_DIR": os.path.join(_WORK_DIR, "full_vectors"),
+    "SPARSE_VOCAB_PATH": os.path.join(_WORK_DIR, "sparse_vocab.sqlite3"),
+    "BULK_JOURNAL_PATH": os.path.join(_WORK_DIR, "bulk_journal.jsonl"),
+    "WRITER_LOCK_PATH": os.path.join(_WORK_DIR, "writer.lock"),
+})
+
+DIM = 8
+
+
+def vectors_for(chunks):
+    """Deterministic unit vectors, one per chunk text."""
+    from embed_cache import text_key
+    vectors = []
+    for chunk in chunks:
+        rng = np.random.default_rng(int(text_key(chunk["text"])[:8], 16))
+        vec = rng.standard_normal(DIM)
+        vectors.append((vec / np.linalg.norm(vec)).tolist())
+    return vectors
+
+
+def ingest(source, data, texts):
+    """Run one file through the app's ingest steps; returns the chunks embedded."""
+    from indexer import check_file, finish_file, plan_chunks, upsert_chunks
+    from pipeline import SkipFile
+
+    check_file(source, data)
+    chunks = [{"id": i, "text": text, "section": "General", "page": 1}
+              for i, text in enumerate(texts)]
+    try:
+        new_chunks = plan_chunks(source, chunks)
+    except SkipFile:
+        return []
+    upsert_chunks(new_chunks, vectors_for(new_chunks), source)
+    finish_file(source)
+    return new_chunks
+
+
+@pytest.fixture
+def endee(tmp_path, monkeypatch):
+    """
+    A FakeEndee installed as the session client, with a fresh manifest,
+    chunk store and near-duplicate index under tmp_path, with the writer
+    lock held.  Returns a function giving the test index (created on
+    first use).
+    """
+    import chunk_store
+    import embed
+    import indexer
+    import near_dup
+    import session
+    from fake_endee import FakeEndee
+    from writer_lock import acquire_writer_lock
+
+    monkeypatch.setattr(indexer, "MANIFEST_PATH", str(tmp_path / "manifest.sqlite3"))
+    monkeypatch.setattr(indexer, "_manifest", None)
+    monkeypatch.setattr(chunk_store, "CHUNK_STORE_PATH", str(tmp_path / "chunks.sqlite3"))
+    monkeypatch.setattr(chunk_store, "_store", None)
+    monkeypatch.setattr(near_dup, "NEAR_DUP_PATH", str(tmp_path / "near_dup.sqlite3"))
+    monkeypatch.setattr(near_dup, "_index", None)
+    for pending in (indexer._pending, indexer._pending_links, indexer._pending_signatures):
+        pending.clear()
+    # The index is created at the model's dimension; no model is loaded here
+    monkeypatch.setattr(embed, "index_dimension", lambda: DIM)
+
+    client = FakeEndee()
+    session.use_client(client)
+    with acquire_writer_lock("tests"):
+        yield lambda: session.get_index()
+    session.invalidate_index()
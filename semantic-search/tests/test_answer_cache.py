@@ -0,0 +1,48 @@
+"""Matching and invalidation of cached answers (answer_cache)."""
+from conftest import ingest
+from answer_cache import AnswerCache
+
+
+def test_answer_needs_same_chunks_model_and_a_similar_query():
+    cache = AnswerCache(threshold=0.95)
+    cache.put([1.0, 0.0], ["c1", "c2"], "model", "answer")
+
+    assert cache.get([1.0, 0.01], ["c2", "c1"], "model") == "answer"
+    assert cache.get([1.0, 1.0], ["c1", "c2"], "model") is None
+    assert cache.get([1.0, 0.0], ["c1"], "model") is None
+    assert cache.get([1.0, 0.0], ["c1", "c2"], "other") is None
+
+
+def test_reindexed_chunk_drops_the_answers_built_on_it():
+    cache = AnswerCache()
+    cache.put([1.0, 0.0], ["c1", "c2"], "model", "first")
+    cache.put([0.0, 1.0], ["c3"], "model", "second")
+
+    assert cache.invalidate(["c2", "unknown"]) == 1
+    assert cache.get([1.0, 0.0], ["c1", "c2"], "model") is None
+    assert cache.get([0.0, 1.0], ["c3"], "model") == "second"
+    assert cache.stats()["invalidated"] == 1
+
+
+def test_ingest_invalidates_answers_here_and_in_other_processes(endee, monkeypatch):
+    import answer_cache
+    from indexer import get_manifest
+    from writer_lock import bump_index_generation
+
+    monkeypatch.setattr(answer_cache, "ANSWER_CACHE_SIZE", 16)
+    monkeypatch.setattr(answer_cache, "_cache", None)
+    monkeypatch.setattr(answer_cache, "_generation", None)
+    first = ingest("a.pdf", b"v1", ["alpha text", "beta text"])
+    alpha_id, beta_id = (get_manifest().chunk_vectors("a.pdf")[c["hash"]] for c in first)
+
+    cache = answer_cache.get_answer_cache()
+    cache.put([1.0], [alpha_id], "model", "about alpha")
+    cache.put([1.0], [beta_id], "model", "about beta")
+    # beta is removed from the file: only the answer using it goes
+    ingest("a.pdf", b"v2", ["alpha text"])
+    assert cache.get([1.0], [alpha_id], "model") == "about alpha"
+    assert cache.get([1.0], [beta_id], "model") is None
+
+    # Another process changed the index: nothing cached here can be trusted
+    bump_index_generation()
+    assert answer_cache.get_answer_cache().get([1.0], [alpha_id], "model") is None
@@ -0,0 +1,29 @@
+"""Synthetic corpus and PDF writer of benchmark.py."""
+import re
+import numpy as np
+from benchmark import _LINES_PER_PAGE, make_pdf, make_vocabulary, synthetic_pages
+from utils import iter_chunks
+
+
+def test_synthetic_pages_are_deterministic_and_chunk_into_sections():
+    pages = synthetic_pages(np.random.default_rng(1), make_vocabulary(np.random.default_rng(1)), 3)
+    again = synthetic_pages(np.random.default_rng(1), make_vocabulary(np.random.default_rng(1)), 3)
+    assert pages == again
+    assert all(len(lines) == _LINES_PER_PAGE for lines in pages)
+
+    chunks = list(iter_chunks("\n".join(lines) for lines in pages))
+    assert len(chunks) > 3
+    assert len({c["section"] for c in chunks}) > 1
+
+
+def test_pdf_cross_reference_table_points_at_each_object():
+    pdf = make_pdf([["first page (with parens)"], ["second page"]])
+    assert pdf.startswith(b"%PDF-1.4\n") and pdf.endswith(b"%%EOF\n")
+    assert b"/Count 2" in pdf and b"(first page \\(with parens\\)) Tj" in pdf
+
+    xref = int(re.search(rb"startxref\n(\d+)", pdf).group(1))
+    assert pdf[xref:].startswith(b"xref\n0 8\n")
+    offsets = [int(o) for o in re.findall(rb"(\d{10}) 00000 n", pdf[xref:])]
+    assert len(offsets) == 7
+    for number, offset in enumerate(offsets, 1):
+        assert pdf[offset:].startswith(b"%d 0 obj\n" % number)
@@ -0,0 +1,100 @@
+"""Checkpoint journal and resumable upserts of bulk_ingest.py."""
+import pytest
+from conftest import vectors_for
+
+
+def test_journal_resumes_after_a_torn_record(tmp_path):
+    from bulk_ingest import IngestJournal
+
+    pdf = tmp_path / "a.pdf"
+    pdf.write_bytes(b"%PDF-1.4 a")
+    journal_path = str(tmp_path / "journal.jsonl")
+
+    journal = IngestJournal(journal_path)
+    journal.record_file(str(pdf), "a.pdf", "complete", stored=3)
+    journal.record_batch("b.pdf", 100, 0.5)
+    journal.record_batch("b.pdf", 50, 0.4)
+    journal.close()
+    with open(journal_path, "a", encoding="utf-8") as f:
+        f.write('{"event": "batch", "source": "b.pdf", "vec')  # cut short by a crash
+
+    journal = IngestJournal(journal_path)
+    assert journal.is_done(str(pdf))
+    assert journal.committed == {"b.pdf": 150}
+    journal.record_batch("b.pdf", 25, 0.1)
+    journal.close()
+    assert IngestJournal(journal_path).committed == {"b.pdf": 175}
+
+
+def test_journal_redoes_changed_and_failed_files(tmp_path):
+    from bulk_ingest import IngestJournal
+
+    changed, failed = tmp_path / "changed.pdf", tmp_path / "failed.pdf"
+    changed.write_bytes(b"v1")
+    failed.write_bytes(b"v1")
+    journal = IngestJournal(str(tmp_path / "journal.jsonl"))
+    journal.record_file(str(changed), "changed.pdf", "complete")
+    journal.record_file(str(failed), "failed.pdf", "error", message="boom")
+    changed.write_bytes(b"v2, longer")
+    assert not journal.is_done(str(changed))
+    assert not journal.is_done(str(failed))
+    journal.close()
+
+
+def test_batch_size_adapts_to_latency_and_failures():
+    from bulk_ingest import AdaptiveBatchSize
+
+    batch = AdaptiveBatchSize(initial=100, minimum=16, maximum=1000, target_seconds=2.0)
+    batch.success(100, 0.5)
+    assert batch.size == 200
+    batch.success(150, 0.5)  # a short final batch says nothing about capacity
+    assert batch.size == 200
+    batch.success(200, 1.5)  # within target: keep
+    assert batch.size == 200
+    batch.success(200, 3.0)
+    assert batch.size == 100
+    for _ in range(10):
+        batch.success(batch.size, 0.1)
+    assert batch.size == 1000
+
+    assert batch.failure() and batch.size == 500
+    while batch.failure():
+        pass
+    assert batch.size == 16
+    assert AdaptiveBatchSize(initial=5000, minimum=16, maximum=1000).size == 1000
+
+
+def test_upsert_failure_keeps_committed_batches(endee, tmp_path, monkeypatch):
+    from bulk_ingest import AdaptiveBatchSize, BulkLoader, IngestJournal
+    from indexer import check_file, plan_chunks
+
+    texts = [f"chunk number {i}" for i in range(6)]
+    journal = IngestJournal(str(tmp_path / "journal.jsonl"))
+    loader = BulkLoader(str(tmp_path), journal, AdaptiveBatchSize(initial=2, minimum=2, maximum=2))
+
+    index = endee()
+    upsert = index.upsert
+    calls = []
+
+    def fail_third_call(vectors):
+        calls.append(len(vectors))
+        if len(calls) == 3:
+            raise ValueError("rejected")
+        return upsert(vectors)
+
+    monkeypatch.setattr(index, "upsert", fail_third_call)
+    check_file("a.pdf", b"a")
+    chunks = plan_chunks("a.pdf", [{"id": i, "text": t} for i, t in enumerate(texts)])
+    with pytest.raises(ValueError):
+        loader.upsert(chunks, vectors_for(chunks), "a.pdf")
+    assert journal.committed == {"a.pdf": 4}
+    assert len(index) == 4
+
+    # The rerun only embeds and upserts what the crash left out
+    monkeypatch.setattr(index, "upsert", upsert)
+    check_file("a.pdf", b"a")
+    remaining = plan_chunks("a.pdf", [{"id": i, "text": t} for i, t in enumerate(texts)])
+    assert [c["text"] for c in remaining] == texts[4:]
+    assert loader.upsert(remaining, vectors_for(remaining), "a.pdf") == 2
+    assert journal.committed == {"a.pdf": 6}
+    journal.close()
@@ -0,0 +1,51 @@
+"""Chunk rows in SQLite and hydration of search hits (chunk_store)."""
+from conftest import ingest, vectors_for
+from chunk_store import ChunkStore
+
+
+def row(vector_id, source="a.pdf", text="some text"):
+    return {"vector_id": vector_id, "source": source, "chunk_id": vector_id,
+            "section": "Skills", "page": 3, "text": text}
+
+
+def test_rows_round_trip_in_batched_lookups(tmp_path, monkeypatch):
+    import chunk_store
+
+    monkeypatch.setattr(chunk_store, "_LOOKUP_BATCH", 2)
+    store = ChunkStore(str(tmp_path / "chunks.sqlite3"))
+    store.put_many([row(f"v{i}", text=f"text {i} é") for i in range(5)])
+    store.put_many([row("v0", text="replaced")])
+
+    found = store.get_many(["v4", "v0", "missing", "v0", "v2"])
+    assert sorted(found) == ["v0", "v2", "v4"]
+    assert found["v0"]["text"] == "replaced"
+    assert found["v4"] == {"text": "text 4 é", "source": "a.pdf", "chunk_id": "v4",
+                           "section": "Skills", "page": 3}
+
+    store.put_many([row("b0", source="b.pdf")])
+    assert sorted(store.delete_source("a.pdf")) == [f"v{i}" for i in range(5)]
+    assert len(store) == 1
+    store.close()
+
+
+def test_text_stays_local_and_hits_are_hydrated(endee):
+    from search import _retrieve
+
+    ingest("a.pdf", b"a", ["alpha text", "beta text"])
+    query = vectors_for([{"text": "alpha text"}])[0]
+
+    raw = endee().query(vector=query, top_k=1)
+    assert "text" not in raw[0].get("meta", {})
+    (hit,) = _retrieve("alpha text", query, 1, rerank_candidates=0)
+    assert (hit["text"], hit["source"], hit["page"]) == ("alpha text", "a.pdf", 1)
+
+
+def test_without_chunk_store_text_is_kept_in_metadata(endee, monkeypatch):
+    import chunk_store
+    from search import _retrieve
+
+    monkeypatch.setattr(chunk_store, "CHUNK_STORE", False)
+    ingest("a.pdf", b"a", ["alpha text"])
+    query = vectors_for([{"text": "alpha text"}])[0]
+    assert endee().query(vector=query, top_k=1)[0]["meta"]["text"] == "alpha text"
+    assert _retrieve("alpha text", query, 1, rerank_candidates=0)[0]["text"] == "alpha text"
@@ -0,0 +1,46 @@
+"""Section detection, page tracking and streaming of utils.iter_chunks."""
+from utils import chunk_text, iter_chunks
+
+PAGES = [
+    (1, "Jane Doe\njane@example.com\n\nSKILLS\nPython and Rust. Vector search."),
+    (2, "EXPERIENCE\nBuilt an index. Tuned HNSW.\n\nSKILLS\nPython and Rust. Vector search."),
+]
+
+
+def test_chunks_carry_section_and_page_and_repeats_are_dropped():
+    assert list(iter_chunks(PAGES)) == [
+        {"id": "chunk_0", "text": "[Contact] Jane Doe\njane@example.com",
+         "section": "Contact", "page": 1},
+        {"id": "chunk_1", "text": "[Skills] Python and Rust. Vector search.",
+         "section": "Skills", "page": 1},
+        {"id": "chunk_2", "text": "[Experience] Built an index. Tuned HNSW.",
+         "section": "Experience", "page": 2},
+    ]
+
+
+def test_chunk_text_matches_streamed_pages():
+    text = "\n\n".join(page for _, page in PAGES)
+    assert [(c["id"], c["text"]) for c in chunk_text(text)] == [
+        (c["id"], c["text"]) for c in iter_chunks(PAGES)
+    ]
+    assert chunk_text("  \n ") == []
+
+
+def test_chunks_are_yielded_before_later_pages_are_read():
+    read = []
+
+    def pages():
+        for number in range(1, 101):
+            read.append(number)
+            yield number, f"SKILLS\nSkill number {number}."
+
+    first = next(iter_chunks(pages()))
+    assert first["text"] == "[Skills] Skill number 1."
+    assert len(read) <= 2
+
+
+def test_long_sections_are_split_near_chunk_size():
+    body = " ".join(f"Sentence {i} talks about vector search." for i in range(50))
+    chunks = list(iter_chunks([f"PROJECTS\n{body}"], chunk_size=200))
+    assert len(chunks) > 1
+    assert all(len(c["text"]) <= 200 + len("[Projects] ") for c in chunks)
@@ -0,0 +1,45 @@
+"""Merging, de-duplication and the token budget of pack_context."""
+from context_pack import estimate_tokens, pack_context
+
+
+def chunk(number, text, source="a.pdf", section="Skills", page=1, similarity=0.5):
+    return {"chunk_id": f"chunk_{number}", "text": f"[{section}] {text}", "source": source,
+            "section": section, "page": page, "similarity": similarity}
+
+
+def test_adjacent_chunks_merge_into_one_passage():
+    chunks = [
+        chunk(3, "Third part.", page=2, similarity=0.9),
+        chunk(7, "Elsewhere.", similarity=0.8),
+        chunk(2, "Second part.", page=1, similarity=0.7),
+        chunk(4, "Other section.", section="Education", similarity=0.6),
+        chunk(2, "Other file.", source="b.pdf", similarity=0.5),
+    ]
+    packed = pack_context(chunks, token_budget=0)
+
+    assert [p["chunk_ids"] for p in packed] == [
+        ["chunk_2", "chunk_3"], ["chunk_7"], ["chunk_4"], ["chunk_2"]
+    ]
+    first = packed[0]
+    assert first["text"] == "Second part.\nThird part."
+    assert first["page"] == 1 and first["similarity"] == 0.9
+    assert packed[2]["section"] == "Education" and packed[3]["source"] == "b.pdf"
+
+
+def test_sentences_already_given_are_dropped():
+    packed = pack_context([
+        chunk(1, "Knows Python. Led the search team."),
+        chunk(9, "knows   python. Shipped an index."),
+    ], token_budget=0)
+    assert [p["text"] for p in packed] == [
+        "Knows Python.\nLed the search team.", "Shipped an index."
+    ]
+
+
+def test_passages_stop_at_the_token_budget():
+    long_text = " ".join(f"Sentence number {i} is here." for i in range(40))
+    packed = pack_context([chunk(1, long_text), chunk(9, "Never reached.")],
+                          token_budget=100)
+    assert len(packed) == 1
+    assert 24 + estimate_tokens(packed[0]["text"]) <= 100
+    assert packed[0]["text"].startswith("Sentence number 0 is here.")
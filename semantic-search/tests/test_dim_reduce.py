@@ -0,0 +1,45 @@
+"""Truncation, PCA fitting and reducer selection (dim_reduce)."""
+import numpy as np
+import pytest
+import dim_reduce
+from dim_reduce import PCAProjection, Truncate
+
+
+def test_truncate_keeps_leading_components():
+    reducer = Truncate(2)
+    assert reducer([[1, 2, 3], [4, 5, 6]]).tolist() == [[1, 2], [4, 5]]
+    assert reducer.output_dim(3) == 2
+    with pytest.raises(ValueError):
+        Truncate(4).output_dim(3)
+
+
+def test_pca_keeps_the_main_directions_and_round_trips(tmp_path):
+    rng = np.random.default_rng(0)
+    # Nearly all variance lies in the first two of six dimensions
+    sample = rng.standard_normal((200, 6)) * [10, 5, 0.1, 0.1, 0.1, 0.1]
+    projection = PCAProjection.fit(sample, 2, model_key="model")
+    assert projection.explained_variance > 0.99
+    assert projection(sample).shape == (200, 2)
+    with pytest.raises(ValueError):
+        PCAProjection.fit(sample[:1], 2)
+
+    path = str(tmp_path / "pca.npz")
+    projection.save(path)
+    loaded = PCAProjection.load(path)
+    assert loaded.model_key == "model" and loaded.output_dim(6) == 2
+    assert np.allclose(loaded(sample[:3]), projection(sample[:3]))
+
+
+def test_pca_reducer_must_match_the_model(tmp_path, monkeypatch):
+    path = str(tmp_path / "pca.npz")
+    monkeypatch.setattr(dim_reduce, "DIM_REDUCTION", "pca")
+    monkeypatch.setattr(dim_reduce, "REDUCED_DIM", 2)
+    monkeypatch.setattr(dim_reduce, "PCA_PATH", path)
+    monkeypatch.setattr(dim_reduce, "_reducer", None)
+    with pytest.raises(RuntimeError, match="no projection"):
+        dim_reduce.get_reducer("model")
+
+    PCAProjection.fit(np.eye(4), 2, model_key="other").save(path)
+    with pytest.raises(RuntimeError, match="fitted for other"):
+        dim_reduce.get_reducer("model")
+    assert dim_reduce.get_reducer("other").output_dim(4) == 2
@@ -0,0 +1,25 @@
+"""Cache keys and reuse of ONNX exports (embed_backend), without loading a model."""
+import os
+import embed_backend
+from embed_backend import backend_model_key
+from embed_cache import model_cache_dir
+
+
+def test_each_backend_gets_its_own_cache_key():
+    assert backend_model_key("org/model", "torch") == "org/model"
+    keys = {backend_model_key("org/model", b) for b in embed_backend.BACKENDS}
+    assert len(keys) == len(embed_backend.BACKENDS)
+    assert len({model_cache_dir("cache", key) for key in keys}) == len(keys)
+
+
+def test_existing_exports_are_reused(tmp_path, monkeypatch):
+    monkeypatch.setattr(embed_backend, "ONNX_EXPORT_DIR", str(tmp_path))
+    monkeypatch.setattr(embed_backend, "ONNX_QUANT_CONFIG", "avx2")
+    export_dir = model_cache_dir(str(tmp_path), "org/model")
+    os.makedirs(os.path.join(export_dir, "onnx"))
+    for name in ("model.onnx", "model_qint8_avx2.onnx"):
+        open(os.path.join(export_dir, "onnx", name), "wb").close()
+
+    # Neither call needs sentence-transformers once the files exist
+    assert embed_backend._onnx_export_dir("org/model") == export_dir
+    assert embed_backend._quantized_file(export_dir) == "onnx/model_qint8_avx2.onnx"
@@ -0,0 +1,94 @@
+"""Slot reuse, LRU eviction and persistence of EmbeddingCache."""
+import numpy as np
+import embed_cache
+from embed_cache import EmbeddingCache
+
+DIM = 4
+
+
+def vec(value):
+    return np.full(DIM, value, dtype=np.float32)
+
+
+def test_round_trip_and_reload(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), DIM, max_entries=100)
+    cache.put_many(["a", "b"], [vec(1), vec(2)])
+    assert cache.get_many(["a", "missing"])[1] is None
+
+    reloaded = EmbeddingCache(str(tmp_path), DIM, max_entries=100)
+    a, b = reloaded.get_many(["a", "b"])
+    assert np.array_equal(a, vec(1)) and np.array_equal(b, vec(2))
+
+
+def test_deleted_slots_are_reused(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), DIM, max_entries=0)
+    cache.put_many(["a", "b", "c"], [vec(1), vec(2), vec(3)])
+    capacity = cache.stats()["capacity"]
+    cache.delete_many(["b"])
+    cache.put_many(["d"], [vec(4)])
+    assert cache.stats()["capacity"] == capacity
+    assert len({slot for slot, _ in cache._entries.values()}) == 3
+
+    reloaded = EmbeddingCache(str(tmp_path), DIM, max_entries=0)
+    assert sorted(reloaded.keys()) == ["a", "c", "d"]
+    assert np.array_equal(reloaded.get_many(["d"])[0], vec(4))
+
+
+def test_full_cache_evicts_least_recently_used(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), DIM, max_entries=10)
+    for i in range(10):
+        cache.put_many([f"k{i}"], [vec(i)])
+    cache.get_many(["k0"])  # k0 is now the most recently used
+    cache.put_many(["new"], [vec(99)])
+
+    assert "k1" not in cache and "k0" in cache and "new" in cache
+    assert cache.stats()["capacity"] == 10
+    reloaded = EmbeddingCache(str(tmp_path), DIM, max_entries=10)
+    assert "k1" not in reloaded
+    assert np.array_equal(reloaded.get_many(["new"])[0], vec(99))
+    assert np.array_equal(reloaded.get_many(["k0"])[0], vec(0))
+
+
+def test_log_is_compacted_and_survives_a_torn_line(tmp_path, monkeypatch):
+    monkeypatch.setattr(embed_cache, "_MIN_COMPACT_RECORDS", 5)
+    cache = EmbeddingCache(str(tmp_path), DIM, max_entries=0)
+    for _ in range(3):
+        for i in range(20):
+            cache.put_many([f"k{i}"], [vec(i)])
+    # 60 records for 20 entries: the log was folded into index.json along the way
+    assert cache._log_records <= 20
+    with open(tmp_path / "index.log", "a", encoding="utf-8") as f:
+        f.write('["p","torn",0')
+
+    reloaded = EmbeddingCache(str(tmp_path), DIM, max_entries=0)
+    assert len(reloaded) == 20 and "torn" not in reloaded
+    reloaded.put_many(["after"], [vec(7)])
+    assert "after" in EmbeddingCache(str(tmp_path), DIM, max_entries=0)
+
+
+def test_other_dimension_starts_over(tmp_path):
+    EmbeddingCache(str(tmp_path), DIM).put_many(["a"], [vec(1)])
+    assert len(EmbeddingCache(str(tmp_path), DIM * 2)) == 0
+
+
+def test_instances_see_each_others_writes(tmp_path, monkeypatch):
+    # Two instances on one directory behave like two processes sharing it
+    monkeypatch.setattr(embed_cache, "_MIN_COMPACT_RECORDS", 5)
+    writer = EmbeddingCache(str(tmp_path), DIM, max_entries=0)
+    reader = EmbeddingCache(str(tmp_path), DIM, max_entries=0)
+
+    writer.put_many(["a", "b"], [vec(1), vec(2)])
+    assert np.array_equal(reader.get_many(["a"])[0], vec(1))
+    writer.delete_many(["a"])
+    assert "a" not in reader
+
+    # Growing the vectors file and compacting the log elsewhere
+    for i in range(3000):
+        writer.put_many([f"k{i}"], [vec(i)])
+    assert np.array_equal(reader.get_many(["k2999"])[0], vec(2999))
+    assert len(reader) == 3001
+
+    # Slots the reader takes do not clobber the writer's rows
+    reader.put_many(["from-reader"], [vec(-1)])
+    assert np.array_equal(writer.get_many(["from-reader"])[0], vec(-1))
+    assert np.array_equal(writer.get_many(["b"])[0], vec(2))
@@ -0,0 +1,36 @@
+"""Worker start-up of the embedding pool (without loading a model)."""
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import pytest
+import embed_pool
+
+
+def _spawn_pool(workers, initializer=None):
+    return ProcessPoolExecutor(max_workers=workers,
+                               mp_context=multiprocessing.get_context("spawn"),
+                               initializer=initializer)
+
+
+def test_every_worker_is_started(monkeypatch):
+    monkeypatch.setattr(embed_pool, "EMBED_WORKERS", 3)
+    pool = _spawn_pool(3)
+    try:
+        embed_pool._start_workers(pool)
+        # All three processes are up: three concurrent tasks land on three pids
+        with multiprocessing.get_context("spawn").Manager() as manager:
+            barrier = manager.Barrier(3, timeout=30)
+            pids = set(pool.map(embed_pool._ping, [barrier] * 3))
+        assert len(pids) == 3 and os.getpid() not in pids
+    finally:
+        pool.shutdown()
+
+
+def test_worker_that_fails_to_load_breaks_start_up(monkeypatch):
+    monkeypatch.setattr(embed_pool, "EMBED_WORKERS", 2)
+    monkeypatch.setattr(embed_pool, "EMBED_POOL_START_TIMEOUT", 30)
+    pool = _spawn_pool(2, initializer=sys.exit)
+    with pytest.raises(BrokenProcessPool):
+        embed_pool._start_workers(pool)
@@ -0,0 +1,128 @@
+"""Incremental re-ingest against the manifest (indexer + manifest)."""
+import pytest
+from conftest import ingest, vectors_for
+
+
+def test_unchanged_file_is_skipped(endee):
+    from indexer import check_file, indexed_sources
+    from pipeline import SkipFile
+
+    ingest("a.pdf", b"v1", ["alpha text", "beta text"])
+    assert indexed_sources() == ["a.pdf"]
+    with pytest.raises(SkipFile):
+        check_file("a.pdf", b"v1")
+
+
+def test_changed_file_embeds_only_new_chunks_and_deletes_removed(endee):
+    from chunk_store import get_chunk_store
+    from indexer import get_manifest
+
+    first = ingest("a.pdf", b"v1", ["alpha text", "beta text", "gamma text"])
+    assert len(first) == 3
+    assert len(endee()) == 3
+    gamma_id = get_manifest().chunk_vectors("a.pdf")[first[2]["hash"]]
+
+    second = ingest("a.pdf", b"v2", ["alpha text", "beta text", "delta text"])
+    assert [c["text"] for c in second] == ["delta text"]
+    assert len(endee()) == 3
+
+    stored = get_manifest().chunk_vectors("a.pdf")
+    assert len(stored) == 3
+    assert gamma_id not in stored.values()
+    assert get_chunk_store().get_many([gamma_id]) == {}
+    hits = endee().query(vector=vectors_for([{"text": "gamma text"}])[0], top_k=3)
+    assert gamma_id not in {hit["id"] for hit in hits}
+
+
+def test_unchanged_chunks_keep_their_vector_ids(endee):
+    from indexer import get_manifest
+
+    ingest("a.pdf", b"v1", ["alpha text", "beta text"])
+    before = get_manifest().chunk_vectors("a.pdf")
+    ingest("a.pdf", b"v2", ["beta text", "alpha text"])
+    assert get_manifest().chunk_vectors("a.pdf") == before
+
+
+def test_interrupted_file_resumes_from_committed_batches(endee):
+    from indexer import check_file, get_manifest, plan_chunks, upsert_chunks
+
+    texts = ["one text", "two text", "three text", "four text"]
+    chunks = [{"id": i, "text": t} for i, t in enumerate(texts)]
+    check_file("a.pdf", b"v1")
+    planned = plan_chunks("a.pdf", chunks)
+    # Only the first batch is stored before the crash; finish_file never runs
+    upsert_chunks(planned[:2], vectors_for(planned[:2]), "a.pdf")
+    assert get_manifest().file_hash("a.pdf") is None
+
+    check_file("a.pdf", b"v1")
+    replanned = plan_chunks("a.pdf", [{"id": i, "text": t} for i, t in enumerate(texts)])
+    assert [c["text"] for c in replanned] == ["three text", "four text"]
+
+
+def test_first_manifest_ingest_replaces_pre_manifest_vectors(endee):
+    from chunk_store import get_chunk_store
+
+    # Stored by a version without the manifest: position-based IDs
+    legacy = [{"id": "chunk_0", "text": "alpha text"}, {"id": "chunk_1", "text": "old text"}]
+    endee().upsert([
+        {"id": f"a.pdf_{c['id']}", "vector": v, "meta": {"chunk_id": c["id"]},
+         "filter": {"source": "a.pdf"}}
+        for c, v in zip(legacy, vectors_for(legacy))
+    ])
+    get_chunk_store().put_many([
+        {"vector_id": f"a.pdf_{c['id']}", "source": "a.pdf", "chunk_id": c["id"], "text": c["text"]}
+        for c in legacy
+    ])
+    ingest("b.pdf", b"b", ["other text"])
+
+    ingest("a.pdf", b"v1", ["alpha text", "beta text"])
+    assert len(endee()) == 3
+    assert get_chunk_store().get_many(["a.pdf_chunk_0", "a.pdf_chunk_1"]) == {}
+
+
+def test_moved_chunks_get_their_new_position(endee):
+    from chunk_store import get_chunk_store
+    from indexer import check_file, finish_file, get_manifest, plan_chunks, upsert_chunks
+    from pipeline import SkipFile
+
+    def ingest_pages(data, pages):
+        check_file("a.pdf", data)
+        chunks = [{"id": i, "text": text, "section": "General", "page": page}
+                  for i, (text, page) in enumerate(pages)]
+        try:
+            planned = plan_chunks("a.pdf", chunks)
+        except SkipFile:
+            return
+        upsert_chunks(planned, vectors_for(planned), "a.pdf")
+        finish_file("a.pdf")
+
+    ingest_pages(b"v1", [("alpha text", 1), ("beta text", 1)])
+    # A new page in front: alpha and beta move without changing
+    ingest_pages(b"v2", [("preface text", 1), ("alpha text", 2), ("beta text", 2)])
+
+    vector_ids = get_manifest().chunk_vectors("a.pdf")
+    rows = get_chunk_store().get_many(vector_ids.values())
+    assert sorted((row["chunk_id"], row["page"], row["text"]) for row in rows.values()) == [
+        ("0", 1, "preface text"), ("1", 2, "alpha text"), ("2", 2, "beta text")
+    ]
+    hits = endee().query(vector=vectors_for([{"text": "beta text"}])[0], top_k=3,
+                         filter=[{"page": {"$range": [2, 2]}}])
+    assert {hit["id"] for hit in hits} == {
+        vid for vid, row in rows.items() if row["page"] == 2
+    }
+
+
+def test_without_chunk_store_moved_chunks_are_upserted_again(endee, monkeypatch):
+    import chunk_store
+    from indexer import check_file, plan_chunks
+
+    monkeypatch.setattr(chunk_store, "CHUNK_STORE", False)
+    ingest("a.pdf", b"v1", ["alpha text", "beta text"])
+    check_file("a.pdf", b"v2")
+    planned = plan_chunks("a.pdf", [{"id": 0, "text": "preface text"},
+                                    {"id": 1, "text": "alpha text"},
+                                    {"id": 2, "text": "beta text"}])
+    # The chunk number lives in vector metadata, so all three are upserted
+    assert sorted((c["id"], c["text"]) for c in planned) == [
+        (0, "preface text"), (1, "alpha text"), (2, "beta text")
+    ]
@@ -0,0 +1,54 @@
+"""Stage spans, traces and Prometheus output of metrics.py."""
+import pytest
+import metrics
+from metrics import Histogram, count, render_prometheus, span, trace
+
+
+def stage_row(stage):
+    return next(row for row in metrics.snapshot() if row["stage"] == stage)
+
+
+def test_spans_count_calls_and_errors():
+    with span("test.ok"):
+        pass
+    with pytest.raises(ValueError):
+        with span("test.ok"):
+            raise ValueError("boom")
+    row = stage_row("test.ok")
+    assert row["calls"] == 2 and row["errors"] == 1
+
+
+def test_trace_keeps_a_timeline_of_nested_spans():
+    with trace("test.request"):
+        with span("test.embed"):
+            pass
+        with trace("test.nested"):  # folded into the outer trace
+            with span("test.search"):
+                pass
+    latest = metrics.recent_traces()[0]
+    assert latest["name"] == "test.request"
+    assert [s["stage"] for s in latest["spans"]] == ["test.embed", "test.search"]
+    with span("test.untraced"):
+        pass
+    assert metrics.recent_traces()[0] is latest and len(latest["spans"]) == 2
+
+
+def test_histogram_buckets_and_quantiles():
+    hist = Histogram(buckets=(0.01, 0.1), window=3)
+    for seconds in (0.005, 0.05, 0.5, 0.05):
+        hist.observe(seconds)
+    assert hist.counts == [1, 2, 1] and hist.count == 4
+    assert hist.quantiles(50) == [0.05]  # the window holds the last three
+
+
+def test_prometheus_text_has_cumulative_buckets_and_counters():
+    metrics.observe("test.prom", 0.003)
+    metrics.observe("test.prom", 0.2)
+    count("test_lookups", result="hit")
+    count("test_lookups", 2, result="hit")
+    text = render_prometheus(include_server=False)
+
+    assert 'semantic_search_stage_seconds_bucket{stage="test.prom",le="0.005"} 1' in text
+    assert 'semantic_search_stage_seconds_bucket{stage="test.prom",le="0.25"} 2' in text
+    assert 'semantic_search_stage_seconds_count{stage="test.prom"} 2' in text
+    assert 'semantic_search_test_lookups_total{result="hit"} 3' in text
@@ -0,0 +1,63 @@
+"""Corpus-wide near-duplicate linking (NEAR_DUP=link)."""
+import pytest
+from conftest import ingest, vectors_for
+
+BOILERPLATE = " ".join(
+    f"clause {i} of the standard terms applies to every order placed with the supplier"
+    for i in range(12)
+)
+
+
+def test_similarity_of_near_duplicates():
+    from near_dup import MinHasher, similarity
+
+    hasher = MinHasher()
+    edited = BOILERPLATE.replace("clause 7 ", "section 7 ")
+    assert similarity(hasher.signature(BOILERPLATE), hasher.signature(edited)) >= 0.85
+    other = "an entirely different paragraph about embedding models and vector indexes"
+    assert similarity(hasher.signature(BOILERPLATE), hasher.signature(other)) < 0.5
+
+
+def test_near_duplicate_is_linked_instead_of_embedded(endee):
+    from indexer import get_manifest, indexed_sources
+    from near_dup import get_near_dup_index
+
+    ingest("a.pdf", b"a", [BOILERPLATE])
+    assert ingest("b.pdf", b"b", [BOILERPLATE.replace("clause 7 ", "section 7 ")]) == []
+
+    assert len(endee()) == 1
+    assert indexed_sources() == ["a.pdf", "b.pdf"]
+    (vector_id,) = get_manifest().chunk_vectors("a.pdf").values()
+    assert list(get_manifest().chunk_vectors("b.pdf").values()) == [vector_id]
+    assert get_near_dup_index().linked_sources([vector_id]) == {vector_id: ["b.pdf"]}
+
+
+def test_deleting_the_target_re_embeds_linked_files(endee):
+    from indexer import check_file, get_manifest
+
+    ingest("a.pdf", b"a", [BOILERPLATE])
+    ingest("b.pdf", b"b", [BOILERPLATE.replace("clause 7 ", "section 7 ")])
+
+    # a.pdf drops the shared text: b.pdf's link is orphaned
+    ingest("a.pdf", b"a2", ["a short replacement page"])
+    assert get_manifest().chunk_vectors("b.pdf") == {}
+    check_file("b.pdf", b"b")  # no longer skipped as unchanged
+    embedded = ingest("b.pdf", b"b", [BOILERPLATE.replace("clause 7 ", "section 7 ")])
+    assert len(embedded) == 1
+    assert len(endee()) == 2
+
+
+def test_chunks_are_link_targets_only_once_upserted(endee):
+    from indexer import check_file, plan_chunks, upsert_chunks
+    from pipeline import SkipFile
+
+    check_file("a.pdf", b"a")
+    planned = plan_chunks("a.pdf", [{"id": 0, "text": BOILERPLATE}])
+    # a.pdf's upsert has not happened (or failed): nothing to link to yet
+    check_file("b.pdf", b"b")
+    assert len(plan_chunks("b.pdf", [{"id": 0, "text": BOILERPLATE + " extra"}])) == 1
+
+    upsert_chunks(planned, vectors_for(planned), "a.pdf")
+    check_file("c.pdf", b"c")
+    with pytest.raises(SkipFile, match="linked to near-duplicates"):
+        plan_chunks("c.pdf", [{"id": 0, "text": BOILERPLATE + " more"}])
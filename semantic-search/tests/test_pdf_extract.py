@@ -0,0 +1,41 @@
+"""Stuck-worker backstop of the parallel PDF extraction (pdf_extract.py)."""
+import os
+import time
+
+
+def fake_extract_range(path, start, stop, timeout):
+    """Stands in for pdf_extract._extract_range; the first range hangs."""
+    if start == 0:
+        with open(path, "w") as f:
+            f.write(str(os.getpid()))
+        time.sleep(3600)
+    return [(n + 1, f"page {n + 1}") for n in range(start, stop)]
+
+
+def test_stuck_range_is_skipped_and_its_worker_killed(tmp_path, monkeypatch):
+    import pdf_extract
+
+    monkeypatch.setattr(pdf_extract, "_extract_range", fake_extract_range)
+    monkeypatch.setattr(pdf_extract, "PDF_WORKERS", 2)
+    monkeypatch.setattr(pdf_extract, "_STUCK_GRACE_SECONDS", 0.5)
+    monkeypatch.setattr(pdf_extract, "_POLL_SECONDS", 0.05)
+    monkeypatch.setattr(pdf_extract, "_pool", None)
+    pid_file = str(tmp_path / "stuck.pid")
+
+    try:
+        pages = list(pdf_extract._iter_parallel(pid_file, 6, 0.1, 2))
+        assert pages == [(n, f"page {n}") for n in range(3, 7)]
+
+        with open(pid_file) as f:
+            pid = int(f.read())
+        for _ in range(50):
+            try:
+                os.kill(pid, 0)
+            except ProcessLookupError:
+                break
+            time.sleep(0.1)
+        else:
+            raise AssertionError(f"stuck worker {pid} is still running")
+    finally:
+        if pdf_extract._pool is not None:
+            pdf_extract._pool.terminate()
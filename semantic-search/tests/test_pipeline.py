@@ -0,0 +1,56 @@
+"""Per-file errors and stage failures in IngestPipeline."""
+import pytest
+from pipeline import IngestPipeline, SkipFile
+
+
+def chunk_words(text):
+    return [{"id": i, "text": word} for i, word in enumerate(text.split())]
+
+
+def embed(texts):
+    return [[float(len(t))] for t in texts]
+
+
+def test_failing_files_are_reported_and_the_rest_complete():
+    def extract(source):
+        if source == "broken":
+            raise ValueError("bad pdf")
+        if source == "skip":
+            raise SkipFile("unchanged")
+        return source
+
+    def upsert(chunks, vectors, name):
+        if name == "d":
+            raise ValueError("server said no")
+        return len(vectors)
+
+    pipeline = IngestPipeline(extract, chunk_words, embed, upsert, batch_size=2)
+    jobs = [("a", "one two three"), ("b", "broken"), ("c", "skip"), ("d", "rejected")]
+    results = {r["name"]: r for r in pipeline.run(jobs)}
+
+    assert results["a"]["status"] == "complete" and results["a"]["stored"] == 3
+    assert results["b"]["status"] == "error"
+    assert results["b"]["message"] == "Extraction failed: bad pdf"
+    assert results["c"]["status"] == "skipped"
+    assert results["d"]["status"] == "error"
+    assert results["d"]["message"] == "Upsert failed: server said no"
+
+
+def test_failed_finalize_is_an_error_not_a_completion():
+    def complete(name):
+        raise OSError("manifest is read-only")
+
+    pipeline = IngestPipeline(lambda s: s, chunk_words, embed,
+                              lambda c, v, n: len(v), complete_fn=complete)
+    (result,) = pipeline.run([("a", "one two")])
+    assert result["status"] == "error" and result["stored"] == 0
+    assert "manifest is read-only" in result["message"]
+
+
+def test_stage_crash_stops_the_run():
+    # A chunker returning None breaks the chunk stage outside its per-file handling
+    pipeline = IngestPipeline(lambda s: s, lambda text: None, embed,
+                              lambda c, v, n: len(v))
+    with pytest.raises(RuntimeError, match="stage failed") as excinfo:
+        list(pipeline.run([("a", "one"), ("b", "two")]))
+    assert isinstance(excinfo.value.__cause__, TypeError)
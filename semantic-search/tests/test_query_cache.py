@@ -0,0 +1,52 @@
+"""Normalization, TTL, LRU eviction and the disk tier of QueryCache."""
+import query_cache
+from query_cache import QueryCache, normalize_query
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_near_identical_queries_share_a_key():
+    assert normalize_query("  What is   HNSW?? ") == "what is hnsw"
+    assert normalize_query("Endee.\n") == normalize_query("endee")
+    assert normalize_query("?!") == "?!"  # nothing but punctuation is kept as is
+
+
+def test_entries_expire_after_the_ttl(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(query_cache.time, "monotonic", clock)
+    cache = QueryCache("model", ttl_seconds=60)
+    cache.put("q", [1.0])
+
+    clock.now += 60
+    assert cache.get("q") == [1.0]
+    clock.now += 1
+    assert cache.get("q") is None
+    assert cache.stats() == {"hits": 1, "disk_hits": 0, "misses": 1,
+                             "hit_rate": 0.5, "entries": 0}
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = QueryCache("model", max_entries=2)
+    cache.put("a", [1.0])
+    cache.put("b", [2.0])
+    cache.get("a")  # b is now the least recently used
+    cache.put("c", [3.0])
+    assert cache.get("b") is None
+    assert cache.get("a") == [1.0] and cache.get("c") == [3.0]
+
+
+def test_disk_tier_outlives_the_memory_tier(tmp_path):
+    cache = QueryCache("model", disk_dir=str(tmp_path), dim=2)
+    cache.put("q", [0.5, 0.25])
+
+    restarted = QueryCache("model", disk_dir=str(tmp_path), dim=2)
+    assert restarted.get("q") == [0.5, 0.25]
+    assert restarted.get("q") == [0.5, 0.25]
+    assert restarted.stats()["disk_hits"] == 1 and restarted.stats()["hits"] == 1
+    assert QueryCache("other-model", disk_dir=str(tmp_path), dim=2).get("q") is None
@@ -0,0 +1,71 @@
+"""Streaming answers and their caching (rag.stream_answer / astream_answer)."""
+import asyncio
+from types import SimpleNamespace
+import pytest
+
+PIECES = ["Endee ", "stores ", "vectors."]
+CHUNKS = [{"id": "a.pdf_0", "text": "Endee is a vector database.", "source": "a.pdf",
+           "similarity": 0.9, "chunk_id": "chunk_0"}]
+
+
+def stream_chunk(content):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content))])
+
+
+class FakeCompletions:
+    """Stands in for the Groq chat API: streams PIECES, then an empty end chunk."""
+
+    def __init__(self):
+        self.calls = []
+
+    def create(self, **kwargs):
+        self.calls.append(kwargs)
+        return iter([stream_chunk(p) for p in PIECES] + [stream_chunk(None)])
+
+
+class FakeAsyncCompletions(FakeCompletions):
+    async def create(self, **kwargs):
+        self.calls.append(kwargs)
+
+        async def stream():
+            for piece in PIECES:
+                yield stream_chunk(piece)
+        return stream()
+
+
+@pytest.fixture
+def answers(monkeypatch):
+    """Answer cache on, queries embedded to a fixed vector."""
+    import answer_cache
+    import rag
+
+    monkeypatch.setattr(answer_cache, "ANSWER_CACHE_SIZE", 16)
+    monkeypatch.setattr(answer_cache, "_cache", None)
+    monkeypatch.setattr(answer_cache, "_generation", None)
+    monkeypatch.setattr(rag, "embed_single_query", lambda query: [1.0, 0.0])
+    return rag
+
+
+def test_answer_streams_in_pieces_and_is_cached_once_complete(answers, monkeypatch):
+    completions = FakeCompletions()
+    client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    monkeypatch.setattr(answers, "get_groq_client", lambda: client)
+
+    assert list(answers.stream_answer("what is endee?", CHUNKS)) == PIECES
+    assert completions.calls[0]["stream"] is True
+    assert list(answers.stream_answer("What is Endee?", CHUNKS)) == ["".join(PIECES)]
+    assert len(completions.calls) == 1
+    assert list(answers.stream_answer("anything", [])) == [answers.NO_CHUNKS_MESSAGE]
+
+
+def test_async_stream_yields_the_same_pieces(answers, monkeypatch):
+    completions = FakeAsyncCompletions()
+    client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    monkeypatch.setattr(answers, "_get_async_groq_client", lambda: client)
+
+    async def collect():
+        return [piece async for piece in answers.astream_answer("what is endee?", CHUNKS)]
+
+    assert asyncio.run(collect()) == PIECES
+    assert asyncio.run(collect()) == ["".join(PIECES)]
+    assert len(completions.calls) == 1
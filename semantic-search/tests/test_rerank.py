@@ -0,0 +1,37 @@
+"""Ordering and the latency budget of cross-encoder re-ranking."""
+import time
+import rerank
+
+
+class LengthScorer:
+    """Stands in for the cross-encoder: longer chunk text scores higher."""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.batches = 0
+
+    def predict(self, pairs, batch_size, show_progress_bar):
+        self.batches += 1
+        time.sleep(self.delay)
+        return [len(text) for _, text in pairs]
+
+
+def candidates(n):
+    return [{"id": f"c{i}", "text": "x" * (i + 1)} for i in range(n)]
+
+
+def test_candidates_are_reordered_by_score(monkeypatch):
+    monkeypatch.setattr(rerank, "get_cross_encoder", lambda: LengthScorer())
+    results, timing = rerank.rerank("query", candidates(5), top_k=3, batch_size=2)
+    assert [r["id"] for r in results] == ["c4", "c3", "c2"]
+    assert results[0]["rerank_score"] == 5
+    assert timing["scored"] == 5 and timing["batches"] == 3 and not timing["truncated"]
+
+
+def test_budget_stops_scoring_and_keeps_search_order_for_the_rest(monkeypatch):
+    scorer = LengthScorer(delay=0.05)
+    monkeypatch.setattr(rerank, "get_cross_encoder", lambda: scorer)
+    results, timing = rerank.rerank("query", candidates(8), top_k=8,
+                                    budget_ms=60, batch_size=2)
+    assert timing["truncated"] and timing["scored"] == 2 and scorer.batches == 1
+    assert [r["id"] for r in results] == ["c1", "c0", "c2", "c3", "c4", "c5", "c6", "c7"]
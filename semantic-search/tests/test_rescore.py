@@ -0,0 +1,35 @@
+"""Index precision names and exact float32 re-scoring (rescore)."""
+import pytest
+
+
+def test_precision_names():
+    from endee import Precision
+    from session import resolve_precision
+
+    assert resolve_precision("INT8") is Precision.INT8
+    assert resolve_precision("int16d") is Precision.INT16
+    assert resolve_precision("binary") is Precision.BINARY
+    with pytest.raises(ValueError):
+        resolve_precision("float8")
+
+
+def test_hits_are_reranked_by_exact_similarity(tmp_path, monkeypatch):
+    import rescore
+
+    monkeypatch.setattr(rescore, "FULL_VECTOR_STORE", True)
+    monkeypatch.setattr(rescore, "FULL_VECTOR_DIR", str(tmp_path))
+    monkeypatch.setattr(rescore, "_store", None)
+    rescore.store_full_vectors(["near", "far"], [[1.0, 0.0], [0.0, 2.0]])
+
+    # Scores as a quantized index might return them: the order is wrong
+    hits = [{"id": "far", "similarity": 0.9}, {"id": "unknown", "similarity": 0.5},
+            {"id": "near", "similarity": 0.4}]
+    rescored = rescore.rescore([2.0, 0.2], hits, top_k=2)
+    assert [h["id"] for h in rescored] == ["near", "unknown"]
+    assert rescored[0]["similarity"] == pytest.approx(0.995, abs=1e-3)
+    assert hits[2]["similarity"] == 0.4  # the server's hits are not modified
+
+    rescore.delete_full_vectors(["near"])
+    assert [h["id"] for h in rescore.rescore([2.0, 0.2], hits, top_k=3)] == [
+        "unknown", "near", "far"
+    ]
@@ -0,0 +1,27 @@
+"""Order and failure isolation of semantic_search_batch."""
+from conftest import ingest, vectors_for
+
+
+def test_batch_results_are_in_input_order_and_failures_isolated(endee, monkeypatch):
+    import search
+
+    ingest("a.pdf", b"a", ["alpha text", "beta text", "gamma text"])
+    monkeypatch.setattr(search, "embed_queries",
+                        lambda queries: vectors_for([{"text": q} for q in queries]))
+    retrieve = search._retrieve
+
+    def fail_on_beta(query_text, *args, **kwargs):
+        if query_text == "beta text":
+            raise ConnectionError("index unreachable")
+        return retrieve(query_text, *args, **kwargs)
+
+    monkeypatch.setattr(search, "_retrieve", fail_on_beta)
+    queries = ["gamma text", "beta text", "alpha text"]
+
+    results = search.semantic_search_batch(queries, top_k=1, max_workers=3, rerank_candidates=0)
+    assert [r[0]["text"] if r else None for r in results] == ["gamma text", None, "alpha text"]
+
+    results = search.semantic_search_batch(queries, top_k=1, return_exceptions=True,
+                                           rerank_candidates=0)
+    assert isinstance(results[1], ConnectionError)
+    assert search.semantic_search_batch([]) == []
@@ -0,0 +1,30 @@
+"""build_filter expressions and filtered search against the index."""
+from conftest import ingest, vectors_for
+
+
+def test_build_filter():
+    from search import build_filter
+
+    assert build_filter() is None
+    assert build_filter(source="", section=[]) is None
+    assert build_filter(source="a.pdf", section=("Skills", "Projects"), pages=("2", 4)) == [
+        {"source": {"$eq": "a.pdf"}},
+        {"section": {"$in": ["Skills", "Projects"]}},
+        {"page": {"$range": [2, 4]}},
+    ]
+
+
+def test_filtered_search_only_returns_matching_chunks(endee):
+    from search import _retrieve, build_filter
+
+    ingest("a.pdf", b"a", ["alpha text", "gamma text"])
+    ingest("b.pdf", b"b", ["beta text", "delta text"])
+    query = vectors_for([{"text": "alpha text"}])[0]
+
+    unfiltered = _retrieve("alpha text", query, 4, rerank_candidates=0)
+    assert unfiltered[0]["text"] == "alpha text"
+    assert {r["source"] for r in unfiltered} == {"a.pdf", "b.pdf"}
+
+    results = _retrieve("alpha text", query, 4, build_filter(source=["b.pdf"]),
+                        rerank_candidates=0)
+    assert sorted(r["text"] for r in results) == ["beta text", "delta text"]
@@ -0,0 +1,57 @@
+"""Shared index handle and stale-handle retry of session.py."""
+import pytest
+from endee import NotFoundException
+
+
+def test_index_is_validated_once(endee, monkeypatch):
+    import session
+
+    client = session.get_client()
+    lists = []
+    list_indexes = client.list_indexes
+    monkeypatch.setattr(client, "list_indexes", lambda: lists.append(1) or list_indexes())
+
+    first = session.get_index()
+    assert session.get_index() is first and session.find_index() is first
+    assert len(lists) == 1
+    session.invalidate_index()
+    session.get_index()
+    assert len(lists) == 2
+
+
+def test_missing_index_is_found_only_by_get_index(endee):
+    import session
+
+    session.invalidate_index()
+    assert session.find_index() is None
+    assert session.get_index() is not None
+    assert session.find_index() is session.get_index()
+
+
+def test_stale_handle_is_revalidated_and_retried_once(endee):
+    import session
+
+    handles = []
+
+    def stale_first(index):
+        handles.append(index)
+        if len(handles) == 1:
+            raise NotFoundException("index deleted")
+        return "ok"
+
+    assert session.call_with_index(stale_first) == "ok"
+    assert len(handles) == 2
+
+    handles.clear()
+    with pytest.raises(NotFoundException):
+        session.call_with_index(stale_first, retry=False)
+
+    calls = []
+
+    def bad_request(index):
+        calls.append(index)
+        raise ValueError("rejected")
+
+    with pytest.raises(ValueError):
+        session.call_with_index(bad_request)
+    assert len(calls) == 1
@@ -0,0 +1,78 @@
+"""BM25 vocabulary statistics and reciprocal rank fusion (sparse.py)."""
+import json
+import pytest
+
+
+@pytest.fixture
+def vocab(tmp_path):
+    from sparse import Vocabulary
+
+    vocab = Vocabulary(str(tmp_path / "vocab.sqlite3"))
+    yield vocab
+    vocab.close()
+
+
+def test_reupsert_replaces_a_documents_stats(vocab):
+    vocab.encode_documents(["apple banana", "banana cherry"], ["a", "b"])
+    before = vocab.stats()
+    # A retried or re-ingested chunk must not be counted twice
+    vocab.encode_documents(["apple banana"], ["a"])
+    assert vocab.stats() == before
+    assert vocab.stats()["num_docs"] == 2
+
+    vocab.encode_documents(["cherry cherry cherry"], ["a"])
+    assert vocab.stats()["total_length"] == 5
+    indices, _ = vocab.encode_query("apple")
+    assert indices == [vocab._term_ids["apple"]]
+
+
+def test_deleted_documents_leave_the_statistics(vocab):
+    vocab.encode_documents(["apple banana", "banana cherry", "cherry"], ["a", "b", "c"])
+    _, (rare_before,) = vocab.encode_query("apple")
+    _, (common_before,) = vocab.encode_query("banana")
+    assert rare_before > common_before
+
+    vocab.remove_documents(["b", "c", "missing"])
+    assert vocab.stats()["num_docs"] == 1
+    assert vocab.stats()["total_length"] == 2
+    # banana is now in every remaining document, like apple
+    assert vocab.encode_query("banana")[1] == vocab.encode_query("apple")[1]
+
+
+def test_statistics_written_by_another_process_are_seen(tmp_path):
+    from sparse import Vocabulary
+
+    path = str(tmp_path / "vocab.sqlite3")
+    reader, writer = Vocabulary(path), Vocabulary(path)
+    assert reader.encode_query("apple") == ([], [])
+    writer.encode_documents(["apple"], ["a"])
+    assert len(reader.encode_query("apple")[0]) == 1
+    reader.close()
+    writer.close()
+
+
+def test_legacy_json_vocabulary_keeps_its_term_ids(vocab, tmp_path):
+    legacy = tmp_path / "vocab.json"
+    legacy.write_text(json.dumps({
+        "term_ids": {"apple": 0, "banana": 1},
+        "doc_freq": {"0": 1, "1": 2},
+        "num_docs": 2,
+        "total_length": 3,
+    }))
+    vocab.import_legacy(str(legacy))
+    assert vocab.encode_query("banana")[0] == [1]
+    assert vocab.encode_documents(["cherry"], ["c"])[0][0] == [2]
+    assert vocab.stats() == {"num_docs": 3, "total_length": 4, "terms": 3}
+
+
+def test_reciprocal_rank_fusion():
+    from sparse import reciprocal_rank_fusion
+
+    dense = [{"id": "a", "similarity": 0.9}, {"id": "b"}, {"id": "c"}]
+    sparse = [{"id": "c"}, {"id": "a"}]
+    fused = reciprocal_rank_fusion([dense, sparse], k=60)
+
+    assert [hit["id"] for hit in fused] == ["a", "c", "b"]
+    assert fused[0]["score"] == pytest.approx(1 / 61 + 1 / 62)
+    assert fused[0]["similarity"] == 0.9
+    assert fused[2]["score"] == pytest.approx(1 / 62)
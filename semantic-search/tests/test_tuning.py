@@ -0,0 +1,50 @@
+"""Ground truth and ef selection of the recall tuner (tuning.py)."""
+import numpy as np
+from conftest import DIM
+
+
+def test_exact_neighbors_match_brute_force(tmp_path, monkeypatch):
+    import tuning
+    from embed_cache import EmbeddingCache
+
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((500, DIM)).astype(np.float32)
+    keys = [f"v{i}" for i in range(len(vectors))]
+    store = EmbeddingCache(str(tmp_path), DIM, max_entries=0)
+    store.put_many(keys, vectors)
+    monkeypatch.setattr(tuning, "_QUERY_BLOCK", 7)  # several blocks per batch
+
+    picks = [3, 42, 499] + list(range(100, 120))
+    units = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    queries = units[picks]
+    found = tuning._exact_neighbors(store, [keys[i] for i in picks], queries, 10)
+
+    scores = queries @ units.T
+    scores[np.arange(len(picks)), picks] = -np.inf
+    expected = [[keys[j] for j in row] for row in np.argsort(-scores, axis=1)[:, :10]]
+    assert found == expected
+
+
+def test_float32_index_is_tuned_without_a_full_vector_store(endee, monkeypatch):
+    import tuning
+    from chunk_store import get_chunk_store
+
+    rng = np.random.default_rng(1)
+    vectors = rng.standard_normal((300, DIM))
+    endee().upsert([{"id": f"v{i}", "vector": v.tolist()} for i, v in enumerate(vectors)])
+    get_chunk_store().put_many([
+        {"vector_id": f"v{i}", "source": "a.pdf", "chunk_id": i, "text": "t"}
+        for i in range(len(vectors))
+    ])
+    monkeypatch.setattr(tuning, "index_dimension", lambda: DIM)
+    monkeypatch.setattr(tuning, "EF_TUNE_MIN_VECTORS", 100)
+    monkeypatch.setattr(tuning, "save_tuning", lambda data: None)
+    monkeypatch.setattr(tuning, "_tuning", None)
+
+    data = tuning.tune(num_queries=20, ks=(5, 10))
+    assert data["vector_count"] == 300
+    assert data["reference"] == f"ef={tuning._REFERENCE_EF}"
+    assert data["queries"] == 20
+    # The in-process index is exact: the smallest ef on the ladder wins
+    assert data["ef"] == {5: 16, 10: 16}
+    assert data["recall"] == {5: 1.0, 10: 1.0}
@@ -0,0 +1,49 @@
+"""Warm-up retries and readiness (warmup.py)."""
+import threading
+
+
+def test_failed_required_step_is_retried_until_ready(monkeypatch):
+    import warmup
+
+    attempts = []
+
+    def endee_comes_up_late():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise ConnectionError("connection refused")
+
+    def optional_failure():
+        raise RuntimeError("no API key")
+
+    monkeypatch.setattr(warmup, "WARMUP", True)
+    monkeypatch.setattr(warmup, "WARMUP_RETRY_SECONDS", 0.01)
+    monkeypatch.setattr(warmup, "_plan", lambda: [
+        ("endee", endee_comes_up_late, True),
+        ("llm", optional_failure, False),
+    ])
+    monkeypatch.setattr(warmup, "set_readiness_check", lambda check: None)
+    monkeypatch.setattr(warmup, "_thread", None)
+    monkeypatch.setattr(warmup, "_done", threading.Event())
+    monkeypatch.setattr(warmup, "_steps", {})
+
+    thread = warmup.start_warmup()
+    # Every step has run once; endee failed and is being retried
+    assert not warmup.wait_until_ready(timeout=5)
+    thread.join(timeout=5)
+
+    state = warmup.readiness()
+    assert state["ready"] and state["done"]
+    assert state["steps"]["endee"]["attempts"] == 3
+    assert state["steps"]["endee"]["error"] is None
+    # Optional steps are not retried
+    assert state["steps"]["llm"]["attempts"] == 1
+    assert state["steps"]["llm"]["status"] == "error"
+
+
+def test_warm_up_does_not_create_the_index(endee):
+    import session
+
+    assert session.find_index() is None
+    assert session.get_client().list_indexes() == {"indexes": []}
+    index = endee()
+    assert session.find_index() is index
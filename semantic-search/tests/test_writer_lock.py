@@ -0,0 +1,33 @@
+"""Ingest-scoped writer lock and the index generation (writer_lock.py)."""
+import pytest
+
+
+def test_one_ingest_at_a_time():
+    from writer_lock import acquire_writer_lock, require_writer
+
+    with pytest.raises(RuntimeError):
+        require_writer()
+    with acquire_writer_lock("first"):
+        require_writer()
+        with pytest.raises(RuntimeError, match="first"):
+            acquire_writer_lock("second")
+    # Released once the ingest is over
+    with acquire_writer_lock("second"):
+        pass
+
+
+def test_answers_are_dropped_when_another_process_changes_the_index(monkeypatch):
+    import answer_cache
+    from writer_lock import bump_index_generation
+
+    cache = answer_cache.AnswerCache()
+    monkeypatch.setattr(answer_cache, "ANSWER_CACHE_SIZE", 16)
+    monkeypatch.setattr(answer_cache, "_cache", cache)
+    cache.put([1.0, 0.0], ["v1"], "model", "an answer")
+
+    # This process's own changes only drop the answers they affect
+    answer_cache.invalidate_answers(["v2"])
+    assert answer_cache.get_answer_cache().get([1.0, 0.0], ["v1"], "model") == "an answer"
+
+    bump_index_generation()  # as another process's ingest does
+    assert answer_cache.get_answer_cache().get([1.0, 0.0], ["v1"], "model") is None
@@ -0,0 +1,320 @@
+"""
+Recall-targeted tuning of the HNSW search parameter ef.
+
+A sample of stored vectors is used as held-out queries, and the index
+is queried with a rising ladder of ef values until recall@k against
+their true neighbours reaches EF_TARGET_RECALL.  The smallest such ef
+per k is persisted in EF_TUNING_PATH and reused, and tuning runs again
+in the background once the vector count has grown by EF_RETUNE_GROWTH
+since the last run.
+
+The true neighbours come from the local full-precision store when it
+is kept (exact brute force over every stored vector).  A float32 index
+without one is its own reference: queries are stored vectors fetched
+with include_vectors, and their neighbours are the index's answer at
+_REFERENCE_EF, far above the ladder, which for float32 vectors is exact
+in all but rare cases.  Quantized indexes without the store are not
+tuned, since their own answers are not exact.
+
+Only ef is tuned, not top_k: top_k is how many results the caller
+wants, and the candidate depth behind it (fetch_k, from the re-scoring
+and hybrid over-fetch) is covered because ef_for() is asked for the
+k actually fetched.
+
+    python tuning.py --target 0.95 --queries 200
+"""
+import argparse
+import json
+import os
+import threading
+import time
+import numpy as np
+from dotenv import load_dotenv
+from embed import index_dimension
+from metrics import count, span
+from chunk_store import get_chunk_store
+from rescore import get_full_vector_store
+from session import ENDEE_PRECISION, INDEX_NAME, call_with_index
+
+load_dotenv()
+
+EF_AUTO_TUNE = os.getenv("EF_AUTO_TUNE", "1") == "1"
+EF_TARGET_RECALL = float(os.getenv("EF_TARGET_RECALL", "0.95"))
+EF_TUNING_PATH = os.getenv("EF_TUNING_PATH", ".cache/ef_tuning.json")
+EF_TUNE_QUERIES = int(os.getenv("EF_TUNE_QUERIES", "200"))
+# Re-tune once the index holds this many times the vectors it was tuned on
+EF_RETUNE_GROWTH = float(os.getenv("EF_RETUNE_GROWTH", "2.0"))
+# Below this many vectors the default ef is used without tuning
+EF_TUNE_MIN_VECTORS = int(os.getenv("EF_TUNE_MIN_VECTORS", "1000"))
+
+DEFAULT_EF = 128
+TUNED_KS = (5, 10, 20, 50, 100)
+EF_LADDER = (16, 24, 32, 48, 64, 96, 128, 192, 256, 384, 512, 768, 1024)
+# ef of the reference search when the index is its own ground truth
+_REFERENCE_EF = 4096
+# Results per random probe when sampling queries from the index
+_PROBE_RESULTS = 10
+# Queries per brute-force matrix product
+_QUERY_BLOCK = 256
+
+# Seconds between checks of the vector count
+_CHECK_INTERVAL = 60.0
+
+_lock = threading.Lock()
+_tuning = None
+_tuning_thread = None
+_last_check = float("-inf")
+
+
+def load_tuning(path=EF_TUNING_PATH):
+    """Persisted tuning for the current index and precision, or None."""
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if data.get("index") != INDEX_NAME or data.get("precision") != ENDEE_PRECISION:
+        return None
+    data["ef"] = {int(k): v for k, v in data.get("ef", {}).items()}
+    return data
+
+
+def save_tuning(data, path=EF_TUNING_PATH):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _exact_neighbors(store, query_keys, queries, k):
+    """Top-k stored keys per query, best first, by brute force (excluding the query itself)."""
+    queries = np.ascontiguousarray(queries, dtype=np.float32)
+    own = {key: qi for qi, key in enumerate(query_keys)}
+    best_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+    best_rows = np.full((len(queries), k), -1, dtype=np.int64)
+    all_keys = []
+    for keys, vectors in store.iter_batches():
+        offset = len(all_keys)
+        all_keys.extend(keys)
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors /= np.where(norms == 0, 1, norms)
+        rows = np.arange(offset, offset + len(keys), dtype=np.int64)
+        self_hits = [(own[key], col) for col, key in enumerate(keys) if key in own]
+        for start in range(0, len(queries), _QUERY_BLOCK):
+            block = slice(start, start + _QUERY_BLOCK)
+            scores = queries[block] @ vectors.T
+            for qi, col in self_hits:
+                if start <= qi < start + _QUERY_BLOCK:
+                    scores[qi - start, col] = -np.inf
+            merged_scores = np.hstack([best_scores[block], scores])
+            merged_rows = np.hstack([best_rows[block], np.broadcast_to(rows, scores.shape)])
+            top = np.argpartition(-merged_scores, k - 1, axis=1)[:, :k]
+            best_scores[block] = np.take_along_axis(merged_scores, top, axis=1)
+            best_rows[block] = np.take_along_axis(merged_rows, top, axis=1)
+    order = np.argsort(-best_scores, axis=1)
+    best_rows = np.take_along_axis(best_rows, order, axis=1)
+    return [[all_keys[r] for r in row if r >= 0] for row in best_rows]
+
+
+def _sample_index(num_queries, rng):
+    """Stored vectors fetched from the index with random probes: (ids, unit vectors)."""
+    dim = index_dimension()
+    ids, vectors, seen = [], [], set()
+    for _ in range(2 * -(-num_queries // _PROBE_RESULTS)):
+        probe = rng.standard_normal(dim).tolist()
+        hits = call_with_index(lambda index: index.query(
+            vector=probe, top_k=_PROBE_RESULTS, include_vectors=True
+        )) or []
+        for hit in hits:
+            if hit.get("vector") is not None and hit.get("id") not in seen:
+                seen.add(hit["id"])
+                ids.append(hit["id"])
+                vectors.append(hit["vector"])
+        if len(ids) >= num_queries:
+            break
+    return ids[:num_queries], np.asarray(vectors[:num_queries], dtype=np.float32)
+
+
+def _reference_neighbors(query_keys, queries, k):
+    """Top-k IDs per query from the index itself at _REFERENCE_EF (excluding the query)."""
+    neighbors = []
+    for query, own in zip(queries, query_keys):
+        results = call_with_index(lambda index: index.query(
+            vector=query.tolist(), top_k=k + 1, ef=_REFERENCE_EF, include_vectors=False
+        )) or []
+        neighbors.append([r.get("id") for r in results if r.get("id") != own][:k])
+    return neighbors
+
+
+def _vector_count():
+    """
+    Vectors in the index as far as tuning can tell, or None if it cannot
+    be tuned (a quantized index without the full-precision store).
+    """
+    store = get_full_vector_store(dim=index_dimension())
+    if store is not None:
+        return len(store)
+    chunk_store = get_chunk_store()
+    if ENDEE_PRECISION == "float32" and chunk_store is not None:
+        return len(chunk_store)
+    return None
+
+
+def _recall_at(queries, query_keys, truth, k, ef):
+    hits = 0
+    for query, own, expected in zip(queries, query_keys, truth):
+        results = call_with_index(lambda index: index.query(
+            vector=query.tolist(), top_k=k + 1, ef=max(ef, k + 1), include_vectors=False
+        )) or []
+        found = [r.get("id") for r in results if r.get("id") != own][:k]
+        hits += len(expected.intersection(found))
+    return hits / max(1, k * len(queries))
+
+
+def tune(target_recall=EF_TARGET_RECALL, num_queries=EF_TUNE_QUERIES, ks=TUNED_KS, seed=0):
+    """
+    Find the smallest ef reaching target_recall for each k and persist it.
+
+    Returns the tuning record, or None if there are too few stored
+    vectors to tune against, or no exact reference (see above).
+    """
+    vector_count = _vector_count()
+    if vector_count is None or vector_count < max(EF_TUNE_MIN_VECTORS, max(ks) + 1):
+        return None
+
+    rng = np.random.default_rng(seed)
+    store = get_full_vector_store(dim=index_dimension())
+    if store is not None:
+        all_keys = store.keys()
+        picks = rng.choice(len(all_keys), min(num_queries, len(all_keys)), replace=False)
+        query_keys = [all_keys[i] for i in picks]
+        queries = np.asarray(store.get_many(query_keys), dtype=np.float32)
+    else:
+        query_keys, queries = _sample_index(num_queries, rng)
+        if not query_keys:
+            return None
+    norms = np.linalg.norm(queries, axis=1, keepdims=True)
+    queries /= np.where(norms == 0, 1, norms)
+
+    with span("tuning.ef"):
+        if store is not None:
+            neighbors = _exact_neighbors(store, query_keys, queries, max(ks))
+        else:
+            neighbors = _reference_neighbors(query_keys, queries, max(ks))
+        ef_table, recall_table = {}, {}
+        for k in ks:
+            truth = [set(row[:k]) for row in neighbors]
+            chosen, achieved = EF_LADDER[-1], 0.0
+            for ef in EF_LADDER:
+                if ef < k:
+                    continue
+                achieved = _recall_at(queries, query_keys, truth, k, ef)
+                if achieved >= target_recall:
+                    chosen = ef
+                    break
+            ef_table[k] = chosen
+            recall_table[k] = round(achieved, 4)
+
+    data = {
+        "index": INDEX_NAME,
+        "precision": ENDEE_PRECISION,
+        "vector_count": vector_count,
+        "reference": "exact" if store is not None else f"ef={_REFERENCE_EF}",
+        "target_recall": target_recall,
+        "queries": len(query_keys),
+        "ef": ef_table,
+        "recall": recall_table,
+        "tuned_at": time.time(),
+    }
+    save_tuning(data)
+    count("ef_tuning_runs")
+    global _tuning
+    _tuning = data
+    return data
+
+
+def _stale(tuning, vector_count):
+    if tuning is None:
+        return True
+    return vector_count >= tuning["vector_count"] * EF_RETUNE_GROWTH
+
+
+def _retune_in_background():
+    global _tuning_thread
+    with _lock:
+        if _tuning_thread is not None and _tuning_thread.is_alive():
+            return
+
+        def run():
+            try:
+                tune()
+            except Exception:
+                # Keep serving with the previous values; try again at the next check
+                count("ef_tuning_failures")
+
+        _tuning_thread = threading.Thread(target=run, name="ef-tuning", daemon=True)
+        _tuning_thread.start()
+
+
+def _current_tuning():
+    """Cached tuning; kicks off a background re-tune when the index has grown enough."""
+    global _tuning, _last_check
+    now = time.monotonic()
+    if now - _last_check < _CHECK_INTERVAL:
+        return _tuning
+    _last_check = now
+
+    if _tuning is None:
+        _tuning = load_tuning()
+    vector_count = _vector_count()
+    if (vector_count is not None and vector_count >= EF_TUNE_MIN_VECTORS
+            and _stale(_tuning, vector_count)):
+        _retune_in_background()
+    return _tuning
+
+
+def ef_for(top_k):
+    """
+    ef to use for a query fetching top_k results.
+
+    Uses the tuned ef of the smallest tuned k >= top_k; beyond the
+    largest tuned k, ef is scaled proportionally.  Never below top_k.
+    """
+    tuning = _current_tuning() if EF_AUTO_TUNE else None
+    if not tuning or not tuning.get("ef"):
+        return max(DEFAULT_EF, top_k)
+
+    table = tuning["ef"]
+    for k in sorted(table):
+        if k >= top_k:
+            return max(table[k], top_k)
+    largest = max(table)
+    return max(int(table[largest] * top_k / largest), top_k)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tune HNSW ef for a target recall@k")
+    parser.add_argument("--target", type=float, default=EF_TARGET_RECALL)
+    parser.add_argument("--queries", type=int, default=EF_TUNE_QUERIES)
+    parser.add_argument("--ks", default=",".join(str(k) for k in TUNED_KS))
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    data = tune(args.target, args.queries, [int(k) for k in args.ks.split(",")], args.seed)
+    if data is None:
+        print(f"Nothing to tune against: need {EF_TUNE_MIN_VECTORS} stored vectors, and "
+              f"FULL_VECTOR_STORE=1 for a quantized index")
+        return
+
+    print(f"index={data['index']} vectors={data['vector_count']} "
+          f"target recall={data['target_recall']} reference={data['reference']}")
+    print(f"{'k':>5}{'ef':>7}{'recall':>9}")
+    for k in sorted(data["ef"]):
+        print(f"{k:>5}{data['ef'][k]:>7}{data['recall'][k]:>9.4f}")
+
+
+if __name__ == "__main__":
+    main()
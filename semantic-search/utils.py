@@ -1,28 +1,18 @@
+import hashlib
 import os
 import re
-from PyPDF2 import PdfReader
+from bisect import bisect_right
+from pdf_extract import iter_pages
 
 
 def extract_text_from_pdf(file_path):
     """Read a PDF file and return the full text content."""
-    reader = PdfReader(file_path)
-    pages_text = []
-    for page_num, page in enumerate(reader.pages):
-        text = page.extract_text()
-        if text and text.strip():
-            pages_text.append(text.strip())
-    return "\n\n".join(pages_text)
+    return "\n\n".join(text for _, text in iter_pages(file_path))
 
 
 def extract_text_from_uploaded(uploaded_file):
     """Handle a Streamlit UploadedFile object and extract text."""
-    reader = PdfReader(uploaded_file)
-    pages_text = []
-    for page in reader.pages:
-        text = page.extract_text()
-        if text and text.strip():
-            pages_text.append(text.strip())
-    return "\n\n".join(pages_text)
+    return "\n\n".join(text for _, text in iter_pages(uploaded_file))
 
 
 # Common section headers found in resumes, reports, etc.
@@ -36,54 +26,115 @@ _SECTION_HEADERS = [
 ]
 
 
-def _detect_sections(text):
-    """
-    Split text into labelled sections based on common document headers.
+# Labels a chunk's section can carry (usable as search filters)
+SECTION_LABELS = sorted({h.title() for h in _SECTION_HEADERS} | {"Contact"})
+
+# Precompiled patterns shared by every chunking call
+_HEADER_PATTERN = re.compile(
+    r'^(' + '|'.join(re.escape(h) for h in _SECTION_HEADERS) + r')\s*$',
+    re.IGNORECASE,
+)
+# A stripped header line is exactly one of the headers, so longer lines can skip the regex
+_MAX_HEADER_LEN = max(len(h) for h in _SECTION_HEADERS)
+_EMAIL_PATTERN = re.compile(r'[\w.+-]+@[\w-]+\.[\w.]+')
+_PHONE_PATTERN = re.compile(r'\+?\d[\d\s\-]{7,}')
+_PARAGRAPH_BREAK = re.compile(r'\n\n+')
+_SEGMENT_BREAK = re.compile(r'\n(?=•|\-\s|\d+\.)|(?<=[.!?])\s+(?=[A-Z])')
+_WHITESPACE = re.compile(r'\s+')
+
 
-    Returns a list of (section_label, section_body) tuples.  If a block
-    has no recognisable header it gets the label from the previous section,
-    or an empty string for the very first block.
+def _iter_lines(pages):
     """
-    text = re.sub(r'\n{3,}', '\n\n', text)
+    Turn an iterable of pages into (line, page_number) pairs.
 
-    # Build pattern that matches a standalone header line
-    header_pat = re.compile(
-        r'^(' + '|'.join(re.escape(h) for h in _SECTION_HEADERS) + r')\s*$',
-        re.IGNORECASE | re.MULTILINE,
-    )
+    Pages may be plain strings or (page_number, text) tuples.  Pages are
+    separated by a blank line, as in extract_text_from_pdf(), and runs of
+    blank lines are collapsed to one.
+    """
+    previous_blank = False
+    for n, page in enumerate(pages, 1):
+        page_number, text = page if isinstance(page, tuple) else (n, page)
+        if n > 1:
+            if not previous_blank:
+                yield "", page_number
+            previous_blank = True
+        for line in text.split('\n'):
+            if not line:
+                if previous_blank:
+                    continue
+                previous_blank = True
+            else:
+                previous_blank = False
+            yield line, page_number
+
+
+class _SectionBody:
+    """A section's text plus a map from character offsets to page numbers."""
+
+    def __init__(self, lines):
+        joined = '\n'.join(line for line, _ in lines)
+        lead = len(joined) - len(joined.lstrip())
+        self.text = joined.strip()
+        self._starts = []
+        self._pages = []
+        offset = -lead
+        for line, page in lines:
+            # Only page changes need recording
+            if not self._pages or self._pages[-1] != page:
+                self._starts.append(offset)
+                self._pages.append(page)
+            offset += len(line) + 1
+
+    def page_at(self, offset):
+        if not self._pages:
+            return None
+        return self._pages[max(0, bisect_right(self._starts, offset) - 1)]
+
+
+def _iter_sections(lines):
+    """
+    Split a stream of (line, page) pairs into labelled sections.
 
-    sections = []
+    Yields (section_label, _SectionBody) as soon as each section ends.  If
+    a block has no recognisable header it gets the label from the previous
+    section, or an empty string for the very first block.
+    """
     current_label = ""
     current_lines = []
+    first = True
 
-    for line in text.split('\n'):
+    for line, page in lines:
         stripped = line.strip()
-        m = header_pat.match(stripped)
+        m = len(stripped) <= _MAX_HEADER_LEN and _HEADER_PATTERN.match(stripped)
         if m:
             # Flush accumulated lines under the previous label
-            body = '\n'.join(current_lines).strip()
-            if body:
-                sections.append((current_label, body))
+            body = _SectionBody(current_lines)
+            if body.text:
+                yield (_label_first_section(current_label, body.text) if first
+                       else current_label), body
+                first = False
             current_label = m.group(1).strip().title()
             current_lines = []
         else:
-            current_lines.append(line)
+            current_lines.append((line, page))
 
     # Flush last section
-    body = '\n'.join(current_lines).strip()
-    if body:
-        sections.append((current_label, body))
+    body = _SectionBody(current_lines)
+    if body.text:
+        yield (_label_first_section(current_label, body.text) if first
+               else current_label), body
 
-    # Auto-label the first unlabeled block as "Contact" if it looks like
-    # contact information (has email, phone, or @ patterns)
-    if sections and not sections[0][0]:
-        first_body = sections[0][1]
-        has_email = bool(re.search(r'[\w.+-]+@[\w-]+\.[\w.]+', first_body))
-        has_phone = bool(re.search(r'\+?\d[\d\s\-]{7,}', first_body))
-        if has_email or has_phone:
-            sections[0] = ("Contact", first_body)
 
-    return sections
+def _label_first_section(label, body):
+    """
+    Auto-label the first unlabeled block as "Contact" if it looks like
+    contact information (has email, phone, or @ patterns).
+    """
+    if label:
+        return label
+    if _EMAIL_PATTERN.search(body) or _PHONE_PATTERN.search(body):
+        return "Contact"
+    return label
 
 
 def _split_into_segments(text_block):
@@ -91,7 +142,7 @@ def _split_into_segments(text_block):
     Break a text block into smaller segments on paragraph breaks,
     bullet points, or sentence boundaries when paragraphs are long.
     """
-    paragraphs = re.split(r'\n\n+', text_block)
+    paragraphs = _PARAGRAPH_BREAK.split(text_block)
 
     segments = []
     for para in paragraphs:
@@ -103,7 +154,7 @@ def _split_into_segments(text_block):
             segments.append(para)
         else:
             # Split on bullets, numbered items, or sentence endings
-            parts = re.split(r'\n(?=•|\-\s|\d+\.)|(?<=[.!?])\s+(?=[A-Z])', para)
+            parts = _SEGMENT_BREAK.split(para)
             for part in parts:
                 part = part.strip()
                 if part:
@@ -114,104 +165,130 @@ def _split_into_segments(text_block):
 
 def _normalize_for_dedup(text):
     """Collapse whitespace so near-duplicate chunks can be caught."""
-    return re.sub(r'\s+', ' ', text).strip().lower()
+    return _WHITESPACE.sub(' ', text).strip().lower()
 
 
-def chunk_text(text, chunk_size=400, overlap=0):
-    """
-    Split document text into context-rich, deduplicated chunks.
+def _dedup_digest(text):
+    """Fixed-size fingerprint of the normalized chunk text."""
+    return hashlib.blake2b(_normalize_for_dedup(text).encode('utf-8'), digest_size=16).digest()
 
-    Detects document sections (e.g. Skills, Projects, Education) and
-    prepends the section label to each chunk so the embedding model
-    captures the semantic role of the content—not just the words.
-    Overlap is set to 0 by default to avoid near-duplicate vectors.
-    """
-    if not text or not text.strip():
-        return []
 
-    sections = _detect_sections(text)
-    if not sections:
-        return []
+def _section_parts(body, chunk_size, overlap):
+    """Yield the list of segments that makes up each chunk of one section."""
+    segments = _split_into_segments(body)
+
+    current_parts = []
+    current_len = 0
+
+    for seg in segments:
+        seg_len = len(seg)
 
-    chunks = []
-    seen_normalized = set()
+        # If a single segment exceeds chunk_size, break it by lines
+        if seg_len > chunk_size:
+            # Flush first
+            if current_parts:
+                yield current_parts
+                current_parts, current_len = [], 0
 
-    for label, body in sections:
-        segments = _split_into_segments(body)
-        if not segments:
+            sub_parts, sub_len = [], 0
+            for line in seg.split('\n'):
+                line = line.strip()
+                if not line:
+                    continue
+                if sub_len + len(line) > chunk_size and sub_parts:
+                    yield sub_parts
+                    sub_parts, sub_len = [], 0
+                sub_parts.append(line)
+                sub_len += len(line) + 1
+
+            if sub_parts:
+                current_parts, current_len = sub_parts, sub_len
             continue
 
-        current_parts = []
-        current_len = 0
-
-        for seg in segments:
-            seg_len = len(seg)
-
-            # If a single segment exceeds chunk_size, break it by lines
-            if seg_len > chunk_size:
-                # Flush first
-                if current_parts:
-                    _flush_chunk(chunks, seen_normalized, current_parts, label)
-                    current_parts, current_len = [], 0
-
-                sub_parts, sub_len = [], 0
-                for line in seg.split('\n'):
-                    line = line.strip()
-                    if not line:
-                        continue
-                    if sub_len + len(line) > chunk_size and sub_parts:
-                        _flush_chunk(chunks, seen_normalized, sub_parts, label)
-                        sub_parts, sub_len = [], 0
-                    sub_parts.append(line)
-                    sub_len += len(line) + 1
-
-                if sub_parts:
-                    current_parts, current_len = sub_parts, sub_len
+        # Would adding this segment exceed the limit?
+        if current_len + seg_len > chunk_size and current_parts:
+            yield current_parts
+
+            # Optional overlap: carry the last segment for continuity
+            if overlap > 0 and len(current_parts) >= overlap:
+                carry = current_parts[-overlap:]
+                current_parts = list(carry)
+                current_len = sum(len(s) for s in carry) + len(carry) - 1
+            else:
+                current_parts, current_len = [], 0
+
+        current_parts.append(seg)
+        current_len += seg_len + 1
+
+    # Flush whatever remains in this section
+    if current_parts:
+        yield current_parts
+
+
+def iter_chunks(pages, chunk_size=400, overlap=0):
+    """
+    Streaming version of chunk_text().
+
+    Consumes an iterable of pages (strings or (page_number, text) tuples,
+    e.g. straight from pdf_extract.iter_pages) and yields chunks as soon
+    as each section is complete.  A section is buffered until its end,
+    so a document without section headers is held whole.
+    Chunks carry the same ids, text and dedup behaviour as chunk_text(),
+    plus the section label and the page the chunk starts on.
+    """
+    seen_digests = set()
+    count = 0
+
+    for label, body in _iter_sections(_iter_lines(pages)):
+        cursor = 0
+        for parts in _section_parts(body.text, chunk_size, overlap):
+            text = _format_chunk(parts, label)
+            if text is None:
                 continue
 
-            # Would adding this segment exceed the limit?
-            if current_len + seg_len > chunk_size and current_parts:
-                _flush_chunk(chunks, seen_normalized, current_parts, label)
+            digest = _dedup_digest(text)
+            if digest in seen_digests:
+                continue
+            seen_digests.add(digest)
 
-                # Optional overlap: carry the last segment for continuity
-                if overlap > 0 and len(current_parts) >= overlap:
-                    carry = current_parts[-overlap:]
-                    current_parts = list(carry)
-                    current_len = sum(len(s) for s in carry) + len(carry) - 1
-                else:
-                    current_parts, current_len = [], 0
+            offset = body.text.find(parts[0], cursor)
+            if offset >= 0:
+                cursor = offset
+            yield {
+                "id": f"chunk_{count}",
+                "text": text,
+                "section": label,
+                "page": body.page_at(cursor),
+            }
+            count += 1
 
-            current_parts.append(seg)
-            current_len += seg_len + 1
 
-        # Flush whatever remains in this section
-        if current_parts:
-            _flush_chunk(chunks, seen_normalized, current_parts, label)
+def chunk_text(text, chunk_size=400, overlap=0):
+    """
+    Split document text into context-rich, deduplicated chunks.
 
-    return chunks
+    Detects document sections (e.g. Skills, Projects, Education) and
+    prepends the section label to each chunk so the embedding model
+    captures the semantic role of the content—not just the words.
+    Overlap is set to 0 by default to avoid near-duplicate vectors.
+    """
+    if not text or not text.strip():
+        return []
+    return list(iter_chunks([text], chunk_size=chunk_size, overlap=overlap))
 
 
-def _flush_chunk(chunks, seen_normalized, parts, section_label):
+def _format_chunk(parts, section_label):
     """
-    Join parts, prepend the section label, and append to chunks
-    if the resulting text is not a duplicate.
+    Join parts and prepend the section label; None if the chunk is empty.
     """
     body = "\n".join(parts).strip()
     if not body:
-        return
+        return None
 
     # Prepend section label for embedding context
     if section_label:
-        text = f"[{section_label}] {body}"
-    else:
-        text = body
-
-    norm = _normalize_for_dedup(text)
-    if norm in seen_normalized:
-        return
-
-    seen_normalized.add(norm)
-    chunks.append({"id": f"chunk_{len(chunks)}", "text": text})
+        return f"[{section_label}] {body}"
+    return body
 
 
 def save_uploaded_pdf(uploaded_file, save_dir="data"):
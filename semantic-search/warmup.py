@@ -0,0 +1,135 @@
+"""
+Start-up warm-up and readiness.
+
+start_warmup() runs once per process, at start-up, on a background
+thread: it loads the embedding model and runs a first forward pass,
+connects to Endee (validating or creating the index), and prepares the
+cross-encoder, embedding worker pool and Groq client when they are in
+use.  The first query therefore finds everything loaded instead of
+paying for it.
+
+readiness() reports each step; the process is ready once the required
+steps (model and Endee, plus the cross-encoder if re-ranking is on)
+have succeeded.  A required step that fails (Endee not up yet, a model
+download cut short) is retried with exponential backoff until it
+succeeds, so /ready recovers without a restart.  The metrics server
+answers /ready with it.
+"""
+import os
+import threading
+import time
+from dotenv import load_dotenv
+from embed import MODEL_NAME, get_model, index_dimension
+from embed_pool import EMBED_WORKERS, get_pool
+from metrics import set_readiness_check, span
+from rag import GROQ_API_KEY, get_groq_client
+from rerank import RERANK_CANDIDATES, get_cross_encoder
+from session import find_index
+
+load_dotenv()
+
+# Load and warm everything in the background at start-up; 0 loads on first use
+WARMUP = os.getenv("WARMUP", "1") == "1"
+# Delay before a failed required step is retried, doubling up to WARMUP_RETRY_MAX
+WARMUP_RETRY_SECONDS = float(os.getenv("WARMUP_RETRY_SECONDS", "2"))
+WARMUP_RETRY_MAX = float(os.getenv("WARMUP_RETRY_MAX", "60"))
+
+_lock = threading.Lock()
+_thread = None
+_done = threading.Event()
+_steps = {}  # name -> {"status", "required", "seconds", "error", "attempts"}
+
+
+def _warm_model():
+    get_model().encode(["warm-up"])
+
+
+def _warm_endee():
+    # Also checks that the index dimension matches the model and reducer.
+    # A missing index is left to the first ingest to create.
+    index_dimension()
+    find_index()
+
+
+def _plan():
+    """(name, fn, required) for every warm-up step in this configuration."""
+    steps = [("model", _warm_model, True), ("endee", _warm_endee, True)]
+    if RERANK_CANDIDATES > 0:
+        steps.append(("reranker", get_cross_encoder, True))
+    if EMBED_WORKERS > 0:
+        # Only needed for large ingests, so it does not hold up readiness
+        steps.append(("embed_pool", lambda: get_pool(MODEL_NAME), False))
+    if GROQ_API_KEY:
+        steps.append(("llm", get_groq_client, False))
+    return steps
+
+
+def _attempt(name, fn):
+    """Run one step and record the outcome; returns whether it succeeded."""
+    with _lock:
+        _steps[name]["status"] = "loading"
+        _steps[name]["attempts"] += 1
+    start = time.perf_counter()
+    try:
+        with span(f"warmup.{name}"):
+            fn()
+    except Exception as exc:
+        status, error = "error", str(exc)
+    else:
+        status, error = "ready", None
+    with _lock:
+        _steps[name].update(status=status, error=error,
+                            seconds=round(time.perf_counter() - start, 3))
+    return status == "ready"
+
+
+def _run(steps):
+    failed = [(name, fn) for name, fn, required in steps
+              if not _attempt(name, fn) and required]
+    _done.set()
+    delay = WARMUP_RETRY_SECONDS
+    while failed:
+        time.sleep(delay)
+        failed = [(name, fn) for name, fn in failed if not _attempt(name, fn)]
+        delay = min(delay * 2, WARMUP_RETRY_MAX)
+
+
+def start_warmup():
+    """Start the warm-up thread (once per process); returns it, or None if WARMUP=0."""
+    global _thread
+    if not WARMUP:
+        return None
+    with _lock:
+        if _thread is None:
+            steps = _plan()
+            for name, _, required in steps:
+                _steps[name] = {"status": "pending", "required": required,
+                                "seconds": None, "error": None, "attempts": 0}
+            set_readiness_check(readiness)
+            _thread = threading.Thread(target=_run, args=(steps,), name="warmup", daemon=True)
+            _thread.start()
+    return _thread
+
+
+def readiness():
+    """{"ready": bool, "done": bool, "steps": {name: state}}."""
+    with _lock:
+        steps = {name: dict(state) for name, state in _steps.items()}
+    if not steps:
+        # Nothing started: ready unless a warm-up is still to come
+        ready = not WARMUP
+    else:
+        ready = all(s["status"] == "ready" for s in steps.values() if s["required"])
+    # With WARMUP=0 there is nothing to wait for
+    return {"ready": ready, "done": not WARMUP or _done.is_set(), "steps": steps}
+
+
+def wait_until_ready(timeout=None):
+    """
+    Block until every step has run once (or timeout); returns whether the
+    process is ready.  Failed required steps go on retrying afterwards.
+    """
+    if _thread is None:
+        return True
+    _done.wait(timeout)
+    return readiness()["ready"]
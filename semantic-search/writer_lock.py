@@ -0,0 +1,124 @@
+"""
+Single-writer lock for ingest, and the index generation readers watch.
+
+Two ingests into the same index would interleave their manifest diffs
+and near-duplicate links, so each ingest holds an exclusive lock on
+WRITER_LOCK_PATH while it runs: the app around one "Process & Store"
+run, bulk_ingest.py for its whole session.  A second ingest is refused
+until the first has finished; searches never take the lock.
+
+Every change to the index also bumps a generation token next to the
+lock file.  Processes that keep derived state in memory (the answer
+cache) compare it with the token they last saw and drop that state when
+another process has changed the index.  The on-disk stores reload
+themselves: SQLite reads are always current, and EmbeddingCache
+replays what other processes appended.
+
+The lock uses flock(2) and is released by the OS when the process
+exits, even after a crash.  Where fcntl is unavailable (Windows) it is
+not enforced.
+"""
+import os
+import threading
+import uuid
+from dotenv import load_dotenv
+from session import INDEX_NAME
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+load_dotenv()
+
+WRITER_LOCK_PATH = os.getenv("WRITER_LOCK_PATH") or f".cache/writer_{INDEX_NAME}.lock"
+GENERATION_PATH = os.path.splitext(WRITER_LOCK_PATH)[0] + ".generation"
+
+_lock = threading.Lock()
+_held = 0  # writer locks this process holds
+
+
+class WriterLock:
+    """A held writer lock; release it, or use it as a context manager."""
+
+    def __init__(self, f):
+        self._file = f
+
+    def release(self):
+        global _held
+        with _lock:
+            if self._file is None:
+                return
+            if fcntl is not None:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+            _held -= 1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+def acquire_writer_lock(owner):
+    """
+    Start an ingest into the index and return its WriterLock.
+
+    Raises RuntimeError naming the current holder if another ingest, in
+    this process or another one, is running.
+    """
+    global _held
+    directory = os.path.dirname(WRITER_LOCK_PATH)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    f = open(WRITER_LOCK_PATH, "a+", encoding="utf-8")
+    if fcntl is not None:
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.seek(0)
+            holder = f.read().strip() or "another process"
+            f.close()
+            raise RuntimeError(
+                f"{holder} is already ingesting into index {INDEX_NAME} "
+                f"(lock {WRITER_LOCK_PATH}); try again once it has finished"
+            ) from None
+    f.seek(0)
+    f.truncate()
+    f.write(f"{owner} (pid {os.getpid()})")
+    f.flush()
+    with _lock:
+        _held += 1
+    return WriterLock(f)
+
+
+def require_writer():
+    """Raise RuntimeError unless this process is running an ingest."""
+    if fcntl is not None and not _held:
+        raise RuntimeError(
+            "ingest must run under acquire_writer_lock() so that only one process writes at a time"
+        )
+
+
+def index_generation():
+    """Token that changes whenever any process changes the index, or None."""
+    try:
+        with open(GENERATION_PATH, "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def bump_index_generation():
+    """Tell other processes the index changed; returns the new token."""
+    generation = uuid.uuid4().hex
+    directory = os.path.dirname(GENERATION_PATH)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{GENERATION_PATH}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(generation)
+    os.replace(tmp_path, GENERATION_PATH)
+    return generation